@@ -0,0 +1,75 @@
+# benchmarks/bench_batching.py
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_causal_lm
+
+
+def make_requests(prefix, users):
+    return [(f'{prefix}_user_{index}', {'input': f'Hello, this is user number {index}.'}) for index in range(users)]
+
+
+def run_sequential(service, requests):
+    start = time.perf_counter()
+    for user_id, input_json in requests:
+        service.process_request(user_id, input_json)
+    return time.perf_counter() - start
+
+
+def run_batched(service, requests, max_batch_size, max_wait_ms):
+    from src.service.batching import BatchScheduler
+
+    scheduler = BatchScheduler(service, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            list(executor.map(lambda request: scheduler.process_request(*request), requests))
+        elapsed = time.perf_counter() - start
+    finally:
+        scheduler.close()
+    return elapsed, scheduler.stats()
+
+
+def main():
+    """
+    Compare throughput of one-at-a-time process_request against the batching scheduler.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark dynamic batching of concurrent requests.')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service'], default='langmodel_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random model)')
+    parser.add_argument('--users', type=int, default=32, help='Number of concurrent users (default: 32)')
+    parser.add_argument('--max_batch_size', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--max_wait_ms', type=float, default=5)
+    args = parser.parse_args()
+
+    if args.service == 'gpt2_service':
+        from src.service.gpt2_service import GPT2Service as SelectedService
+    else:
+        from src.service.langmodel_service import LangModelService as SelectedService
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_causal_lm(tmpdir)
+        service = SelectedService(model_name=model_name)
+        new_tokens = args.users * service.MAX_NEW_TOKENS
+
+        elapsed = run_sequential(service, make_requests('sequential', args.users))
+        print(f'sequential        : {args.users / elapsed:7.2f} req/s  {new_tokens / elapsed:8.1f} tok/s')
+        for max_batch_size in args.max_batch_size:
+            # Fresh user ids so that every run starts from empty sessions
+            requests = make_requests(f'batched_{max_batch_size}', args.users)
+            elapsed, stats = run_batched(service, requests, max_batch_size, args.max_wait_ms)
+            print(
+                f'batched (max {max_batch_size:3d}) : {args.users / elapsed:7.2f} req/s  {new_tokens / elapsed:8.1f} tok/s'
+                f'  mean batch {stats["mean_batch_size"]:.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
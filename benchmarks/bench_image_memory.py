@@ -0,0 +1,123 @@
+# benchmarks/bench_image_memory.py
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_stable_diffusion
+
+IDLE_TIMEOUT = 1.0
+
+
+def rss_mb():
+    """
+    Current resident set size of this process (Linux), or NaN.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(args):
+    """
+    Load the pipeline at one precision, render an image, wait for the idle release and print RSS as JSON.
+    """
+    from src.service.image_cache import ImageCache
+    from src.service.imagegen_service import ImageGenService
+
+    before_mb = rss_mb()
+    start = time.perf_counter()
+    service = ImageGenService(
+        model_name=args.model_name, output_dir=args.output_dir, device='cpu', precision=args.worker,
+        image_cache=ImageCache(args.output_dir, max_bytes=0), idle_timeout=IDLE_TIMEOUT
+    )
+    load_seconds = time.perf_counter() - start
+    load_peak_mb, loaded_mb = peak_rss_mb(), rss_mb()
+
+    service.pipeline.set_progress_bar_config(disable=True)
+    side = service.pipeline.unet.config.sample_size * service.pipeline.vae_scale_factor
+    request = {'prompt': 'A lighthouse at dusk', 'width': side, 'height': side, 'num_inference_steps': 4}
+    start = time.perf_counter()
+    if 'error' in service.process_request('user', request):
+        raise RuntimeError('image generation failed')
+    render_seconds = time.perf_counter() - start
+    serving_peak_mb, serving_mb = peak_rss_mb(), rss_mb()
+
+    time.sleep(IDLE_TIMEOUT * 2)
+    released = service.pipeline is None
+    idle_mb = rss_mb()
+    start = time.perf_counter()
+    service.process_request('user', dict(request, seed=1))
+    reload_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'before_mb': before_mb,
+        'load_seconds': load_seconds,
+        'load_peak_mb': load_peak_mb,
+        'loaded_mb': loaded_mb,
+        'render_seconds': render_seconds,
+        'serving_peak_mb': serving_peak_mb,
+        'serving_mb': serving_mb,
+        'released': released,
+        'idle_mb': idle_mb,
+        'reload_seconds': reload_seconds,
+    }))
+
+
+def main():
+    """
+    Report peak and steady-state RSS of ImageGenService for each weight precision.
+
+    Every precision runs in its own process. 'before' is the RSS after the
+    imports, 'load peak' the peak while loading, 'loaded' and 'serving' the
+    steady RSS after loading and after one image, and 'idle' the RSS once the
+    idle timeout has released the pipeline. 'reload s' is the first request
+    after the release, which loads the pipeline again. fp16 needs CUDA and is
+    only measured with --precisions fp16 on a GPU machine.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark pipeline memory of ImageGenService per precision.')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random SD)')
+    parser.add_argument('--precisions', nargs='+', default=['fp32', 'bf16'])
+    parser.add_argument('--worker', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--output_dir', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_stable_diffusion(
+            os.path.join(tmpdir, 'sd'), block_out_channels=(128, 256, 512, 512)
+        )
+        print(f'{"precision":>9} {"before":>7} {"load peak":>10} {"loaded":>7} {"serving":>8} {"serve peak":>11} '
+              f'{"idle":>7} {"load s":>7} {"render s":>9} {"reload s":>9}  (MB)')
+        for precision in args.precisions:
+            command = [sys.executable, __file__, '--model_name', model_name, '--worker', precision,
+                       '--output_dir', os.path.join(tmpdir, f'images_{precision}')]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            idle = f'{result["idle_mb"]:7.1f}' if result['released'] else f'{"kept":>7}'
+            print(f'{precision:>9} {result["before_mb"]:7.1f} {result["load_peak_mb"]:10.1f} {result["loaded_mb"]:7.1f} '
+                  f'{result["serving_mb"]:8.1f} {result["serving_peak_mb"]:11.1f} {idle} '
+                  f'{result["load_seconds"]:7.2f} {result["render_seconds"]:9.2f} {result["reload_seconds"]:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
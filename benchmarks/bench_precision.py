@@ -0,0 +1,126 @@
+# benchmarks/bench_precision.py
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_causal_lm
+
+PROMPTS = [
+    'The weather today is',
+    'Once upon a time, in a small village,',
+    'The most important thing about programming is',
+    'My favourite food is',
+    'In the year 2050, cities will',
+    'The capital of France is',
+    'To bake a cake you need',
+    'Machine learning models are',
+]
+
+
+def load_service(service_name, model_name, precision):
+    if service_name == 'gpt2_service':
+        from src.service.gpt2_service import GPT2Service as SelectedService
+    else:
+        from src.service.langmodel_service import LangModelService as SelectedService
+    return SelectedService(model_name=model_name, precision=precision)
+
+
+def run_worker(args):
+    """
+    Measure one precision in this process and print the results as JSON.
+    """
+    import torch
+
+    service = load_service(args.service, args.model_name, args.worker)
+
+    # Throughput through the service's request path
+    torch.manual_seed(0)
+    new_tokens = 0
+    start = time.perf_counter()
+    for index, prompt in enumerate(PROMPTS):
+        prompt_length = len(service.tokenizer.encode(prompt))
+        service.process_request(f'user_{index}', {'input': prompt})
+        new_tokens += len(service.user_sessions[f'user_{index}']) - prompt_length
+    elapsed = time.perf_counter() - start
+
+    # The fp32 run writes greedy continuations; the other modes are scored against them
+    with torch.no_grad():
+        if args.worker == 'fp32':
+            reference = []
+            for prompt in PROMPTS:
+                input_ids = torch.tensor([service.tokenizer.encode(prompt)])
+                output_ids = service.model.generate(
+                    input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    max_new_tokens=service.MAX_NEW_TOKENS,
+                    do_sample=False,
+                    pad_token_id=service.tokenizer.eos_token_id
+                )
+                reference.append({'prompt_length': input_ids.shape[-1], 'ids': output_ids[0].tolist()})
+            with open(args.reference, 'w') as f:
+                json.dump(reference, f)
+
+        with open(args.reference) as f:
+            reference = json.load(f)
+        agreed = total = 0
+        for item in reference:
+            ids = item['ids']
+            predicted = service.model(torch.tensor([ids])).logits[0, :-1].argmax(-1).tolist()
+            for position in range(item['prompt_length'] - 1, len(ids) - 1):
+                agreed += predicted[position] == ids[position + 1]
+                total += 1
+
+    print(json.dumps({
+        'precision': args.worker,
+        'tokens_per_sec': new_tokens / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'agreement': agreed / total,
+    }))
+
+
+def main():
+    """
+    Compare tokens/sec, peak RSS and top-1 agreement with fp32 for each precision.
+
+    Every precision runs in its own process so that peak RSS is measured separately.
+    Agreement is the share of positions where the model's greedy choice matches
+    fp32's greedy continuation of the fixed prompts (teacher forced).
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the precision modes of the text services.')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service'], default='gpt2_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random model)')
+    parser.add_argument('--precisions', nargs='+', default=['fp32', 'bf16', 'int8-dynamic'])
+    parser.add_argument('--worker', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--reference', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_causal_lm(os.path.join(tmpdir, 'model'), n_embd=512, n_layer=6, n_head=8)
+        reference = os.path.join(tmpdir, 'reference.json')
+        precisions = ['fp32'] + [precision for precision in args.precisions if precision != 'fp32']
+
+        print(f'{"precision":>14} {"tok/s":>8} {"peak RSS MB":>12} {"agreement":>10}')
+        for precision in precisions:
+            output = subprocess.run(
+                [sys.executable, __file__, '--service', args.service, '--model_name', model_name,
+                 '--worker', precision, '--reference', reference],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f'{precision:>14} {result["tokens_per_sec"]:8.1f} {result["peak_rss_mb"]:12.1f} {result["agreement"]:10.3f}')
+
+
+if __name__ == '__main__':
+    main()
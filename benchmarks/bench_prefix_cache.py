@@ -0,0 +1,87 @@
+# benchmarks/bench_prefix_cache.py
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import percentile
+from benchmarks.tiny_models import build_causal_lm
+
+SYSTEM_PROMPT_TOKENS = [64, 256, 768]
+USERS = 16
+QUESTIONS = [
+    'What is the weather like today?',
+    'Tell me a story about the sea.',
+    'How do lighthouses work?',
+    'Can you recommend a good book?',
+]
+BASE_PROMPT = 'You are a patient assistant who answers questions about the coast, ships and the weather. '
+
+
+def system_prompt(tokenizer, length):
+    """
+    Repeat BASE_PROMPT until it encodes to about length tokens.
+    """
+    text = BASE_PROMPT
+    while len(tokenizer.encode(text)) < length:
+        text += BASE_PROMPT
+    return tokenizer.decode(tokenizer.encode(text)[:length])
+
+
+def run(service_class, model_name, system_length, prefix_cache_bytes):
+    """
+    Send every user's first turn, all starting with the same system prompt, and return TTFTs and cache stats.
+    """
+    service = service_class(model_name=model_name, prefix_cache_bytes=prefix_cache_bytes)
+    service.MAX_NEW_TOKENS = 8
+    system = system_prompt(service.tokenizer, system_length)
+    service.process_request('warm_up', {'input': 'warm up'})
+
+    ttfts, cached = [], []
+    for index in range(USERS):
+        response = service.process_request(
+            f'user_{index}', {'input': system + QUESTIONS[index % len(QUESTIONS)], 'trace': True}
+        )
+        ttfts.append(response['trace']['phases_ms']['prefill'])
+        cached.append(response['trace']['counts']['cached_tokens'])
+    stats = service.kv_cache.stats()
+    service.close()
+    return ttfts, cached, stats
+
+
+def main():
+    """
+    Measure time to first token when all users share a system prompt.
+
+    Every request is a user's first turn, so the per-user cache never hits and
+    each request prefills the whole system prompt. The prefix cache prefills it
+    once and then only each user's question. The first request of the prefix
+    cache run is a miss, so its p95 shows the cold cost.
+    """
+    from src.service.gpt2_service import GPT2Service
+    from src.service.langmodel_service import LangModelService
+
+    parser = argparse.ArgumentParser(description='Benchmark the shared prefix cache of the text services.')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service'], default='langmodel_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random model)')
+    parser.add_argument('--system_tokens', nargs='+', type=int, default=SYSTEM_PROMPT_TOKENS)
+    parser.add_argument('--prefix_cache_mb', type=float, default=256)
+    args = parser.parse_args()
+    service_class = GPT2Service if args.service == 'gpt2_service' else LangModelService
+
+    print(f'{"system":>7} {"cache":>9} {"TTFT p50":>9} {"TTFT p95":>9} {"cached":>7} {"hits":>5} {"nodes":>6} {"MB":>6}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_causal_lm(os.path.join(tmpdir, 'model'), n_embd=512, n_layer=6, n_head=8)
+        for system_length in args.system_tokens:
+            for label, prefix_cache_bytes in (('per-user', None), ('prefix', int(args.prefix_cache_mb * 1024 * 1024))):
+                ttfts, cached, stats = run(service_class, model_name, system_length, prefix_cache_bytes)
+                print(f'{system_length:7d} {label:>9} {percentile(ttfts, 0.50):9.1f} {percentile(ttfts, 0.95):9.1f} '
+                      f'{sum(cached) / len(cached):7.0f} {stats["hits"]:5d} {stats.get("nodes", stats.get("entries")):6d} '
+                      f'{stats["bytes"] / 1024 / 1024:6.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/bench_schedulers.py
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_stable_diffusion
+
+PROMPTS = [
+    'A futuristic cityscape at night',
+    'A bowl of fruit on a wooden table',
+    'A mountain lake at sunrise',
+    'A portrait of an old sailor',
+]
+
+
+def run_worker(args):
+    """
+    Render the prompts with one scheduler preset in this process and print the results as JSON.
+    """
+    from src.service.image_cache import ImageCache
+    from src.service.imagegen_service import ImageGenService
+
+    service = ImageGenService(
+        model_name=args.model_name, output_dir=args.output_dir, device='cpu', scheduler=args.worker,
+        memory_options=args.memory_options, image_cache=ImageCache(args.output_dir, max_bytes=0)
+    )
+    service.pipeline.set_progress_bar_config(disable=True)
+    side = args.side or service.pipeline.unet.config.sample_size * service.pipeline.vae_scale_factor
+    size = {'width': side, 'height': side}
+    service.process_request('warm_up', dict(size, prompt='warm up', num_inference_steps=2))
+
+    image_file_paths = []
+    start = time.perf_counter()
+    for index, prompt in enumerate(PROMPTS):
+        result = service.process_request(f'user_{index}', dict(size, prompt=prompt, seed=index))
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        image_file_paths.append(result['image_file_path'])
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'num_inference_steps': service.num_inference_steps,
+        'seconds_per_image': elapsed / len(PROMPTS),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'image_file_paths': image_file_paths,
+    }))
+
+
+def psnr(first_path, second_path):
+    """
+    Peak signal-to-noise ratio between two images in dB (higher is closer).
+    """
+    import numpy as np
+    from PIL import Image
+
+    first = np.asarray(Image.open(first_path), dtype=np.float64)
+    second = np.asarray(Image.open(second_path), dtype=np.float64)
+    mse = np.mean((first - second) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main():
+    """
+    Compare wall time, peak RSS and closeness to the 50-step default scheduler for each preset.
+
+    Every configuration runs in its own process so that peak RSS is measured
+    separately. Closeness is the mean PSNR against the default scheduler's images
+    of the same prompts and seeds; on the local random model it shows how far each
+    solver has converged, not how good the images look.
+    """
+    from src.service.pipeline_options import MEMORY_OPTIONS, SCHEDULERS
+
+    parser = argparse.ArgumentParser(description='Benchmark the scheduler presets and memory options of ImageGenService.')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random SD)')
+    parser.add_argument('--schedulers', nargs='+', choices=list(SCHEDULERS), default=list(SCHEDULERS))
+    parser.add_argument('--memory_scheduler', type=str, choices=list(SCHEDULERS), default='dpmpp',
+                        help='Preset used to compare the memory options')
+    parser.add_argument('--side', type=int, default=None, help="Image side length (default: the model's native size)")
+    parser.add_argument('--worker', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--memory_options', nargs='*', default=[], help=argparse.SUPPRESS)
+    parser.add_argument('--output_dir', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_stable_diffusion(os.path.join(tmpdir, 'sd'))
+        configurations = [('default', [])] + [(preset, []) for preset in args.schedulers if preset != 'default']
+        configurations += [(args.memory_scheduler, [option]) for option in MEMORY_OPTIONS]
+        configurations.append((args.memory_scheduler, list(MEMORY_OPTIONS)))
+
+        print(f'{"scheduler":>14} {"memory options":>44} {"steps":>6} {"s/image":>8} {"peak RSS MB":>12} {"PSNR dB":>8}')
+        reference = None
+        for index, (preset, memory_options) in enumerate(configurations):
+            output_dir = os.path.join(tmpdir, f'images_{index}')
+            command = [sys.executable, __file__, '--model_name', model_name, '--worker', preset,
+                       '--output_dir', output_dir, '--memory_options', *memory_options]
+            if args.side:
+                command += ['--side', str(args.side)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            if reference is None:
+                reference = result['image_file_paths']
+            closeness = sum(
+                min(psnr(first, second), 99.0) for first, second in zip(reference, result['image_file_paths'])
+            ) / len(reference)
+            print(f'{preset:>14} {",".join(memory_options) or "-":>44} {result["num_inference_steps"]:6d} '
+                  f'{result["seconds_per_image"]:8.2f} {result["peak_rss_mb"]:12.1f} {closeness:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
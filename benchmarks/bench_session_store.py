@@ -0,0 +1,80 @@
+# benchmarks/bench_session_store.py
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import percentile
+
+SESSION_COUNTS = [10_000, 100_000, 1_000_000]
+LOOKUPS = 10_000
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    """
+    Measure opening, reading and writing an SQLiteSessionStore of N sessions.
+
+    'build s' writes N sessions through the store and closes it. 'open ms' is
+    reopening the file and loading one session, which is what a restarted
+    process pays before serving. 'get' and 'put' are per-call latencies on the
+    reopened store, against the in-memory LRUSessionStore; put only buffers
+    the session, the commit happens in the background.
+    """
+    from src.service.session_store import LRUSessionStore
+    from src.service.sqlite_session_store import SQLiteSessionStore
+
+    parser = argparse.ArgumentParser(description='Benchmark the persistent session store.')
+    parser.add_argument('--sessions', nargs='+', type=int, default=SESSION_COUNTS)
+    parser.add_argument('--tokens', type=int, default=256, help='Tokens per session')
+    args = parser.parse_args()
+    tokens = array('i', range(args.tokens))
+
+    print(f'{"sessions":>9} {"store":>7} {"build s":>8} {"MB":>7} {"open ms":>8} '
+          f'{"get p50":>8} {"get p99":>8} {"put p50":>8} {"put p99":>8}  (us)')
+    for count in args.sessions:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'sessions.db')
+            start = time.perf_counter()
+            store = SQLiteSessionStore(path, max_pending=count + 1, flush_interval=3600)
+            for index in range(count):
+                store.put(f'user_{index}', tokens)
+            store.close()
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = SQLiteSessionStore(path)
+            store.get(f'user_{count // 2}')
+            open_ms = (time.perf_counter() - start) * 1000
+            size_mb = os.path.getsize(path) / 1024 / 1024
+
+            stores = (('sqlite', store), ('memory', LRUSessionStore(max_sessions=count)))
+            for label, session_store in stores:
+                user_ids = [f'user_{random.randrange(count)}' for _ in range(LOOKUPS)]
+                if label == 'memory':
+                    for user_id in set(user_ids):
+                        session_store.put(user_id, tokens)
+                gets = [timed(session_store.get, user_id) * 1000 for user_id in user_ids]
+                puts = [timed(session_store.put, user_id, tokens) * 1000 for user_id in user_ids]
+                build = f'{build_seconds:8.2f}' if label == 'sqlite' else f'{"":>8}'
+                size = f'{size_mb:7.1f}' if label == 'sqlite' else f'{"":>7}'
+                opened = f'{open_ms:8.1f}' if label == 'sqlite' else f'{"":>8}'
+                print(f'{count:9d} {label:>7} {build} {size} {opened} '
+                      f'{percentile(gets, 0.50):8.1f} {percentile(gets, 0.99):8.1f} '
+                      f'{percentile(puts, 0.50):8.1f} {percentile(puts, 0.99):8.1f}')
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
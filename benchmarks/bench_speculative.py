@@ -0,0 +1,131 @@
+# benchmarks/bench_speculative.py
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_causal_lm
+
+PROMPTS = [
+    'The weather today is',
+    'Once upon a time, in a small village,',
+    'The most important thing about programming is',
+    'In the year 2050, cities will',
+]
+# Tokens the local draft models propose per step
+NUM_DRAFT_TOKENS = 8
+
+
+def build_local_models(directory):
+    """
+    Build a random target model and two draft models for it.
+
+    The target has 8 blocks, but only the first 2 change the hidden state: the
+    output projections of the others are zero, so they cost time without
+    changing the logits. The 'agreeing' draft holds those first 2 blocks and
+    predicts the target exactly. The 'random' draft is smaller and has unrelated
+    weights; greedy decoding of random models soon repeats a few tokens, so its
+    acceptance rate is not representative of real checkpoints. Random
+    weights are never confident, so the drafts' generation configs turn off
+    transformers' confidence cut-off, which would stop every draft after one token.
+
+    Returns:
+        tuple: (target, {draft label: draft}) model directories.
+    """
+    import torch
+    from transformers import GenerationConfig, GPT2LMHeadModel
+
+    target = build_causal_lm(os.path.join(directory, 'target'), n_embd=512, n_layer=8, n_head=8)
+    model = GPT2LMHeadModel.from_pretrained(target)
+    with torch.no_grad():
+        for block in model.transformer.h[2:]:
+            for projection in (block.attn.c_proj, block.mlp.c_proj):
+                projection.weight.zero_()
+                projection.bias.zero_()
+    model.save_pretrained(target)
+
+    agreeing = build_causal_lm(os.path.join(directory, 'agreeing'), n_embd=512, n_layer=2, n_head=8)
+    draft = GPT2LMHeadModel.from_pretrained(agreeing)
+    state = {name: tensor for name, tensor in model.state_dict().items() if name in draft.state_dict()}
+    draft.load_state_dict(state)
+    draft.save_pretrained(agreeing)
+
+    random_draft = build_causal_lm(os.path.join(directory, 'random'), n_embd=128, n_layer=2, n_head=4, seed=1)
+    for draft_dir in (agreeing, random_draft):
+        generation_config = GenerationConfig.from_pretrained(draft_dir)
+        generation_config.num_assistant_tokens = NUM_DRAFT_TOKENS
+        generation_config.assistant_confidence_threshold = 0.0
+        generation_config.save_pretrained(draft_dir)
+    return target, {'agreeing': agreeing, 'random': random_draft}
+
+
+def run(service_class, model_name, draft_model_name):
+    """
+    Generate greedy continuations of the prompts and return (outputs, ms per new token, decoder stats).
+    """
+    service = service_class(model_name=model_name, kv_cache_bytes=0, draft_model_name=draft_model_name)
+    service.GENERATION_KWARGS = {'do_sample': False}
+    service.process_request('warm_up', {'input': 'warm up'})
+    warm_up_stats = service.speculative.stats() if service.speculative is not None else None
+
+    outputs, new_tokens = [], 0
+    start = time.perf_counter()
+    for index, prompt in enumerate(PROMPTS):
+        prompt_length = len(service.tokenizer.encode(prompt))
+        outputs.append(service.process_request(f'user_{index}', {'input': prompt})['response'])
+        new_tokens += len(service.user_sessions[f'user_{index}']) - prompt_length
+    elapsed = time.perf_counter() - start
+    stats = None
+    if service.speculative is not None:
+        # Leave the warm-up request out of the acceptance rate
+        stats = service.speculative.stats()
+        for name in ('steps', 'draft_tokens', 'accepted_tokens'):
+            stats[name] -= warm_up_stats[name]
+        stats['acceptance_rate'] = stats['accepted_tokens'] / max(stats['draft_tokens'], 1)
+        stats['tokens_per_step'] = (stats['accepted_tokens'] + stats['steps']) / max(stats['steps'], 1)
+    service.close()
+    return outputs, elapsed / new_tokens * 1000, stats
+
+
+def main():
+    """
+    Compare greedy decode latency with and without a draft model.
+
+    Without --model_name the target and drafts are local random models (see
+    build_local_models); with --model_name, pass the drafts to compare with
+    --draft_model_names, e.g. --model_name gpt2-medium --draft_model_names distilgpt2 gpt2.
+    """
+    from src.service.gpt2_service import GPT2Service
+    from src.service.langmodel_service import LangModelService
+
+    parser = argparse.ArgumentParser(description='Benchmark speculative decoding in the text services.')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service'], default='gpt2_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Target model (default: a local random model)')
+    parser.add_argument('--draft_model_names', nargs='+', default=[], help='Draft models to compare')
+    args = parser.parse_args()
+    service_class = GPT2Service if args.service == 'gpt2_service' else LangModelService
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.model_name:
+            model_name, drafts = args.model_name, {name: name for name in args.draft_model_names}
+        else:
+            model_name, drafts = build_local_models(tmpdir)
+
+        reference, baseline_ms, _ = run(service_class, model_name, None)
+        print(f'{"draft":>20} {"ms/token":>9} {"speed-up":>9} {"accepted":>9} {"tok/step":>9} {"same output":>12}')
+        print(f'{"-":>20} {baseline_ms:9.2f} {1.0:9.2f} {"-":>9} {"-":>9} {"-":>12}')
+        for label, draft_model_name in drafts.items():
+            outputs, ms, stats = run(service_class, model_name, draft_model_name)
+            if stats is None:
+                print(f'{label:>20} {ms:9.2f} {baseline_ms / ms:9.2f} {"tokenizer mismatch, not used":>32}')
+                continue
+            print(f'{label:>20} {ms:9.2f} {baseline_ms / ms:9.2f} {stats["acceptance_rate"]:9.2f} '
+                  f'{stats["tokens_per_step"]:9.2f} {str(outputs == reference):>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_tokenizer.py
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.tiny_models import build_causal_lm
+
+TURNS = [1, 8, 32, 128, 512]
+NEW_TOKENS = 50
+BATCH_SIZE = 8
+REPEATS = 20
+INPUT_TEXT = 'Tell me more about the lighthouse keeper and the storm that night.'
+
+
+def per_turn_ms(function, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    """
+    Measure the tokenizer work of one conversation turn as the conversation grows.
+
+    'full' is the original string-session approach: encode the whole history
+    with the new input, decode the whole output and slice off the history. 'new'
+    is what the services do now: encode only the input, decode only the new
+    tokens. It is measured with the slow and the fast (Rust) tokenizer; the last
+    column encodes BATCH_SIZE inputs in one fast-tokenizer call, per input.
+    """
+    from transformers import AutoTokenizer, GPT2Tokenizer
+
+    parser = argparse.ArgumentParser(description='Benchmark per-turn tokenize/decode cost of the text services.')
+    parser.add_argument('--tokenizer_name', type=str, default=None, help='Tokenizer to load (default: a local byte-level one)')
+    parser.add_argument('--turns', nargs='+', type=int, default=TURNS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        name = args.tokenizer_name or build_causal_lm(os.path.join(tmpdir, 'model'), n_embd=32, n_layer=1, n_head=2)
+        slow = GPT2Tokenizer.from_pretrained(name)
+        fast = AutoTokenizer.from_pretrained(name, use_fast=True)
+
+    rng = random.Random(0)
+    turn_ids = fast.encode(INPUT_TEXT)
+    print(f'{"turns":>6} {"history":>8} {"full slow":>10} {"new slow":>10} {"new fast":>10} {"batch fast":>11}  (ms per turn)')
+    for turns in args.turns:
+        # A conversation of `turns` inputs, each followed by NEW_TOKENS generated tokens
+        history_ids = []
+        for _ in range(turns):
+            history_ids += turn_ids + [rng.randrange(256) for _ in range(NEW_TOKENS)]
+        new_ids = history_ids[-NEW_TOKENS:]
+        history_ids = history_ids[:-NEW_TOKENS - len(turn_ids)]
+        history_text = slow.decode(history_ids)
+
+        def full_slow():
+            prompt_ids = slow.encode(history_text + INPUT_TEXT)
+            slow.decode(prompt_ids + new_ids)[len(history_text):]
+
+        def new_with(tokenizer):
+            def turn():
+                tokenizer([INPUT_TEXT])['input_ids']
+                tokenizer.decode(new_ids, skip_special_tokens=True)
+            return turn
+
+        def batch_fast():
+            fast([INPUT_TEXT] * BATCH_SIZE)['input_ids']
+            for _ in range(BATCH_SIZE):
+                fast.decode(new_ids, skip_special_tokens=True)
+
+        print(f'{turns:6d} {len(history_ids):8d} {per_turn_ms(full_slow):10.3f} {per_turn_ms(new_with(slow)):10.3f} '
+              f'{per_turn_ms(new_with(fast)):10.3f} {per_turn_ms(batch_fast) / BATCH_SIZE:11.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_workers.py
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import percentile
+from benchmarks.tiny_models import build_causal_lm
+
+WORKER_COUNTS = [1, 2, 4, 8]
+REQUESTS = 32
+
+
+def proportional_set_size_mb(pid):
+    """
+    Memory of a process with shared pages split between the processes that map them (Linux only).
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def run(service_class, model_name, num_workers, share_weights):
+    """
+    Send REQUESTS concurrent requests from different users to a pool and summarize throughput and latency.
+    """
+    from src.service.worker_pool import WorkerPool
+
+    start = time.perf_counter()
+    pool = WorkerPool(service_class, {'model_name': model_name}, num_workers=num_workers, share_weights=share_weights)
+    start_seconds = time.perf_counter() - start
+    try:
+        for future in [pool.submit(f'warm_up_{index}', {'input': 'warm up'}) for index in range(num_workers * 2)]:
+            future.result()
+        memory_mb = sum(proportional_set_size_mb(pid) for pid in pool.pids)
+
+        submitted = {}
+        start = time.perf_counter()
+        for index in range(REQUESTS):
+            submitted[index] = pool.submit(f'user_{index}', {'input': 'Hello, how are you today?', 'trace': True})
+        latencies, new_tokens = [], 0
+        for future in submitted.values():
+            response = future.result()
+            latencies.append(response['trace']['total_ms'] / 1000)
+            new_tokens += response['trace']['counts'].get('new_tokens', 0)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    return {
+        'threads_per_worker': pool.threads_per_worker,
+        'requests_per_sec': REQUESTS / elapsed,
+        'tokens_per_sec': new_tokens / elapsed,
+        'service_p50_ms': percentile(latencies, 0.50) * 1000,
+        'service_p95_ms': percentile(latencies, 0.95) * 1000,
+        'start_seconds': start_seconds,
+        'workers_pss_mb': memory_mb,
+    }
+
+
+def main():
+    """
+    Measure how throughput scales with the number of worker processes.
+
+    Every request comes from a different user, so the sticky routing spreads
+    them over the workers. Latency is the time a worker spent on the request,
+    without queueing. Memory is the summed PSS of the workers, where pages
+    shared between them count once.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark WorkerPool scaling for the text services.')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service'], default='gpt2_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: a local random model)')
+    parser.add_argument('--workers', nargs='+', type=int, default=WORKER_COUNTS)
+    parser.add_argument('--no_share_weights', action='store_true', help='Let every worker load its own weights')
+    args = parser.parse_args()
+
+    if args.service == 'gpt2_service':
+        from src.service.gpt2_service import GPT2Service as SelectedService
+    else:
+        from src.service.langmodel_service import LangModelService as SelectedService
+
+    print(f'{os.cpu_count()} cores')
+    print(f'{"workers":>8} {"threads":>8} {"req/s":>8} {"tok/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"start s":>8} {"PSS MB":>8}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_name = args.model_name or build_causal_lm(os.path.join(tmpdir, 'model'), n_embd=512, n_layer=6, n_head=8)
+        for num_workers in args.workers:
+            result = run(SelectedService, model_name, num_workers, not args.no_share_weights)
+            print(f'{num_workers:8d} {result["threads_per_worker"]:8d} {result["requests_per_sec"]:8.2f} '
+                  f'{result["tokens_per_sec"]:8.1f} {result["service_p50_ms"]:8.1f} {result["service_p95_ms"]:8.1f} '
+                  f'{result["start_seconds"]:8.1f} {result["workers_pss_mb"]:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
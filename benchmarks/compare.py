@@ -0,0 +1,65 @@
+# benchmarks/compare.py
+
+import argparse
+import json
+import sys
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_sec') or metric in ('mean_batch_size', 'prompt_cache_hit_rate', 'encode_saved_ms_per_request')
+
+
+def flatten(report):
+    """
+    Map (suite, scenario, metric) to value for every numeric result of a report.
+    """
+    values = {}
+    for suite, results in report['suites'].items():
+        if isinstance(results.get('peak_rss_mb'), (int, float)):
+            values[(suite, '-', 'peak_rss_mb')] = results['peak_rss_mb']
+        for scenario, metrics in results.get('scenarios', {}).items():
+            for metric, value in metrics.items():
+                if isinstance(value, (int, float)) and metric not in ('requests', 'pixels'):
+                    values[(suite, scenario, metric)] = value
+    return values
+
+
+def main():
+    """
+    Compare two benchmark result files and report regressions.
+
+    Exits with status 1 if any metric got worse by more than the threshold.
+    """
+    parser = argparse.ArgumentParser(description='Diff two benchmarks/run.py result files.')
+    parser.add_argument('baseline', type=str, help='Results of the reference run')
+    parser.add_argument('candidate', type=str, help='Results of the run to check')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = flatten(json.load(f))
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better(key[2]) else change
+        flag = ''
+        if worse > args.threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = 'improved'
+        print(f'{key[0]:18} {key[1]:24} {key[2]:18} {before:12.2f} {after:12.2f} {change:+8.1%} {flag}')
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f'{key[0]:18} {key[1]:24} {key[2]:18} only in {"baseline" if key in baseline else "candidate"}')
+
+    print(f'{regressions} regression(s) above {args.threshold:.0%}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+# benchmarks/loadgen.py
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import percentile
+from benchmarks.tiny_models import build_causal_lm, build_stable_diffusion
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATES = [1, 2, 4, 8]
+DURATION_SECONDS = 20
+
+
+def post(host, port, body, timeout):
+    """
+    Send one request on a new connection.
+
+    Returns:
+        tuple: (HTTP status or None on a connection error, latency in seconds).
+    """
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request('POST', '/v1/process', body=json.dumps(body), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except OSError:
+        status = None
+    finally:
+        connection.close()
+    return status, time.perf_counter() - start
+
+
+def run_rate(host, port, rate, duration, make_body, timeout, seed=0):
+    """
+    Offer Poisson arrivals at a fixed rate for a duration, whatever the server's speed (open loop).
+
+    Returns:
+        dict: Offered and achieved rates, latency percentiles of the 200 responses and status counts.
+    """
+    rng = random.Random(seed)
+    results, threads = [], []
+    lock = threading.Lock()
+
+    def send(index):
+        result = post(host, port, make_body(index), timeout)
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    arrival, index = 0.0, 0
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival >= duration:
+            break
+        time.sleep(max(0.0, start + arrival - time.perf_counter()))
+        thread = threading.Thread(target=send, args=(index,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        index += 1
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = [latency for status, latency in results if status == 200] or [float('nan')]
+    return {
+        'offered_per_sec': len(results) / duration,
+        'achieved_per_sec': statuses.get(200, 0) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'ok': statuses.get(200, 0),
+        'rejected': statuses.get(429, 0),
+        'timed_out': statuses.get(504, 0),
+        'other': sum(count for status, count in statuses.items() if status not in (200, 429, 504)),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, model_name, port):
+    """
+    Start src/command/server.py on a local model and wait until /healthz answers.
+    """
+    command = [
+        sys.executable, os.path.join(ROOT, 'src', 'command', 'server.py'),
+        '--service', args.service, '--model_name', model_name, '--port', str(port),
+        '--workers', str(args.workers), '--max_queue', str(args.max_queue), '--timeout_ms', str(args.timeout_ms),
+    ]
+    if args.concurrency:
+        command += ['--concurrency', str(args.concurrency)]
+    if args.service == 'imagegen_service':
+        command += ['--output_dir', os.path.join(os.path.dirname(model_name), 'generated')]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'server exited with status {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/healthz')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('server did not become healthy')
+
+
+def main():
+    """
+    Measure saturation throughput and tail latency of the HTTP server.
+
+    Requests arrive as a Poisson process at each offered rate, independently
+    of how fast the server answers, so past saturation the queue fills and the
+    server answers 429 (queue full) or 504 (deadline passed) instead of
+    letting latency grow without bound. Latency is measured at the client and
+    includes queueing. Without --url, the server is started on a local random
+    model.
+    """
+    parser = argparse.ArgumentParser(description='Open-loop load generator for src/command/server.py.')
+    parser.add_argument('--url', type=str, default=None, help='Server to load, e.g. http://127.0.0.1:8000 '
+                                                              '(default: start one on a local random model)')
+    parser.add_argument('--service', choices=['gpt2_service', 'langmodel_service', 'imagegen_service'],
+                        default='langmodel_service')
+    parser.add_argument('--model_name', type=str, default=None, help='Model for the started server (default: a local random model)')
+    parser.add_argument('--rates', nargs='+', type=float, default=RATES, help='Offered requests per second')
+    parser.add_argument('--duration', type=float, default=DURATION_SECONDS, help='Seconds per rate')
+    parser.add_argument('--users', type=int, default=0, help='Spread requests over this many sessions (default: stateless)')
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=None)
+    parser.add_argument('--max_queue', type=int, default=16)
+    parser.add_argument('--timeout_ms', type=float, default=10000)
+    args = parser.parse_args()
+
+    def make_body(index):
+        if args.service == 'imagegen_service':
+            body = {'prompt': f'a lighthouse at dusk, variation {index}', 'num_inference_steps': 10}
+        else:
+            body = {'input': 'Hello, how are you today?'}
+        if args.users:
+            body['user_id'] = f'user_{index % args.users}'
+        return body
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = None
+        if args.url:
+            parsed = urllib.parse.urlparse(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+        else:
+            model_name = args.model_name
+            if model_name is None and args.service == 'imagegen_service':
+                model_name = build_stable_diffusion(os.path.join(tmpdir, 'model'))
+            elif model_name is None:
+                model_name = build_causal_lm(os.path.join(tmpdir, 'model'))
+            host, port = '127.0.0.1', free_port()
+            server = start_server(args, model_name, port)
+        try:
+            post(host, port, make_body(-1), args.timeout_ms / 1000 + 30)
+            print(f'{"offered":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                  f'{"200":>6} {"429":>6} {"504":>6} {"other":>6}')
+            for rate in args.rates:
+                result = run_rate(host, port, rate, args.duration, make_body, args.timeout_ms / 1000 + 30)
+                print(f'{result["offered_per_sec"]:8.2f} {result["achieved_per_sec"]:8.2f} {result["p50_ms"]:8.1f} '
+                      f'{result["p95_ms"]:8.1f} {result["p99_ms"]:8.1f} {result["ok"]:6d} {result["rejected"]:6d} '
+                      f'{result["timed_out"]:6d} {result["other"]:6d}')
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
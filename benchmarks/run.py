@@ -0,0 +1,365 @@
+# benchmarks/run.py
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUITES = ('gpt2_service', 'langmodel_service', 'imagegen_service')
+
+# Scenario parameters; --quick keeps only the first value of each list
+PROMPT_LENGTHS = [16, 128, 512]
+CONVERSATION_DEPTHS = [1, 4, 8]
+CONCURRENCY_LEVELS = [1, 4, 8]
+BATCH_SIZES = [1, 4, 8]
+IMAGE_STEPS = [10, 25]
+IMAGE_BATCH_SIZES = [1, 4]
+# Square image sides; the local random pipeline renders 64x64 by default
+IMAGE_SIDES = [64, 32, 128]
+REQUESTS_PER_SCENARIO = 8
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(latencies, elapsed, new_tokens=None, ttfts=None):
+    summary = {
+        'requests': len(latencies),
+        'requests_per_sec': len(latencies) / elapsed,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+    if new_tokens is not None:
+        summary['tokens_per_sec'] = new_tokens / elapsed
+    if ttfts:
+        summary['ttft_p50_ms'] = percentile(ttfts, 0.50) * 1000
+        summary['ttft_p95_ms'] = percentile(ttfts, 0.95) * 1000
+    return summary
+
+
+class FirstForwardTimer:
+    """
+    Records when the model finishes its first forward pass of a request (the first token).
+
+    Timing is per thread, so concurrent requests on separate threads do not mix.
+    """
+
+    def __init__(self, model):
+        self._local = threading.local()
+        model.register_forward_hook(self._hook)
+
+    def _hook(self, module, args, output):
+        if getattr(self._local, 'first_forward', 0) is None:
+            self._local.first_forward = time.perf_counter()
+
+    def start(self):
+        self._local.first_forward = None
+
+    def first_forward(self):
+        return self._local.first_forward
+
+
+class TextBenchmark:
+    def __init__(self, service_name, model_name, requests):
+        from src.service.session_store import LRUSessionStore
+
+        if service_name == 'gpt2_service':
+            from src.service.gpt2_service import GPT2Service as SelectedService
+        else:
+            from src.service.langmodel_service import LangModelService as SelectedService
+
+        # No token window, so that session growth equals the number of new tokens
+        self.service = SelectedService(model_name=model_name, session_store=LRUSessionStore())
+        self.requests = requests
+        self.timer = FirstForwardTimer(self.service.model)
+        self._users = 0
+
+    def new_user(self):
+        self._users += 1
+        return f'user_{self._users}'
+
+    def request(self, user_id, text):
+        """
+        Run one request and return (latency, time to first token, new tokens).
+        """
+        input_json = {'input': text}
+        prompt_length = len(self.service._prepare(user_id, input_json)[0])
+        self.timer.start()
+        start = time.perf_counter()
+        self.service.process_request(user_id, input_json)
+        latency = time.perf_counter() - start
+        new_tokens = len(self.service.user_sessions[user_id]) - prompt_length
+        return latency, self.timer.first_forward() - start, new_tokens
+
+    def run_sequential(self, make_request):
+        # Only the measured requests count towards throughput, not set-up turns
+        latencies, ttfts, new_tokens = [], [], 0
+        for _ in range(self.requests):
+            latency, ttft, tokens = make_request()
+            latencies.append(latency)
+            ttfts.append(ttft)
+            new_tokens += tokens
+        return summarize(latencies, sum(latencies), new_tokens, ttfts)
+
+    def prompt_length(self, length):
+        # length is in tokens of the service's tokenizer, not characters
+        tokenizer = self.service.tokenizer
+        text = 'lorem ipsum dolor sit amet '
+        while len(tokenizer.encode(text)) < length:
+            text += text
+        text = tokenizer.decode(tokenizer.encode(text)[:length])
+        return self.run_sequential(lambda: self.request(self.new_user(), text))
+
+    def conversation_depth(self, depth):
+        # Latency of the depth-th turn of a conversation
+        def make_request():
+            user_id = self.new_user()
+            for turn in range(depth - 1):
+                self.service.process_request(user_id, {'input': f'This is turn number {turn}.'})
+            return self.request(user_id, f'This is turn number {depth - 1}.')
+        return self.run_sequential(make_request)
+
+    def concurrency(self, threads):
+        # Requests on several threads against the unbatched service
+        results = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(self.request, self.new_user(), 'Hello, how are you today?')
+                for _ in range(self.requests * threads)
+            ]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        return summarize(
+            [latency for latency, _, _ in results], elapsed,
+            sum(tokens for _, _, tokens in results), [ttft for _, ttft, _ in results]
+        )
+
+    def batch_size(self, max_batch_size):
+        from src.service.batching import BatchScheduler
+
+        scheduler = BatchScheduler(self.service, max_batch_size=max_batch_size)
+
+        def make_request(user_id):
+            prompt_length = len(self.service._prepare(user_id, {'input': 'Hello, how are you today?'})[0])
+            start = time.perf_counter()
+            scheduler.process_request(user_id, {'input': 'Hello, how are you today?'})
+            return time.perf_counter() - start, len(self.service.user_sessions[user_id]) - prompt_length
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_batch_size * 2) as executor:
+                futures = [executor.submit(make_request, self.new_user()) for _ in range(self.requests * max_batch_size)]
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - start
+        finally:
+            scheduler.close()
+        summary = summarize([latency for latency, _ in results], elapsed, sum(tokens for _, tokens in results))
+        summary['mean_batch_size'] = scheduler.stats()['mean_batch_size']
+        return summary
+
+    def run(self, quick):
+        pick = (lambda values: values[:1]) if quick else (lambda values: values)
+        results = {}
+        self.request(self.new_user(), 'warm up')
+        for length in pick(PROMPT_LENGTHS):
+            results[f'prompt_length={length}'] = self.prompt_length(length)
+        for depth in pick(CONVERSATION_DEPTHS):
+            results[f'conversation_depth={depth}'] = self.conversation_depth(depth)
+        for threads in pick(CONCURRENCY_LEVELS):
+            results[f'concurrency={threads}'] = self.concurrency(threads)
+        for max_batch_size in pick(BATCH_SIZES):
+            results[f'batch_size={max_batch_size}'] = self.batch_size(max_batch_size)
+        return results
+
+
+class ImageBenchmark:
+    def __init__(self, model_name, requests, output_dir):
+        from src.service.image_cache import ImageCache
+        from src.service.imagegen_service import ImageGenService
+
+        # The result cache is disabled so every request renders
+        self.service = ImageGenService(
+            model_name=model_name, output_dir=output_dir, device='cpu', image_cache=ImageCache(output_dir, max_bytes=0)
+        )
+        self.service.pipeline.set_progress_bar_config(disable=True)
+        # Render at the model's native size unless a scenario asks for another one
+        native_side = self.service.pipeline.unet.config.sample_size * self.service.pipeline.vae_scale_factor
+        self.service.picture_size = {'width': native_side, 'height': native_side}
+        self.requests = requests
+        self.step_times = []
+        unet = self.service.pipeline.unet
+        unet.register_forward_pre_hook(lambda module, args: setattr(self, '_step_start', time.perf_counter()))
+        unet.register_forward_hook(
+            lambda module, args, output: self.step_times.append(time.perf_counter() - self._step_start)
+        )
+
+    def steps(self, num_inference_steps, side=None):
+        self.step_times = []
+        latencies = []
+        size = {'width': side, 'height': side} if side else {}
+        start = time.perf_counter()
+        for index in range(self.requests):
+            request_start = time.perf_counter()
+            result = self.service.process_request(
+                'bench_user',
+                dict(size, prompt=f'a photo of a cat number {index}', num_inference_steps=num_inference_steps)
+            )
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+        summary = summarize(latencies, elapsed)
+        summary['images_per_sec'] = summary.pop('requests_per_sec')
+        summary['step_mean_ms'] = sum(self.step_times) / len(self.step_times) * 1000
+        summary['step_p95_ms'] = percentile(self.step_times, 0.95) * 1000
+        return summary
+
+    def batch_size(self, max_batch_size):
+        # Requests for several users rendered through process_batch
+        self.service.max_batch_size = max_batch_size
+        requests = [
+            (f'user_{index}', {'prompt': f'a photo of a dog number {index}', 'num_inference_steps': IMAGE_STEPS[0]})
+            for index in range(self.requests * max_batch_size)
+        ]
+        latencies = []
+        start = time.perf_counter()
+        for offset in range(0, len(requests), max_batch_size):
+            batch_start = time.perf_counter()
+            for result in self.service.process_batch(requests[offset:offset + max_batch_size]):
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+            latencies.append(time.perf_counter() - batch_start)
+        elapsed = time.perf_counter() - start
+        # Latencies are per process_batch call
+        summary = summarize(latencies, elapsed)
+        summary.pop('requests_per_sec')
+        summary['requests'] = len(requests)
+        summary['images_per_sec'] = len(requests) / elapsed
+        return summary
+
+    def repeated_prompts(self):
+        # Popular prompts with new seeds: the image cache misses but the prompt-embedding cache hits
+        self.service.prompt_cache = type(self.service.prompt_cache)()
+        start = time.perf_counter()
+        latencies = []
+        for index in range(self.requests * 2):
+            request_start = time.perf_counter()
+            self.service.process_request(
+                'bench_user', {'prompt': f'a popular prompt {index % 2}', 'num_inference_steps': 2, 'seed': index}
+            )
+            latencies.append(time.perf_counter() - request_start)
+        summary = summarize(latencies, time.perf_counter() - start)
+        stats = self.service.prompt_cache.stats()
+        summary['prompt_cache_hit_rate'] = stats['hit_rate']
+        summary['encode_saved_ms_per_request'] = stats['saved_ms'] / len(latencies)
+        return summary
+
+    def run(self, quick):
+        self.steps(2)
+        pick = (lambda values: values[:1]) if quick else (lambda values: values)
+        results = {
+            f'steps={num_inference_steps}': self.steps(num_inference_steps) for num_inference_steps in pick(IMAGE_STEPS)
+        }
+        for max_batch_size in pick(IMAGE_BATCH_SIZES):
+            results[f'batch_size={max_batch_size}'] = self.batch_size(max_batch_size)
+        for side in pick(IMAGE_SIDES):
+            results[f'size={side}x{side}'] = self.steps(IMAGE_STEPS[0], side)
+            results[f'size={side}x{side}']['pixels'] = side * side
+        results['repeated_prompts'] = self.repeated_prompts()
+        return results
+
+
+def run_suite(args):
+    """
+    Run one suite in this process and print its results as JSON.
+    """
+    import torch
+
+    torch.manual_seed(0)
+    requests = 2 if args.quick else REQUESTS_PER_SCENARIO
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.suite == 'imagegen_service':
+            results = ImageBenchmark(args.model_name, requests, tmpdir).run(args.quick)
+        else:
+            results = TextBenchmark(args.suite, args.model_name, requests).run(args.quick)
+
+    print(json.dumps({
+        'scenarios': results,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'torch_threads': torch.get_num_threads(),
+    }))
+
+
+def main():
+    """
+    Run the offline benchmark suites and write the results to JSON.
+
+    Each suite runs in its own process on locally built random models (unless
+    --text_model/--image_model are given), so no network access is needed and
+    peak RSS is reported per suite. Compare two result files with compare.py.
+    """
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the text and image services.')
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Where to write the JSON results')
+    parser.add_argument('--text_model', type=str, default=None, help='Text model to load (default: local random GPT-2)')
+    parser.add_argument('--image_model', type=str, default=None, help='Image model to load (default: local random SD)')
+    parser.add_argument('--quick', action='store_true', help='Run only the first value of every scenario')
+    parser.add_argument('--suite', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--model_name', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.suite:
+        run_suite(args)
+        return
+
+    from benchmarks.tiny_models import build_causal_lm, build_stable_diffusion
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'suites': {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for suite in args.suites:
+            if suite == 'imagegen_service':
+                model_name = args.image_model or build_stable_diffusion(os.path.join(tmpdir, 'sd'))
+            elif args.text_model:
+                model_name = args.text_model
+            else:
+                model_name = os.path.join(tmpdir, 'lm')
+                if not os.path.exists(model_name):
+                    build_causal_lm(model_name)
+            command = [sys.executable, __file__, '--suite', suite, '--model_name', model_name]
+            if args.quick:
+                command.append('--quick')
+
+            print(f'Running {suite}...', flush=True)
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            report['suites'][suite] = json.loads(output.strip().splitlines()[-1])
+            report['suites'][suite]['model_name'] = 'local-random' if model_name.startswith(tmpdir) else model_name
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/tiny_models.py
+
+import json
+import os
+import tempfile
+
+import torch
+from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer, GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+
+
+def build_causal_lm(directory, n_embd=256, n_layer=4, n_head=4, n_positions=1024, seed=0):
+    """
+    Save a small, randomly initialized GPT-2 style checkpoint for offline benchmarks.
+
+    The tokenizer is byte-level with no merges, so every character is one token.
+    The same checkpoint works for GPT2Service and, through AutoTokenizer and
+    AutoModelForCausalLM, for the DialoGPT-style LangModelService.
+
+    Args:
+        directory (str): Directory to save the model and tokenizer into.
+        n_embd (int): Hidden size.
+        n_layer (int): Number of transformer blocks.
+        n_head (int): Number of attention heads.
+        n_positions (int): Context length.
+        seed (int): Seed for the random weights.
+
+    Returns:
+        str: The directory, usable as model_name for the services.
+    """
+    os.makedirs(directory, exist_ok=True)
+    vocab = {char: index for index, char in enumerate(bytes_to_unicode().values())}
+    vocab['<|endoftext|>'] = len(vocab)
+    with open(os.path.join(directory, 'vocab.json'), 'w') as f:
+        json.dump(vocab, f)
+    with open(os.path.join(directory, 'merges.txt'), 'w') as f:
+        f.write('#version: 0.2\n')
+    GPT2Tokenizer(os.path.join(directory, 'vocab.json'), os.path.join(directory, 'merges.txt')).save_pretrained(directory)
+
+    torch.manual_seed(seed)
+    config = GPT2Config(
+        vocab_size=len(vocab),
+        n_positions=n_positions,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=n_head,
+        bos_token_id=vocab['<|endoftext|>'],
+        eos_token_id=vocab['<|endoftext|>'],
+    )
+    GPT2LMHeadModel(config).save_pretrained(directory)
+    return directory
+
+
+def build_stable_diffusion(directory, block_out_channels=(32, 64), sample_size=32, norm_num_groups=32, seed=0):
+    """
+    Save a small, randomly initialized Stable Diffusion pipeline for offline benchmarks.
+
+    The CLIP tokenizer is byte-level with no merges. The VAE downsamples by
+    2 ** (len(block_out_channels) - 1), so the default pipeline renders 64x64.
+
+    Args:
+        directory (str): Directory to save the pipeline into.
+        block_out_channels (tuple): Channel widths of the UNet and VAE blocks.
+        sample_size (int): Default latent size of the UNet.
+        norm_num_groups (int): Group norm groups of the UNet and VAE; must divide every channel width.
+        seed (int): Seed for the random weights.
+
+    Returns:
+        str: The directory, usable as model_name for ImageGenService.
+    """
+    from diffusers import AutoencoderKL, PNDMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+
+    os.makedirs(directory, exist_ok=True)
+    chars = list(bytes_to_unicode().values())
+    vocab = {char: index for index, char in enumerate(chars)}
+    vocab.update({f'{char}</w>': len(chars) + index for index, char in enumerate(chars)})
+    vocab['<|startoftext|>'] = len(vocab)
+    vocab['<|endoftext|>'] = len(vocab)
+    with tempfile.TemporaryDirectory() as tokenizer_dir:
+        with open(os.path.join(tokenizer_dir, 'vocab.json'), 'w') as f:
+            json.dump(vocab, f)
+        with open(os.path.join(tokenizer_dir, 'merges.txt'), 'w') as f:
+            f.write('#version: 0.2\n')
+        tokenizer = CLIPTokenizer(
+            os.path.join(tokenizer_dir, 'vocab.json'), os.path.join(tokenizer_dir, 'merges.txt'), model_max_length=77
+        )
+
+    torch.manual_seed(seed)
+    unet = UNet2DConditionModel(
+        block_out_channels=block_out_channels,
+        layers_per_block=1,
+        sample_size=sample_size,
+        norm_num_groups=norm_num_groups,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=('DownBlock2D',) + ('CrossAttnDownBlock2D',) * (len(block_out_channels) - 1),
+        up_block_types=('CrossAttnUpBlock2D',) * (len(block_out_channels) - 1) + ('UpBlock2D',),
+        cross_attention_dim=32,
+        attention_head_dim=8,
+    )
+    vae = AutoencoderKL(
+        block_out_channels=list(block_out_channels),
+        norm_num_groups=norm_num_groups,
+        in_channels=3,
+        out_channels=3,
+        down_block_types=['DownEncoderBlock2D'] * len(block_out_channels),
+        up_block_types=['UpDecoderBlock2D'] * len(block_out_channels),
+        latent_channels=4,
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=37,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        max_position_embeddings=77,
+        bos_token_id=vocab['<|startoftext|>'],
+        eos_token_id=vocab['<|endoftext|>'],
+        pad_token_id=vocab['<|endoftext|>'],
+    ))
+    scheduler = PNDMScheduler(
+        beta_start=0.00085,
+        beta_end=0.012,
+        beta_schedule='scaled_linear',
+        skip_prk_steps=True,
+        set_alpha_to_one=False,
+        steps_offset=1,
+    )
+    pipeline = StableDiffusionPipeline(
+        unet=unet,
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        scheduler=scheduler,
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipeline.save_pretrained(directory)
+    return directory
@@ -4,9 +4,40 @@ import sys
 import os
 import uuid
 import argparse
+import threading
+from concurrent.futures import Future
 
 # Adjust the import path if necessary
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+DEFAULT_MODEL_NAMES = {
+    'gpt2_service': 'gpt2',
+    'langmodel_service': 'microsoft/DialoGPT-small',
+}
+
+
+def load_service(service_name, model_name, precision='fp32', draft_model_name=None):
+    """
+    Import and initialize the chosen language model service.
+
+    torch and transformers are only imported here, so that the console can show
+    its prompt while this runs in a background thread.
+
+    Args:
+        service_name (str): 'gpt2_service' or 'langmodel_service'.
+        model_name (str): Name or path of the model to load.
+        precision (str): Inference precision of the weights.
+        draft_model_name (str): Draft model for speculative decoding, or None.
+
+    Returns:
+        The initialized service.
+    """
+    if service_name == 'gpt2_service':
+        from src.service.gpt2_service import GPT2Service as SelectedService
+    elif service_name == 'langmodel_service':
+        from src.service.langmodel_service import LangModelService as SelectedService
+    return SelectedService(model_name=model_name, precision=precision, draft_model_name=draft_model_name)
+
 
 def main():
     """
@@ -20,22 +51,41 @@ def main():
         default='langmodel_service',
         help='Choose the language model service to use.'
     )
+    parser.add_argument(
+        '--model_name',
+        type=str,
+        default=None,
+        help='Model to load (default: gpt2 for gpt2_service, microsoft/DialoGPT-small for langmodel_service).'
+    )
+    parser.add_argument(
+        '--precision',
+        choices=['fp32', 'bf16', 'int8-dynamic'],
+        default='fp32',
+        help='Inference precision of the weights (default: fp32).'
+    )
+    parser.add_argument(
+        '--draft_model_name',
+        type=str,
+        default=None,
+        help='Small model with the same tokenizer that drafts tokens for speculative decoding, e.g. distilgpt2.'
+    )
     args = parser.parse_args()
 
-    # Import the chosen service
-    if args.service == 'gpt2_service':
-        from src.service.gpt2_service import GPT2Service as SelectedService
-        model_name = 'gpt2'
-    elif args.service == 'langmodel_service':
-        from src.service.langmodel_service import LangModelService as SelectedService
-        model_name = 'microsoft/DialoGPT-small'
+    # Load the selected service in the background while the user types
+    service_future = Future()
+
+    def warm_up():
+        try:
+            model_name = args.model_name or DEFAULT_MODEL_NAMES[args.service]
+            service_future.set_result(load_service(args.service, model_name, args.precision, args.draft_model_name))
+        except Exception as e:
+            service_future.set_exception(e)
+
+    threading.Thread(target=warm_up, daemon=True).start()
 
     # Generate a unique user ID for the session
     user_id = str(uuid.uuid4())
 
-    # Initialize the selected language model service
-    service = SelectedService(model_name=model_name)
-
     print(f"Welcome to the Chatbot using {args.service}! Type 'exit' to quit.")
     while True:
         # Get user input
@@ -47,15 +97,26 @@ def main():
         # Prepare input JSON
         input_json = {'input': user_input}
 
-        # Get response from the language model service
-        response_json = service.process_request(user_id, input_json)
+        # Wait for the service if it is still loading
+        service = service_future.result()
+
+        # Stream the response from the language model service as it is generated
+        stream = service.process_request_stream(user_id, input_json)
+
+        # Handle possible errors; a failed generation ends this reply, not the chat
+        try:
+            first_chunk = next(stream, '')
+        except Exception as e:
+            print(f"Error: {e}")
+            continue
 
-        # Handle possible errors
-        if 'error' in response_json:
-            print(f"Error: {response_json['error']}")
-        else:
-            assistant_reply = response_json.get('response', '')
-            print(f"Chatbot: {assistant_reply}")
+        print(f"Chatbot: {first_chunk}", end='', flush=True)
+        try:
+            for chunk in stream:
+                print(chunk, end='', flush=True)
+        except Exception as e:
+            print(f"\nError: {e}", end='')
+        print()
 
 if __name__ == '__main__':
     main()
@@ -1,84 +1,156 @@
 import sys
 import os
 import uuid
+import json
+import time
 import argparse
+import itertools
 from pathlib import Path
 
 # Adjust the import path if necessary
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
-def get_unique_filename(directory, filename):
+def read_requests(lines):
     """
-    Get a unique filename by appending an index if the file already exists.
+    Parse the requests of a JSONL file, one JSON object per line.
 
     Args:
-        directory (str): The directory where the file will be saved.
-        filename (str): The desired filename.
+        lines (iterable): Lines of the file.
 
-    Returns:
-        str: A unique filename with an index if necessary.
+    Yields:
+        tuple: (line number, request dict or None, error message or None) for each non-empty line.
     """
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    new_filename = filename
-    while os.path.exists(os.path.join(directory, new_filename)):
-        new_filename = f"{base}_{counter}{ext}"
-        counter += 1
-    return new_filename
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('the line must be a JSON object')
+        except ValueError as e:
+            yield line_number, None, str(e)
+            continue
+        yield line_number, request, None
+
+
+def run_batch(service, batch_file, defaults, batch_size):
+    """
+    Generate the images of a JSONL file, one request per line, with a loaded service.
+
+    Lines are read lazily and rendered batch_size requests at a time; the file
+    paths are printed as soon as each batch is rendered, while the images are
+    still being written in the background. A line that is not a JSON object is
+    reported as a failed request and skipped.
+
+    Args:
+        service (ImageGenService): The image generation service.
+        batch_file (str): Path of the JSONL file; each line holds at least a 'prompt'.
+        defaults (dict): Request fields used when a line does not set them.
+        batch_size (int): Number of requests passed to process_batch at once.
+    """
+    user_id = str(uuid.uuid4())
+    images = failed = 0
+    start = time.perf_counter()
+    with open(batch_file) as f:
+        requests = read_requests(f)
+        while True:
+            lines = list(itertools.islice(requests, batch_size))
+            if not lines:
+                break
+            chunk = []
+            for line_number, request, error in lines:
+                if error is not None:
+                    failed += 1
+                    print(f"Error: invalid request on line {line_number}: {error}")
+                else:
+                    chunk.append(dict(defaults, **request))
+            if not chunk:
+                continue
+            results = service.process_batch(
+                [(request.get('user_id', user_id), request) for request in chunk], wait=False
+            )
+            for request, result in zip(chunk, results):
+                if 'error' in result:
+                    failed += 1
+                    print(f"Error: {result['error']} (prompt: {request.get('prompt')!r})")
+                    continue
+                for file_path in result.get('image_file_paths', [result['image_file_path']]):
+                    images += 1
+                    print(f"Image generated and saved to {file_path}", flush=True)
+
+    for error in service.flush():
+        images -= 1
+        failed += 1
+        print(f"Error: could not write an image: {error}")
+    elapsed = time.perf_counter() - start
+    print(f"{images} images in {elapsed:.1f}s ({images / elapsed:.2f} images/s), {failed} failed requests")
 
 
 def main():
     """
     Main function to run the command-line image generator interface.
     """
-    # Ensure the _generated directory exists
-    output_dir = Path('./_data/_generated')
-    output_dir.mkdir(parents=True, exist_ok=True)
+    from service.pipeline_options import MEMORY_OPTIONS, PRECISIONS, SCHEDULERS
 
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='Generate an image using a locally hosted AI model.')
-    parser.add_argument('--prompt', type=str, help='Description of the image to generate', required=True)
-    parser.add_argument('--num_inference_steps', type=int, default=50, help='Number of inference steps (default: 50)')
+    parser.add_argument('--prompt', type=str, help='Description of the image to generate')
+    parser.add_argument('--batch', type=str, help='JSONL file of requests to generate with one loaded model')
+    parser.add_argument('--batch_size', type=int, default=4, help='Requests rendered together in --batch mode (default: 4)')
+    parser.add_argument('--num_inference_steps', type=int, default=None, help='Number of inference steps (default: set by the scheduler, 50 for the default one)')
     parser.add_argument('--guidance_scale', type=float, default=7.5, help='Guidance scale for generation (default: 7.5)')
     parser.add_argument('--filename', type=str, default='generated_image.png', help='Filename for the generated image (default: generated_image.png)')
     parser.add_argument('--width', type=int, default=512, help='Width of the generated image (default: 512)')
     parser.add_argument('--height', type=int, default=512, help='Height of the generated image (default: 512)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated image (default: 0)')
+    parser.add_argument('--scheduler', type=str, choices=list(SCHEDULERS), default='default', help='Scheduler preset; dpmpp, euler and unipc need only 15-25 steps (default: default)')
+    parser.add_argument('--memory_options', nargs='*', choices=MEMORY_OPTIONS, default=[], help='CPU memory options for the pipeline')
+    parser.add_argument('--precision', type=str, choices=list(PRECISIONS), default='fp32', help="Weight precision; 'fp16' needs a GPU, 'bf16' halves the memory on CPU (default: fp32)")
+    parser.add_argument('--model_name', type=str, default=None, help='Name or path of the model to load')
     parser.add_argument('--imgformat', type=str, choices=['jpg', 'png'], default='png', help='Image format (default: png)')
 
     args = parser.parse_args()
+    if not args.prompt and not args.batch:
+        parser.error('one of --prompt or --batch is required')
 
-    # Import the ImageGenService
+    # Ensure the _generated directory exists
+    output_dir = Path('./_data/_generated')
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Import the ImageGenService (torch and diffusers load only after argument parsing)
     from service.imagegen_service import ImageGenService
 
     # Generate a unique user ID for the session
     user_id = str(uuid.uuid4())
 
     # Initialize the image generation service
-    service = ImageGenService()
+    service = ImageGenService(
+        model_name=args.model_name, output_dir=str(output_dir), max_batch_size=args.batch_size,
+        scheduler=args.scheduler, memory_options=args.memory_options, precision=args.precision
+    )
 
     # Set the image size and format using setters
     service.picture_size = {'width': args.width, 'height': args.height}
     service.imgformat = args.imgformat
 
-    # Prepare input JSON with user prompt and optional parameters
-    input_json = {
-        'prompt': args.prompt,
-        'num_inference_steps': args.num_inference_steps,
-        'guidance_scale': args.guidance_scale
-    }
+    # Optional parameters; the step count defaults to the scheduler's
+    defaults = {'guidance_scale': args.guidance_scale, 'seed': args.seed}
+    if args.num_inference_steps is not None:
+        defaults['num_inference_steps'] = args.num_inference_steps
+
+    if args.batch:
+        run_batch(service, args.batch, defaults, args.batch_size)
+        return
 
-    # Get a unique filename if the file already exists
-    unique_filename = get_unique_filename(output_dir, args.filename)
-    file_path = output_dir / unique_filename
+    # Prepare input JSON with user prompt and optional parameters; a taken filename gets a unique suffix
+    input_json = dict(defaults, prompt=args.prompt, filename=args.filename)
 
     # Process the image generation request
-    result = service.process_request(user_id, input_json)
+    result = service.process_request(user_id, input_json, wait=True)
 
-    # Move the generated image to the correct path
     if 'image_file_path' in result:
-        os.rename(result['image_file_path'], file_path)
-        print(f"Image generated and saved to {file_path}")
+        print(f"Image generated and saved to {result['image_file_path']}")
     else:
         print(f"Error: {result.get('error', 'Unknown error occurred')}")
 
@@ -0,0 +1,114 @@
+# src/command/server.py
+
+import sys
+import os
+import asyncio
+import argparse
+import importlib
+
+# Adjust the import path if necessary
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+SERVICES = {
+    'gpt2_service': ('src.service.gpt2_service', 'GPT2Service'),
+    'langmodel_service': ('src.service.langmodel_service', 'LangModelService'),
+    'imagegen_service': ('src.service.imagegen_service', 'ImageGenService'),
+}
+TEXT_SERVICES = ('gpt2_service', 'langmodel_service')
+
+
+def build_backend(args):
+    """
+    Create the selected service in this process, or a pool of worker processes running it.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+        ServiceExecutor | WorkerPool: Backend for the InferenceServer.
+    """
+    from src.service.http_server import ServiceExecutor
+    from src.service.worker_pool import WorkerPool
+
+    module_name, class_name = SERVICES[args.service]
+    service_class = getattr(importlib.import_module(module_name), class_name)
+    service_kwargs = {}
+    if args.model_name:
+        service_kwargs['model_name'] = args.model_name
+    if args.service in TEXT_SERVICES:
+        service_kwargs.update(precision=args.precision, draft_model_name=args.draft_model_name)
+        if args.prefix_cache_mb:
+            service_kwargs['prefix_cache_bytes'] = int(args.prefix_cache_mb * 1024 * 1024)
+        if args.session_db:
+            from src.service.sqlite_session_store import SQLiteSessionStore
+            # Each worker process opens its own copy of the file. A user is always routed to the same
+            # worker, which buffers the user's writes, so no two processes write one session
+            service_kwargs['session_store'] = SQLiteSessionStore(args.session_db)
+    else:
+        service_kwargs.update(output_dir=args.output_dir, precision=args.precision, idle_timeout=args.idle_timeout)
+
+    if args.workers:
+        try:
+            return WorkerPool(service_class, service_kwargs, num_workers=args.workers)
+        finally:
+            # The workers opened the store again; this process does not use its copy
+            if 'session_store' in service_kwargs:
+                service_kwargs['session_store'].close()
+    return ServiceExecutor(service_class(**service_kwargs), max_workers=args.concurrency)
+
+
+async def serve(args, backend):
+    from src.service.http_server import InferenceServer
+
+    server = InferenceServer(
+        backend, concurrency=args.concurrency, max_queue=args.max_queue, timeout_ms=args.timeout_ms
+    )
+    port = await server.start(args.host, args.port)
+    print(f'Serving {args.service} on http://{args.host}:{port} (POST /v1/process, GET /healthz, GET /metrics)', flush=True)
+    await server.serve_forever()
+
+
+def main():
+    """
+    Serve a text or image service over HTTP.
+    """
+    parser = argparse.ArgumentParser(description='Serve a language or image model over HTTP.')
+    parser.add_argument('--service', choices=list(SERVICES), default='langmodel_service', help='Service to serve')
+    parser.add_argument('--model_name', type=str, default=None, help='Model to load (default: the service default)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Worker processes with sticky user routing (default: 0, serve from this process)')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Requests run at the same time (default: the number of workers, or 1)')
+    parser.add_argument('--max_queue', type=int, default=64,
+                        help='Requests waiting for a free slot before 429 is returned (default: 64)')
+    parser.add_argument('--timeout_ms', type=float, default=60000,
+                        help='Default request deadline; a request can set its own "timeout_ms" (default: 60000)')
+    parser.add_argument('--precision', choices=['fp32', 'fp16', 'bf16', 'int8-dynamic'], default='fp32',
+                        help="Weight precision; 'int8-dynamic' is for text models, 'fp16' for images on a GPU "
+                             '(default: fp32)')
+    parser.add_argument('--draft_model_name', type=str, default=None,
+                        help='Draft model for speculative decoding of the text services')
+    parser.add_argument('--prefix_cache_mb', type=float, default=0,
+                        help='Share key/values between users by token prefix, e.g. a common system prompt, '
+                             'with this memory budget (default: 0, per-user cache)')
+    parser.add_argument('--session_db', type=str, default=None,
+                        help='SQLite file that keeps the text sessions across restarts (default: in memory)')
+    parser.add_argument('--output_dir', type=str, default=None, help='Where the image service saves images')
+    parser.add_argument('--idle_timeout', type=float, default=None,
+                        help='Unload the image pipeline after this many seconds without requests (default: keep it)')
+    args = parser.parse_args()
+    args.concurrency = args.concurrency or args.workers or 1
+
+    backend = build_backend(args)
+    try:
+        asyncio.run(serve(args, backend))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+
+
+if __name__ == '__main__':
+    main()
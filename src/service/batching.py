@@ -0,0 +1,152 @@
+# src/service/batching.py
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class _PendingRequest:
+    __slots__ = ('user_id', 'input_json', 'future', 'enqueued')
+
+    def __init__(self, user_id, input_json):
+        self.user_id = user_id
+        self.input_json = input_json
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class BatchScheduler:
+    """
+    Front end that merges concurrent requests into batched generate calls.
+
+    Requests are queued for up to max_wait_ms after the oldest one arrived, or
+    until max_batch_size requests are waiting, and then handed to the service's
+    process_batch. A batch holds at most one request per user, so later requests
+    from the same user wait for the next batch and see the updated session.
+    """
+    DEFAULT_MAX_BATCH_SIZE = 8
+    DEFAULT_MAX_WAIT_MS = 5
+
+    def __init__(self, service, max_batch_size=None, max_wait_ms=None):
+        """
+        Initialize the scheduler and start its worker thread.
+
+        Args:
+            service (TextGenerationService): Service providing process_batch.
+            max_batch_size (int): Largest number of requests per generate call.
+            max_wait_ms (float): Longest time a request waits for others to join its batch.
+        """
+        self.service = service
+        self.max_batch_size = max_batch_size or self.DEFAULT_MAX_BATCH_SIZE
+        self.max_wait = (self.DEFAULT_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.batches = 0
+        self.requests = 0
+        self._pending = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, user_id, input_json):
+        """
+        Queue a request.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_json (dict): JSON object containing the user's input.
+
+        Returns:
+            Future: Resolves to the JSON response.
+        """
+        request = _PendingRequest(user_id, input_json)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('BatchScheduler is closed')
+            self._pending.append(request)
+            self._condition.notify()
+        return request.future
+
+    def process_request(self, user_id, input_json):
+        """
+        Process a request through the batching queue, blocking until it is answered.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_json (dict): JSON object containing the user's input.
+
+        Returns:
+            dict: JSON response of the service.
+        """
+        return self.submit(user_id, input_json).result()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+
+            # Give other requests a few milliseconds to join the oldest one
+            deadline = self._pending[0].enqueued + self.max_wait
+            while not self._closed and len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch, users, waiting = [], set(), deque()
+            for request in self._pending:
+                if len(batch) < self.max_batch_size and request.user_id not in users:
+                    batch.append(request)
+                    users.add(request.user_id)
+                else:
+                    waiting.append(request)
+            self._pending = waiting
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # Drop requests their callers cancelled; the others can no longer be cancelled, so
+            # setting their results below cannot fail
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                responses = self.service.process_batch([(request.user_id, request.input_json) for request in batch])
+                if len(responses) != len(batch):
+                    raise RuntimeError(f'process_batch returned {len(responses)} responses for {len(batch)} requests')
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            for request, response in zip(batch, responses):
+                request.future.set_result(response)
+
+    def close(self):
+        """
+        Stop accepting requests, finish the queued ones and stop the worker thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def stats(self):
+        """
+        Return batching counters.
+
+        Returns:
+            dict: Number of batches and requests processed and the mean batch size.
+        """
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+        }
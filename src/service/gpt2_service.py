@@ -1,60 +1,51 @@
 # src/service/gpt2_service.py
 
-from transformers import GPT2Tokenizer, GPT2LMHeadModel
-import torch
-
-class GPT2Service:
-    def __init__(self, model_name='gpt2'):
+from transformers import GPT2TokenizerFast, GPT2LMHeadModel
+
+from .text_generation_service import TextGenerationService
+
+class GPT2Service(TextGenerationService):
+    GENERATION_KWARGS = {
+        'no_repeat_ngram_size': 2,
+        'do_sample': True,
+        'top_k': 50,
+        'top_p': 0.95,
+        'temperature': 0.8,
+    }
+
+    def __init__(self, model_name='gpt2', kv_cache_bytes=None, session_store=None, registry=None,
+                 precision='fp32', metrics=None, draft_model_name=None,
+                 prefix_cache_bytes=None):
         """
         Initialize the GPT-2 service with the specified model.
-        """
-        self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-        self.model = GPT2LMHeadModel.from_pretrained(model_name)
-        self.user_sessions = {}  # Dictionary to hold user sessions
-
-    def process_request(self, user_id, input_json):
-        """
-        Process a user's request and generate a response.
 
         Args:
-            user_id (str): Unique identifier for the user.
-            input_json (dict): JSON object containing the user's input.
-
-        Returns:
-            dict: JSON response containing the generated text.
+            model_name (str): Name or path of the model to load.
+            kv_cache_bytes (int): Memory budget for cached past_key_values (0 disables reuse).
+            session_store (SessionStore): Storage for user sessions, a bounded LRU store by default.
+            registry (ModelRegistry): Registry to share loaded models through, the process-wide one by default.
+            precision (str): Inference precision of the weights: 'fp32', 'bf16' or 'int8-dynamic'.
+            metrics (Metrics): Where request timings are recorded, the process-wide metrics by default.
+            draft_model_name (str): Smaller model with the same tokenizer for speculative decoding, e.g. 'distilgpt2'.
+            prefix_cache_bytes (int): Memory budget of a key/value cache shared by all users by token prefix.
         """
-        # Extract input text from JSON
-        input_text = input_json.get('input', '')
-        if not input_text:
-            return {'error': 'No input text provided'}
-
-        # Retrieve user's past inputs
-        user_history = self.user_sessions.get(user_id, '')
-
-        # Concatenate past inputs with current input
-        full_input = user_history + input_text
-
-        # Encode the input text
-        input_ids = self.tokenizer.encode(full_input, return_tensors='pt')
-
-        # Generate the model's output
-        output_ids = self.model.generate(
-            input_ids,
-            max_length=input_ids.shape[-1] + 50,
-            pad_token_id=self.tokenizer.eos_token_id,
-            no_repeat_ngram_size=2,
-            do_sample=True,
-            top_k=50,
-            top_p=0.95,
-            temperature=0.8
+        super().__init__(
+            GPT2TokenizerFast,
+            GPT2LMHeadModel,
+            model_name,
+            kv_cache_bytes=kv_cache_bytes,
+            session_store=session_store,
+            registry=registry,
+            precision=precision,
+            metrics=metrics,
+            draft_model_name=draft_model_name,
+            prefix_cache_bytes=prefix_cache_bytes
         )
 
-        # Decode the output
-        generated_text = self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
-
-        # Update the user's session history
-        self.user_sessions[user_id] = generated_text
+    def _build_prompt(self, history_ids, input_ids):
+        # Continue the user's text: append the encoded input to the past conversation
+        history_ids = list(history_ids or [])
+        prompt_ids = history_ids + input_ids
 
-        # Return the generated text as a JSON object
-        response_json = {'response': generated_text[len(user_history):]}
-        return response_json
+        # The response covers the new input and its continuation, not the earlier history
+        return prompt_ids, len(history_ids)
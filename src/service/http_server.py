@@ -0,0 +1,265 @@
+# src/service/http_server.py
+
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics as metrics_module
+from .worker_pool import DEADLINE_EXCEEDED, process_with_deadline
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    504: 'Gateway Timeout',
+}
+
+
+class ServiceExecutor:
+    """
+    Runs a service's blocking process_request calls on a thread pool of this process.
+
+    It offers the same submit() as WorkerPool, so the server can use either.
+    """
+
+    def __init__(self, service, max_workers=1):
+        """
+        Initialize the executor.
+
+        Args:
+            service: Service with process_request(user_id, input_json, cancelled) and forget(user_id).
+            max_workers (int): Number of requests run at the same time.
+        """
+        self.service = service
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+
+    def _run(self, user_id, input_json, deadline):
+        if user_id is not None:
+            return process_with_deadline(self.service, user_id, input_json, deadline)
+        # Stateless call: answer under a throwaway id and keep no session
+        user_id = f'stateless-{uuid.uuid4()}'
+        try:
+            return process_with_deadline(self.service, user_id, input_json, deadline)
+        finally:
+            self.service.forget(user_id)
+
+    def submit(self, user_id, input_json, deadline=None):
+        """
+        Queue a request.
+
+        Args:
+            user_id (str): Unique identifier for the user, or None for a stateless request.
+            input_json (dict): JSON object containing the request.
+            deadline (float): time.time() after which generation is cancelled.
+
+        Returns:
+            Future: Resolves to the JSON response.
+        """
+        return self._executor.submit(self._run, user_id, input_json, deadline)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.service.close()
+
+
+class InferenceServer:
+    """
+    Minimal asyncio HTTP/1.1 server in front of a service's process_request.
+
+    Endpoints:
+        POST /v1/process  Body: the request JSON of process_request, plus an optional
+                          'user_id' (omitted: stateless) and 'timeout_ms'. Returns the
+                          service's JSON response.
+        GET /healthz      Queue and in-flight counts.
+        GET /metrics      The metrics in Prometheus text format, plus the server's counters.
+
+    At most `concurrency` requests run in the backend at once; up to max_queue
+    more wait for a slot, and further requests are rejected with 429 right away.
+    A request whose deadline passes while it waits, or while it is generated
+    (generation is cancelled), gets 504. Inference runs in the backend's threads
+    or processes, never on the event loop.
+    """
+    DEFAULT_CONCURRENCY = 1
+    DEFAULT_MAX_QUEUE = 64
+    DEFAULT_TIMEOUT_MS = 60000
+    MAX_BODY_BYTES = 1024 * 1024
+
+    def __init__(self, backend, concurrency=None, max_queue=None, timeout_ms=None, metrics=None):
+        """
+        Initialize the server.
+
+        Args:
+            backend (ServiceExecutor | WorkerPool): Runs the requests; submit(user_id, input_json, deadline) -> Future.
+            concurrency (int): Requests handed to the backend at the same time.
+            max_queue (int): Requests allowed to wait for the backend before 429 is returned.
+            timeout_ms (float): Default deadline of a request, from its arrival.
+            metrics (Metrics): Metrics exported on /metrics, the process-wide metrics by default.
+        """
+        self.backend = backend
+        self.concurrency = concurrency or self.DEFAULT_CONCURRENCY
+        self.max_queue = self.DEFAULT_MAX_QUEUE if max_queue is None else max_queue
+        self.timeout_ms = timeout_ms or self.DEFAULT_TIMEOUT_MS
+        self.metrics = metrics_module.metrics if metrics is None else metrics
+        self.queued = 0
+        self.in_flight = 0
+        self.counters = {'accepted': 0, 'rejected': 0, 'deadline_exceeded': 0, 'failed': 0}
+        self._slots = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """
+        Start listening.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 for any free port.
+
+        Returns:
+            int: The bound port.
+        """
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > self.MAX_BODY_BYTES:
+                    status, content_type, body = self._json(413, {'error': 'Request body too large'})
+                    keep_alive = False
+                else:
+                    payload = await reader.readexactly(length) if length else b''
+                    status, content_type, body = await self._dispatch(method, path.split('?')[0], payload)
+                    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                response_headers = [
+                    f'HTTP/1.1 {status} {_REASONS[status]}',
+                    f'Content-Type: {content_type}',
+                    f'Content-Length: {len(body)}',
+                    'Connection: ' + ('keep-alive' if keep_alive else 'close'),
+                ]
+                if status == 429:
+                    response_headers.append('Retry-After: 1')
+                writer.write(('\r\n'.join(response_headers) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _json(status, data):
+        return status, 'application/json', json.dumps(data).encode('utf-8')
+
+    async def _dispatch(self, method, path, payload):
+        if path == '/v1/process':
+            if method != 'POST':
+                return self._json(405, {'error': 'Use POST'})
+            try:
+                input_json = json.loads(payload)
+                if not isinstance(input_json, dict):
+                    raise ValueError('the body must be a JSON object')
+                user_id = input_json.pop('user_id', None)
+                timeout = float(input_json.pop('timeout_ms', self.timeout_ms)) / 1000
+            except (TypeError, ValueError) as e:
+                return self._json(400, {'error': f'Invalid request: {e}'})
+            return await self._process(user_id, input_json, time.time() + timeout)
+        if path == '/healthz' and method == 'GET':
+            return self._json(200, dict(self.stats(), status='ok'))
+        if path == '/metrics' and method == 'GET':
+            return 200, 'text/plain; version=0.0.4', self.prometheus_text().encode('utf-8')
+        return self._json(404, {'error': f'No route for {method} {path}'})
+
+    async def _process(self, user_id, input_json, deadline):
+        # Admission control: a bounded number of requests may wait for a backend slot. A request that
+        # finds a free slot does not wait, so max_queue=0 means no waiting rather than no requests
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.counters['rejected'] += 1
+            return self._json(429, {'error': 'Server is busy, retry later'})
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline - time.time())
+        except asyncio.TimeoutError:
+            self.counters['deadline_exceeded'] += 1
+            return self._json(504, {'error': DEADLINE_EXCEEDED})
+        finally:
+            self.queued -= 1
+
+        self.counters['accepted'] += 1
+        self.in_flight += 1
+        try:
+            response = await asyncio.wrap_future(self.backend.submit(user_id, input_json, deadline))
+        except Exception as e:
+            self.counters['failed'] += 1
+            return self._json(500, {'error': str(e)})
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        if response.get('error') == DEADLINE_EXCEEDED:
+            self.counters['deadline_exceeded'] += 1
+            return self._json(504, response)
+        return self._json(200, response)
+
+    def stats(self):
+        """
+        Return server counters.
+
+        Returns:
+            dict: Waiting and running requests, the limits, and accepted, rejected (429),
+                deadline_exceeded (504) and failed (500) counts.
+        """
+        return dict(
+            self.counters, queued=self.queued, in_flight=self.in_flight,
+            concurrency=self.concurrency, max_queue=self.max_queue
+        )
+
+    def prometheus_text(self):
+        """
+        Return the metrics page: the request metrics followed by the server's gauges and counters.
+
+        With a WorkerPool backend the request metrics are recorded in the worker
+        processes, so only the server's own lines are filled in here.
+
+        Returns:
+            str: Prometheus text exposition format.
+        """
+        lines = [
+            '# HELP llm_server_requests Requests waiting for or running in the backend.',
+            '# TYPE llm_server_requests gauge',
+            f'llm_server_requests{{state="queued"}} {self.queued}',
+            f'llm_server_requests{{state="in_flight"}} {self.in_flight}',
+            '# HELP llm_server_responses_total Requests by admission outcome.',
+            '# TYPE llm_server_responses_total counter',
+        ]
+        for outcome, value in self.counters.items():
+            lines.append(f'llm_server_responses_total{{outcome="{outcome}"}} {value}')
+        return self.metrics.prometheus_text() + '\n'.join(lines) + '\n'
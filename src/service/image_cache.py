@@ -0,0 +1,197 @@
+# src/service/image_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+
+def link_or_copy(source, destination):
+    """
+    Hardlink a file, or copy it if the file system does not support links.
+
+    Args:
+        source (str): Existing file.
+        destination (str): New path.
+
+    Raises:
+        FileExistsError: If the destination already exists; it is never overwritten.
+    """
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        raise
+    except OSError:
+        with open(source, 'rb') as src, open(destination, 'xb') as dst:
+            shutil.copyfileobj(src, dst)
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of generated images.
+
+    Each image is stored as <sha256 of its generation parameters>.<format> in the
+    cache directory. The total size is bounded; least-recently-used files are
+    deleted when it is exceeded. Files already in the directory are picked up on
+    start, oldest modification time first, so the cache survives restarts.
+    """
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): Directory holding the cached images.
+            max_bytes (int): Total size of the cached files (0 disables the cache).
+        """
+        self.directory = directory
+        self.max_bytes = self.DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.entries = OrderedDict()  # file name -> size in bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if self.max_bytes > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                # Dot files are put()'s temporary copies, possibly incomplete after a crash
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+            for _, name, size in sorted(files):
+                self.entries[name] = size
+                self.total_bytes += size
+            self._evict()
+
+    @staticmethod
+    def key(**params):
+        """
+        Build the cache key of a set of generation parameters.
+
+        Args:
+            **params: JSON-serializable parameters that determine the image.
+
+        Returns:
+            str: Hex digest identifying the image.
+        """
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, key, imgformat):
+        """
+        Return the cached file of a key and mark it as recently used.
+
+        Args:
+            key (str): Cache key from key().
+            imgformat (str): Image format, used as the file extension.
+
+        Returns:
+            str: Path of the cached file, or None on a miss.
+        """
+        if self.max_bytes <= 0:
+            return None
+        name = f'{key}.{imgformat}'
+        with self._lock:
+            if name not in self.entries or not os.path.exists(self._path(name)):
+                self.total_bytes -= self.entries.pop(name, 0)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+            self.hits += 1
+        # Persist the recency for the next start
+        try:
+            os.utime(self._path(name))
+        except FileNotFoundError:
+            # Evicted by another thread in the meantime
+            self.discard(key, imgformat)
+            return None
+        return self._path(name)
+
+    def discard(self, key, imgformat):
+        """
+        Forget a cached file that no longer exists, e.g. one evicted after get() returned it.
+
+        A lookup that found the file counted as a hit; it is counted as a miss instead.
+
+        Args:
+            key (str): Cache key from key().
+            imgformat (str): Image format, used as the file extension.
+        """
+        name = f'{key}.{imgformat}'
+        with self._lock:
+            if os.path.exists(self._path(name)):
+                return
+            self.total_bytes -= self.entries.pop(name, 0)
+            self.hits -= 1
+            self.misses += 1
+
+    def put(self, key, imgformat, file_path):
+        """
+        Add a generated image to the cache.
+
+        The file is hardlinked (or copied) to a temporary name in the cache directory
+        and renamed into place, so a failed copy never leaves a partial entry. The
+        caller keeps its copy.
+
+        Args:
+            key (str): Cache key from key().
+            imgformat (str): Image format, used as the file extension.
+            file_path (str): The generated image.
+        """
+        if self.max_bytes <= 0:
+            return
+        size = os.path.getsize(file_path)
+        if size > self.max_bytes:
+            return
+        name = f'{key}.{imgformat}'
+        with self._lock:
+            if name in self.entries:
+                self.entries.move_to_end(name)
+                return
+            temp_path = self._path(f'.{name}.{os.getpid()}.tmp')
+            try:
+                link_or_copy(file_path, temp_path)
+                os.replace(temp_path, self._path(name))
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+            self.entries[name] = size
+            self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Number of files, bytes used, hits, misses and evictions.
+        """
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
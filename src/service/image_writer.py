@@ -0,0 +1,127 @@
+# src/service/image_writer.py
+
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Suffixes for taken file names: unique within the process (itertools.count is
+# atomic under the GIL) and, through the random run id, across restarts
+_RUN_ID = os.urandom(4).hex()
+_suffixes = itertools.count(1)
+
+
+def _create_empty(file_path):
+    os.close(os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+
+
+def create_unique_file(directory, filename, create=_create_empty):
+    """
+    Create a file under the given name, or under a unique variant of it if the name is taken.
+
+    Creation is exclusive (O_EXCL, or a hardlink), so concurrent callers never
+    get the same path. A taken name gets a suffix from a process-wide counter
+    instead of probing name_1, name_2, ..., so the cost does not depend on how
+    many files already exist.
+
+    Args:
+        directory (str): Directory to create the file in.
+        filename (str): Preferred file name.
+        create (callable): Creates the file at a path and raises FileExistsError if it exists;
+            an empty file by default.
+
+    Returns:
+        str: Path of the created file.
+    """
+    base, ext = os.path.splitext(filename)
+    file_path = os.path.join(directory, filename)
+    while True:
+        try:
+            create(file_path)
+            return file_path
+        except FileExistsError:
+            file_path = os.path.join(directory, f'{base}_{_RUN_ID}_{next(_suffixes)}{ext}')
+
+
+class ImageWriter:
+    """
+    Thread pool that encodes and writes images off the request thread.
+
+    PIL releases the GIL while compressing, so a few threads overlap encoding
+    with the next diffusion run.
+    """
+    DEFAULT_MAX_WORKERS = 2
+
+    def __init__(self, max_workers=None):
+        """
+        Initialize the writer.
+
+        Args:
+            max_workers (int): Number of writer threads.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.DEFAULT_MAX_WORKERS, thread_name_prefix='image-writer'
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, save, image, file_path, on_saved=None):
+        """
+        Schedule an image to be saved.
+
+        Args:
+            save (callable): Called as save(image, file_path) on a writer thread.
+            image (Image): The image.
+            file_path (str): Its final path, already created by create_unique_file.
+            on_saved (callable): Called as on_saved(file_path) once the file is complete, e.g. to
+                cache it; its errors are logged and do not fail the write.
+
+        Returns:
+            Future: Resolves to file_path once the file is complete. On failure the
+                partial file is removed and the future holds the exception.
+        """
+        def write():
+            try:
+                save(image, file_path)
+            except Exception:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+                raise
+            if on_saved is not None:
+                try:
+                    on_saved(file_path)
+                except Exception:
+                    logger.exception('Post-processing the saved image %s failed', file_path)
+            return file_path
+
+        future = self._executor.submit(write)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self):
+        """
+        Wait until every submitted image is written.
+
+        Returns:
+            list: Exceptions of the writes that failed.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        return [error for error in (future.exception() for future in pending) if error is not None]
+
+    def close(self):
+        """
+        Write the pending images and stop the threads.
+        """
+        self._executor.shutdown(wait=True)
@@ -1,8 +1,21 @@
+import functools
+import math
 import os
+import threading
+import time
+from contextlib import contextmanager
 from PIL import Image
 import torch
 from diffusers import StableDiffusionPipeline
 
+from . import metrics as metrics_module
+from . import model_registry
+from .image_cache import ImageCache, link_or_copy
+from .image_writer import ImageWriter, create_unique_file
+from .pipeline_options import DEFAULT_PRECISION, DEFAULT_SCHEDULER, PRECISIONS, SCHEDULERS, load_pipeline, make_scheduler
+from .prompt_cache import PromptEmbeddingCache
+from .session_store import LRUSessionStore
+
 
 class ImageGenService:
     # Static properties (class-level attributes)
@@ -13,8 +26,23 @@ class ImageGenService:
     DEFAULT_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
     DEFAULT_NUM_INFERENCE_STEPS = 50
     DEFAULT_GUIDANCE_SCALE = 7.5
+    DEFAULT_SEED = 0
+    DEFAULT_MAX_BATCH_SIZE = 4
+    DEFAULT_MAX_TRACKED_USERS = 10000
+    # Larger sizes are rendered at this many pixels and upscaled
+    MAX_RENDER_PIXELS = 1024 * 1024
+    # Limits of a single request; larger ones get an error response
+    DEFAULT_MAX_IMAGES_PER_REQUEST = 16
+    DEFAULT_MAX_OUTPUT_PIXELS = 4096 * 4096
+    # Preview requests are rendered with at most this side length and number of steps
+    PREVIEW_MAX_SIDE = 256
+    PREVIEW_NUM_INFERENCE_STEPS = 10
+    CACHE_DIR_NAME = '.cache'
 
-    def __init__(self, model_name=None, output_dir=None, device=None, picture_size=None, imgformat=None):
+    def __init__(self, model_name=None, output_dir=None, device=None, picture_size=None, imgformat=None,
+                 session_store=None, registry=None, metrics=None, image_cache=None, max_batch_size=None,
+                 scheduler=None, memory_options=None, prompt_cache=None, writer=None, precision=None,
+                 idle_timeout=None, max_images_per_request=None, max_output_pixels=None):
         """
         Initialize the image generation service.
 
@@ -24,17 +52,188 @@ class ImageGenService:
             device (str): The device to run the model on ('cuda' or 'cpu').
             picture_size (dict): Dictionary specifying 'width' and 'height' of the image.
             imgformat (str): Image format ('jpg' or 'png').
+            session_store (SessionStore): Storage for the users' last requests, a bounded LRU store by default.
+            registry (ModelRegistry): Registry to share loaded pipelines through, the process-wide one by default.
+            metrics (Metrics): Where request timings are recorded, the process-wide metrics by default.
+            image_cache (ImageCache): Cache of generated images, one in output_dir/.cache by default.
+            max_batch_size (int): Maximum number of images rendered in one pipeline call.
+            scheduler (str): Scheduler preset, e.g. 'dpmpp' or 'euler'; it also sets the default number of steps.
+            memory_options (tuple): CPU memory options: 'attention_slicing', 'vae_tiling', 'channels_last'.
+            prompt_cache (PromptEmbeddingCache): Cache of text-encoder outputs, a bounded LRU cache by default.
+            writer (ImageWriter): Thread pool that encodes and writes the images; by default a new one,
+                which close() shuts down.
+            precision (str): Weight precision of the pipeline: 'fp32', 'fp16' or 'bf16'.
+            idle_timeout (float): Seconds without requests after which the pipeline is released (and
+                unloaded unless another service holds it); the next request loads it again.
+                None keeps it loaded.
+            max_images_per_request (int): Largest num_images_per_prompt a request may ask for.
+            max_output_pixels (int): Largest width * height of a returned image, upscaling included.
         """
         self.model_name = model_name or self.DEFAULT_MODEL_NAME
         self.output_dir = output_dir or self.DEFAULT_OUTPUT_DIR
         self.device = device or self.DEFAULT_DEVICE
         self.picture_size = picture_size or self.DEFAULT_PICTURE_SIZE
         self.imgformat = imgformat or self.DEFAULT_IMG_FORMAT
+        self.max_batch_size = max_batch_size or self.DEFAULT_MAX_BATCH_SIZE
+        self.max_images_per_request = max_images_per_request or self.DEFAULT_MAX_IMAGES_PER_REQUEST
+        self.max_output_pixels = max_output_pixels or self.DEFAULT_MAX_OUTPUT_PIXELS
+        self.scheduler = scheduler or DEFAULT_SCHEDULER
+        if self.scheduler not in SCHEDULERS:
+            raise ValueError(f"scheduler must be one of {', '.join(SCHEDULERS)}.")
+        self.num_inference_steps = SCHEDULERS[self.scheduler][2]
+        self.memory_options = tuple(sorted(memory_options or ()))
+        self.precision = precision or DEFAULT_PRECISION
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}.")
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics_module.metrics if metrics is None else metrics
 
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
-        self.pipeline = StableDiffusionPipeline.from_pretrained(self.model_name).to(self.device)
-        self.user_requests = {}  # Dictionary to hold user request history
+        self.registry = model_registry.registry if registry is None else registry
+        self._pipeline_key = self.registry.key(
+            StableDiffusionPipeline, self.model_name, dtype=self.precision, device=self.device,
+            memory_options=self.memory_options
+        )
+        self.pipeline = None
+        self._pipeline_lock = threading.Lock()
+        self._active_requests = 0
+        self._idle_timer = None
+        if session_store is None:
+            session_store = LRUSessionStore(max_sessions=self.DEFAULT_MAX_TRACKED_USERS)
+        self.user_requests = session_store  # Last request of each user
+        if image_cache is None:
+            image_cache = ImageCache(os.path.join(self.output_dir, self.CACHE_DIR_NAME))
+        self.image_cache = image_cache
+        self.prompt_cache = PromptEmbeddingCache() if prompt_cache is None else prompt_cache
+        self._owns_writer = writer is None
+        self.writer = ImageWriter() if writer is None else writer
+        self._load_pipeline()
+        self._last_used = time.monotonic()
+        # A service that never gets a request releases the pipeline too
+        self._arm_idle_timer()
+
+    def _load_pipeline(self):
+        """
+        Acquire the shared pipeline and build this service's pipeline around it.
+        """
+        shared_pipeline = self.registry.acquire(
+            self._pipeline_key,
+            lambda: load_pipeline(
+                StableDiffusionPipeline, self.model_name, self.device, self.memory_options, self.precision
+            )
+        )
+        # The weights are shared; this pipeline holds the service's scheduler preset, and every call
+        # runs on a copy of it (see _pipeline_for_call)
+        scheduler = make_scheduler(self.scheduler, shared_pipeline.scheduler.config)
+        if scheduler is None:
+            scheduler = type(shared_pipeline.scheduler).from_config(shared_pipeline.scheduler.config)
+        self.pipeline = StableDiffusionPipeline(
+            **dict(shared_pipeline.components, scheduler=scheduler),
+            requires_safety_checker=shared_pipeline.config.requires_safety_checker
+        )
+        # The empty negative prompt of classifier-free guidance never changes
+        self._negative_prompt_embeds = self._run_text_encoder(*self._tokenize(['']))
+
+    def _pipeline_for_call(self):
+        """
+        Return a pipeline for one call: the shared modules with a new scheduler.
+
+        The scheduler (timesteps, step index) and the pipeline object (guidance
+        scale, number of timesteps) keep state during a call, and ServiceExecutor
+        calls one service from several threads at once. Building both takes
+        about a millisecond.
+        """
+        scheduler = type(self.pipeline.scheduler).from_config(self.pipeline.scheduler.config)
+        pipeline = StableDiffusionPipeline(
+            **dict(self.pipeline.components, scheduler=scheduler),
+            requires_safety_checker=self.pipeline.config.requires_safety_checker
+        )
+        pipeline.set_progress_bar_config(**getattr(self.pipeline, '_progress_bar_config', {}))
+        return pipeline
+
+    def _release_pipeline(self, idle_timeout=None):
+        # Drop this service's references first, so that an unload frees the weights
+        self.pipeline = self._negative_prompt_embeds = None
+        self.registry.release(self._pipeline_key, idle_timeout=idle_timeout)
+
+    @contextmanager
+    def _pipeline_in_use(self):
+        """
+        Keep the pipeline loaded while requests run, loading it again if it was released.
+        """
+        with self._pipeline_lock:
+            if self.pipeline is None:
+                self._load_pipeline()
+            self._active_requests += 1
+        try:
+            yield
+        finally:
+            with self._pipeline_lock:
+                self._active_requests -= 1
+                self._last_used = time.monotonic()
+                if self._active_requests == 0:
+                    self._arm_idle_timer()
+
+    def _arm_idle_timer(self):
+        """
+        Schedule release_if_idle idle_timeout seconds from now; the caller holds the pipeline lock.
+        """
+        if self.idle_timeout is None:
+            return
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(self.idle_timeout, self.release_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def release_if_idle(self):
+        """
+        Release the pipeline if no request used it for idle_timeout seconds.
+
+        The registry unloads it right away unless another service still holds it.
+
+        Returns:
+            bool: Whether the pipeline was released.
+        """
+        with self._pipeline_lock:
+            if (self.pipeline is None or self.idle_timeout is None or self._active_requests
+                    or time.monotonic() - self._last_used < self.idle_timeout):
+                return False
+            self._release_pipeline(idle_timeout=0)
+        return True
+
+    def flush(self):
+        """
+        Wait until every image handed to the writer is on disk.
+
+        Returns:
+            list: Exceptions of the writes that failed.
+        """
+        return self.writer.flush()
+
+    def forget(self, user_id):
+        """
+        Drop the record of a user's last request.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+        """
+        self.user_requests.pop(user_id)
+
+    def close(self):
+        """
+        Finish the pending writes, close the session store and release the shared pipeline so the registry can unload it.
+        """
+        self.flush()
+        if self._owns_writer:
+            self.writer.close()
+        self.user_requests.close()
+        with self._pipeline_lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            if self.pipeline is not None:
+                self._release_pipeline()
 
     @property
     def picture_size(self):
@@ -58,43 +257,131 @@ class ImageGenService:
         else:
             raise ValueError("imgformat must be either 'jpg' or 'png'.")
 
-    def _generate_image(self, prompt_text, num_inference_steps, guidance_scale):
+    def _generate_images(self, prompts, seeds, num_inference_steps, guidance_scale, width, height,
+                         trace=metrics_module.NULL_TRACE, cancelled=None):
         """
-        Generate an image using the Stable Diffusion pipeline.
+        Generate images for several prompts with one Stable Diffusion pipeline call.
+
+        The latents are sized for the requested resolution; PIL resizing is only
+        used when that size is not a valid render size.
 
         Args:
-            prompt_text (str): The prompt text for image generation.
+            prompts (list): The prompt text of every image.
+            seeds (list): Seed of the initial latents of every image; the same seed and parameters give the same image.
             num_inference_steps (int): Number of inference steps.
             guidance_scale (float): Guidance scale for image generation.
+            width (int): Width of the returned images.
+            height (int): Height of the returned images.
+            trace (RequestTrace): Trace to record the diffusion and resize time in.
+            cancelled (threading.Event): Stops the diffusion loop after the current step when set.
 
         Returns:
-            Image: The generated image.
+            list: The generated images, in the order of the prompts.
+
+        Raises:
+            RuntimeError: If cancelled was set before the images were finished.
         """
+        generators = [torch.Generator(device=self.device).manual_seed(seed) for seed in seeds]
+        render_width, render_height = self._render_size(width, height)
+        with trace.phase('encode_prompt'):
+            prompt_embeds = self._encode_prompts(prompts)
         with torch.no_grad():
-            image = \
-            self.pipeline(prompt_text, num_inference_steps=num_inference_steps, guidance_scale=guidance_scale).images[0]
+            with trace.phase('diffusion'):
+                images = self._pipeline_for_call()(
+                    prompt_embeds=prompt_embeds,
+                    negative_prompt_embeds=self._negative_prompt_embeds.expand(len(prompts), -1, -1),
+                    num_inference_steps=num_inference_steps, guidance_scale=guidance_scale,
+                    width=render_width, height=render_height, generator=generators,
+                    callback_on_step_end=None if cancelled is None else functools.partial(self._check_cancelled, cancelled)
+                ).images
+
+        if (render_width, render_height) == (width, height):
+            return images
+        with trace.phase('resize'):
+            return [image.resize((width, height)) for image in images]
+
+    @staticmethod
+    def _check_cancelled(cancelled, pipeline, step, timestep, callback_kwargs):
+        if cancelled.is_set():
+            raise RuntimeError(f'cancelled after {step + 1} steps')
+        return callback_kwargs
+
+    def _tokenize(self, prompts):
+        tokenizer = self.pipeline.tokenizer
+        text_inputs = tokenizer(
+            prompts, padding='max_length', max_length=tokenizer.model_max_length, truncation=True, return_tensors='pt'
+        )
+        return text_inputs.input_ids, text_inputs.attention_mask
+
+    def _run_text_encoder(self, input_ids, attention_mask):
+        # Same call as the pipeline's encode_prompt
+        text_encoder = self.pipeline.text_encoder
+        if not getattr(text_encoder.config, 'use_attention_mask', False):
+            attention_mask = None
+        elif attention_mask is not None:
+            attention_mask = attention_mask.to(self.device)
+        with torch.no_grad():
+            embeds = text_encoder(input_ids.to(self.device), attention_mask=attention_mask)[0]
+        return embeds.to(dtype=text_encoder.dtype)
+
+    def _encode_prompts(self, prompts):
+        """
+        Return the text-encoder outputs of prompts, running the encoder only for prompts not in the prompt cache.
+
+        Args:
+            prompts (list): The prompt texts.
+
+        Returns:
+            torch.Tensor: Embeddings of shape (len(prompts), tokens, hidden size).
+        """
+        input_ids, attention_mask = self._tokenize(prompts)
+        keys = [tuple(row) for row in input_ids.tolist()]
+        embeds = [self.prompt_cache.get(key) for key in keys]
+        missing = [index for index, embed in enumerate(embeds) if embed is None]
+        if missing:
+            start = time.perf_counter()
+            encoded = self._run_text_encoder(input_ids[missing], attention_mask[missing])
+            self.prompt_cache.record_encode(time.perf_counter() - start)
+            for index, embed in zip(missing, encoded):
+                # Copy the row so a cached entry does not keep the whole batch alive
+                embeds[index] = embed.clone()
+                self.prompt_cache.put(keys[index], embeds[index])
+        return torch.stack(embeds)
+
+    def _render_size(self, width, height):
+        """
+        Return the size to render a requested size at.
+
+        The pipeline needs multiples of 8 (and of the VAE scale factor), so the
+        sides are rounded to the nearest multiple; sizes above MAX_RENDER_PIXELS
+        are scaled down.
+
+        Args:
+            width (int): Requested width.
+            height (int): Requested height.
 
-            # Resize the image according to picture_size property
-            image = image.resize((self.picture_size['width'], self.picture_size['height']))
-            return image
+        Returns:
+            tuple: (width, height) to pass to the pipeline.
+        """
+        multiple = math.lcm(8, self.pipeline.vae_scale_factor)
+        scale = min(1.0, math.sqrt(self.MAX_RENDER_PIXELS / (width * height)))
+        return tuple(max(round(side * scale / multiple), 1) * multiple for side in (width, height))
 
-    def _get_unique_filename(self, user_id):
+    def _filename(self, user_id, input_json):
         """
-        Generate a unique filename by appending an index if the file already exists.
+        Return the preferred file name of a request's images.
 
         Args:
             user_id (str): Unique identifier for the user.
+            input_json (dict): The request; 'filename' overrides the default name.
 
         Returns:
-            str: A unique file path for the generated image.
+            str: File name inside output_dir.
         """
-        base_filename = f'{user_id}_generated_image.{self.imgformat}'
-        file_path = os.path.join(self.output_dir, base_filename)
-        counter = 1
-        while os.path.exists(file_path):
-            file_path = os.path.join(self.output_dir, f'{user_id}_generated_image_{counter}.{self.imgformat}')
-            counter += 1
-        return file_path
+        filename = input_json.get('filename') or f'{user_id}_generated_image.{self.imgformat}'
+        if os.path.basename(filename) != filename or filename in ('.', '..'):
+            raise ValueError(f'filename must not contain a directory: {filename!r}')
+        return filename
 
     def _save_image(self, image, file_path):
         """
@@ -106,34 +393,241 @@ class ImageGenService:
         """
         image.save(file_path, format=self.imgformat.upper())
 
-    def process_request(self, user_id, input_json):
+    def _write_image(self, image, file_path, durations=None):
+        """
+        Save an image on a writer thread and time it as the 'write' phase.
+
+        Args:
+            image (Image): The generated image.
+            file_path (str): Path where the image should be saved.
+            durations (list): Where the seconds go if the request waits for its writes and adds them
+                to its trace; otherwise the request is already finished and they go to the metrics.
+        """
+        start = time.perf_counter()
+        self._save_image(image, file_path)
+        seconds = time.perf_counter() - start
+        if durations is not None:
+            durations.append(seconds)
+        else:
+            self.metrics.observe(type(self).__name__, 'write', seconds)
+
+    def _cache_image(self, cache_key, file_path):
+        # Runs on a writer thread once the file is complete; a failure here leaves the user's image alone
+        self.image_cache.put(cache_key, self.imgformat, file_path)
+
+    @staticmethod
+    def _remove_images(file_paths, writes):
+        """
+        Delete the files reserved or written for a request once its pending writes are done.
+        """
+        for future in writes:
+            future.exception()
+        for file_path in file_paths:
+            if file_path is not None:
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+    def _cache_key(self, prompt_text, num_inference_steps, guidance_scale, seed, width, height):
+        # Precision, device and memory options change the pixels too, and services can share a cache
+        return self.image_cache.key(
+            model=self.model_name,
+            scheduler=self.scheduler,
+            precision=self.precision,
+            device=self.device,
+            memory_options=list(self.memory_options),
+            prompt=prompt_text,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            seed=seed,
+            width=width,
+            height=height,
+            imgformat=self.imgformat,
+        )
+
+    def _request_params(self, input_json):
+        """
+        Return a request's generation parameters with the service defaults filled in.
+
+        Raises:
+            ValueError: If the number of images or the size is not a positive integer or exceeds
+                the service's limits.
+        """
+        params = {
+            'prompt': input_json.get('prompt', ''),
+            'num_inference_steps': input_json.get('num_inference_steps', self.num_inference_steps),
+            'guidance_scale': input_json.get('guidance_scale', self.DEFAULT_GUIDANCE_SCALE),
+            'seed': input_json.get('seed', self.DEFAULT_SEED),
+            'num_images_per_prompt': input_json.get('num_images_per_prompt', 1),
+            'width': input_json.get('width', self.picture_size['width']),
+            'height': input_json.get('height', self.picture_size['height']),
+        }
+        num_images = params['num_images_per_prompt']
+        if not isinstance(num_images, int) or isinstance(num_images, bool) or num_images < 1:
+            raise ValueError(f'num_images_per_prompt must be a positive integer, got {num_images!r}')
+        if num_images > self.max_images_per_request:
+            raise ValueError(f'num_images_per_prompt must be at most {self.max_images_per_request}, got {num_images}')
+        for side in ('width', 'height'):
+            if not isinstance(params[side], int) or isinstance(params[side], bool) or params[side] < 1:
+                raise ValueError(f'{side} must be a positive integer, got {params[side]!r}')
+        if params['width'] * params['height'] > self.max_output_pixels:
+            raise ValueError(
+                f"width * height must be at most {self.max_output_pixels} pixels, got {params['width']}x{params['height']}"
+            )
+        if input_json.get('preview', False):
+            # Fast draft: few steps at low resolution, returned without upscaling
+            scale = min(1.0, self.PREVIEW_MAX_SIDE / max(params['width'], params['height']))
+            params['width'], params['height'] = self._render_size(params['width'] * scale, params['height'] * scale)
+            params['num_inference_steps'] = min(params['num_inference_steps'], self.PREVIEW_NUM_INFERENCE_STEPS)
+        return params
+
+    def process_request(self, user_id, input_json, cancelled=None, wait=False):
         """
         Process a user's image generation request and generate an image.
 
+        Images are cached by their generation parameters, so repeating a request
+        with the same seed returns a new link to the earlier file without
+        running the pipeline.
+
         Args:
             user_id (str): Unique identifier for the user.
-            input_json (dict): JSON object containing the user's input.
+            input_json (dict): JSON object containing the user's input; 'trace': True adds
+                the request's phase timings to the response.
+            cancelled (threading.Event): Set to stop rendering, e.g. when the request's deadline passes.
+            wait (bool): Wait until the image is written; see process_batch.
 
         Returns:
             dict: JSON response containing the file path to the generated image.
         """
-        prompt_text = input_json.get('prompt', '')
-        if not prompt_text:
-            return {'error': 'No prompt provided'}
+        return self.process_batch([(user_id, input_json)], wait=wait, cancelled=cancelled)[0]
 
-        num_inference_steps = input_json.get('num_inference_steps', self.DEFAULT_NUM_INFERENCE_STEPS)
-        guidance_scale = input_json.get('guidance_scale', self.DEFAULT_GUIDANCE_SCALE)
+    def process_batch(self, requests, wait=False, cancelled=None):
+        """
+        Process image requests from several users, rendering compatible ones together.
 
-        try:
-            image = self._generate_image(prompt_text, num_inference_steps, guidance_scale)
-            image_file_path = self._get_unique_filename(user_id)
-            self._save_image(image, image_file_path)
-            self.user_requests[user_id] = {
-                'prompt': prompt_text,
-                'image_file_path': image_file_path
-            }
-
-            return {'image_file_path': image_file_path}
-
-        except Exception as e:
-            return {'error': f'Image generation failed: {str(e)}'}
+        Requests with the same size, step count and guidance scale are rendered in
+        shared pipeline calls of up to max_batch_size images. A request may ask for
+        several images with 'num_images_per_prompt'; image i uses seed + i, so it
+        equals the image of a single request with that seed. 'width' and 'height'
+        override picture_size, and 'preview': True renders a quick low-resolution draft.
+
+        Images are named <user_id>_generated_image.<format>, or 'filename' if the
+        request sets one, with a unique suffix if the name is taken. The file is
+        reserved on the request thread and encoded on the writer's threads; by
+        default the response is returned without waiting for the write.
+
+        Args:
+            requests (list): (user_id, input_json) pairs.
+            wait (bool): Wait until the images are written, turning write failures into
+                error responses. Without waiting, the returned files are complete after flush().
+            cancelled (threading.Event): Set to stop rendering; requests not rendered yet get error responses.
+
+        Returns:
+            list: JSON responses in the order of the requests. 'image_file_path' is the
+                first image, 'image_file_paths' lists all of them when more than one was asked for.
+        """
+        with self._pipeline_in_use():
+            return self._process_batch(requests, wait, cancelled)
+
+    def _process_batch(self, requests, wait, cancelled):
+        traces = [
+            self.metrics.start_request(type(self).__name__, input_json.get('trace', False))
+            for _, input_json in requests
+        ]
+        responses = [None] * len(requests)
+        file_paths = [None] * len(requests)
+        filenames = [None] * len(requests)
+        writes = [[] for _ in requests]
+        write_seconds = [[] for _ in requests]  # timed on the writer threads, traced when waiting
+        groups = {}  # (steps, guidance scale, width, height) -> [(request index, image index, seed, cache key)]
+        for index, (user_id, input_json) in enumerate(requests):
+            try:
+                params = self._request_params(input_json)
+            except ValueError as e:
+                responses[index] = {'error': str(e)}
+                continue
+            if not params['prompt']:
+                responses[index] = {'error': 'No prompt provided'}
+                continue
+
+            group_key = (params['num_inference_steps'], params['guidance_scale'], params['width'], params['height'])
+            file_paths[index] = [None] * params['num_images_per_prompt']
+            try:
+                filenames[index] = self._filename(user_id, input_json)
+                for image_index in range(params['num_images_per_prompt']):
+                    seed = params['seed'] + image_index
+                    cache_key = self._cache_key(
+                        params['prompt'], params['num_inference_steps'], params['guidance_scale'], seed,
+                        params['width'], params['height']
+                    )
+                    cached_file_path = self.image_cache.get(cache_key, self.imgformat)
+                    if cached_file_path is not None:
+                        try:
+                            with traces[index].phase('save'):
+                                file_paths[index][image_index] = create_unique_file(
+                                    self.output_dir, filenames[index], functools.partial(link_or_copy, cached_file_path)
+                                )
+                            traces[index].count('cache_hits', 1)
+                            continue
+                        except FileNotFoundError:
+                            # Evicted by another thread after get(): render it like a miss
+                            self.image_cache.discard(cache_key, self.imgformat)
+                    groups.setdefault(group_key, []).append((index, image_index, seed, cache_key))
+            except Exception as e:
+                responses[index] = {'error': f'Image generation failed: {str(e)}'}
+
+        for (num_inference_steps, guidance_scale, width, height), jobs in groups.items():
+            jobs = [job for job in jobs if responses[job[0]] is None]
+            for start in range(0, len(jobs), self.max_batch_size):
+                batch = jobs[start:start + self.max_batch_size]
+                indices = sorted({index for index, _, _, _ in batch})
+                try:
+                    batch_trace = metrics_module.RequestTrace(type(self).__name__)
+                    images = self._generate_images(
+                        [requests[index][1]['prompt'] for index, _, _, _ in batch],
+                        [seed for _, _, seed, _ in batch],
+                        num_inference_steps, guidance_scale, width, height, batch_trace, cancelled
+                    )
+                    # The images share one pipeline call, so each request is charged its full time
+                    for index in indices:
+                        for phase, seconds in batch_trace.phases.items():
+                            traces[index].add(phase, seconds)
+                        traces[index].count('steps', num_inference_steps)
+                        traces[index].count('batch_size', len(batch))
+
+                    for (index, image_index, _, cache_key), image in zip(batch, images):
+                        with traces[index].phase('save'):
+                            file_path = create_unique_file(self.output_dir, filenames[index])
+                            writes[index].append(
+                                self.writer.submit(
+                                    functools.partial(self._write_image, durations=write_seconds[index] if wait else None),
+                                    image, file_path,
+                                    on_saved=functools.partial(self._cache_image, cache_key)
+                                )
+                            )
+                        file_paths[index][image_index] = file_path
+                except Exception as e:
+                    for index in indices:
+                        responses[index] = {'error': f'Image generation failed: {str(e)}'}
+
+        for index, (user_id, input_json) in enumerate(requests):
+            if wait and writes[index]:
+                with traces[index].phase('save'):
+                    errors = [error for error in (future.exception() for future in writes[index]) if error is not None]
+                traces[index].add('write', sum(write_seconds[index]))
+                if errors and responses[index] is None:
+                    responses[index] = {'error': f'Image generation failed: {str(errors[0])}'}
+            if responses[index] is not None and file_paths[index]:
+                # Do not leave the images of a failed request on disk
+                self._remove_images(file_paths[index], writes[index])
+            elif responses[index] is None:
+                self.user_requests[user_id] = {
+                    'prompt': input_json['prompt'],
+                    'image_file_path': file_paths[index][0]
+                }
+                responses[index] = {'image_file_path': file_paths[index][0]}
+                if len(file_paths[index]) > 1:
+                    responses[index]['image_file_paths'] = file_paths[index]
+            responses[index] = self.metrics.finish_request(traces[index], responses[index])
+        return responses
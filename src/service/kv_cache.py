@@ -0,0 +1,172 @@
+# src/service/kv_cache.py
+
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class KVCache:
+    """
+    Per-user cache of the attention key/value tensors produced by the last turn.
+
+    Each entry keeps the token ids of the user's conversation together with the
+    past_key_values computed for them. On the next turn the longest common prefix
+    between the cached ids and the new prompt is reused, so only the new tokens
+    have to be prefilled. Entries are evicted in least-recently-used order once
+    the cached tensors exceed max_bytes.
+    """
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Memory budget for the cached tensors. 0 disables the cache.
+        """
+        self.max_bytes = self.DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.entries = OrderedDict()  # user_id -> (token_ids, past_key_values, nbytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_length(past_key_values):
+        return past_key_values[0][0].shape[-2]
+
+    @staticmethod
+    def _crop(past_key_values, length):
+        return tuple(
+            tuple(tensor[..., :length, :] for tensor in layer)
+            for layer in past_key_values
+        )
+
+    @staticmethod
+    def _select_row(past_key_values, row, start, end):
+        # Copy, so that one row does not keep the whole batch alive
+        return tuple(
+            tuple(tensor[row:row + 1, ..., start:end, :].clone() for tensor in layer)
+            for layer in past_key_values
+        )
+
+    @staticmethod
+    def _nbytes(past_key_values):
+        return sum(tensor.nelement() * tensor.element_size() for layer in past_key_values for tensor in layer)
+
+    def lookup(self, user_id, input_ids):
+        """
+        Find the cached key/values that can be reused for a new prompt.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_ids (torch.Tensor): Prompt token ids of shape (1, seq_len).
+
+        Returns:
+            tuple: (past_key_values, prefix_length), or (None, 0) if nothing can be reused.
+        """
+        with self._lock:
+            entry = self.entries.pop(user_id, None)
+            if entry is not None:
+                self.total_bytes -= entry[2]
+        if entry is None:
+            self.misses += 1
+            return None, 0
+
+        cached_ids, past_key_values, _ = entry
+        # At least one prompt token must be left for the model to prefill
+        limit = min(self._cache_length(past_key_values), input_ids.shape[-1] - 1)
+        mismatch = (cached_ids[:limit] != input_ids[0, :limit]).nonzero()
+        prefix_length = mismatch[0].item() if len(mismatch) else limit
+        if prefix_length == 0:
+            self.misses += 1
+            return None, 0
+
+        self.hits += 1
+        self.reused_tokens += prefix_length
+        return self._crop(past_key_values, prefix_length), prefix_length
+
+    def store(self, user_id, token_ids, past_key_values):
+        """
+        Cache the key/values of a finished turn, evicting old entries if needed.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            token_ids (torch.Tensor): 1-D token ids covered (at least) by past_key_values.
+            past_key_values (tuple | Cache): Per-layer (key, value) tensors returned by generate.
+        """
+        if past_key_values is None:
+            return
+        if hasattr(past_key_values, 'to_legacy_cache'):
+            past_key_values = past_key_values.to_legacy_cache()
+        nbytes = self._nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self.entries.pop(user_id, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+            self.entries[user_id] = (token_ids, past_key_values, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def discard(self, user_id):
+        """
+        Drop a user's cached key/values.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+        """
+        with self._lock:
+            entry = self.entries.pop(user_id, None)
+            if entry is not None:
+                self.total_bytes -= entry[2]
+
+    def generate(self, model, user_id, input_ids, trace=None, **generate_kwargs):
+        """
+        Run model.generate for a user's prompt, prefilling only the uncached tokens.
+
+        Args:
+            model (PreTrainedModel): The causal language model.
+            user_id (str): Unique identifier for the user.
+            input_ids (torch.Tensor): Full prompt token ids of shape (1, seq_len).
+            trace (RequestTrace): Request trace to count the reused tokens in, or None.
+            **generate_kwargs: Arguments forwarded to model.generate.
+
+        Returns:
+            torch.Tensor: Output token ids, as returned by model.generate.
+        """
+        past_key_values, prefix_length = self.lookup(user_id, input_ids)
+        if trace is not None:
+            trace.count('cached_tokens', prefix_length)
+        if past_key_values is not None:
+            generate_kwargs['past_key_values'] = past_key_values
+        generate_kwargs.setdefault('attention_mask', torch.ones_like(input_ids))
+
+        output = model.generate(input_ids, return_dict_in_generate=True, **generate_kwargs)
+        self.store(user_id, output.sequences[0], output.past_key_values)
+        return output.sequences
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Entry count, bytes in use and hit/miss/eviction counters.
+        """
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'reused_tokens': self.reused_tokens,
+        }
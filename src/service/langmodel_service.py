@@ -1,66 +1,54 @@
 # src/service/langmodel_service.py
 
 from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
 
-class LangModelService:
-    def __init__(self, model_name='microsoft/DialoGPT-small'):
+from .text_generation_service import TextGenerationService
+
+class LangModelService(TextGenerationService):
+    GENERATION_KWARGS = {
+        'do_sample': True,
+        'top_k': 100,
+        'top_p': 0.7,
+        'temperature': 0.8,
+    }
+
+    def __init__(self, model_name='microsoft/DialoGPT-small', kv_cache_bytes=None, session_store=None,
+                 registry=None, precision='fp32', metrics=None, draft_model_name=None,
+                 prefix_cache_bytes=None):
         """
         Initialize the language model service with the specified model.
         Using 'microsoft/DialoGPT-small' for conversational capabilities.
-        """
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(model_name)
-        self.user_sessions = {}  # Dictionary to hold user sessions
-
-    def process_request(self, user_id, input_json):
-        """
-        Process a user's request and generate a response.
 
         Args:
-            user_id (str): Unique identifier for the user.
-            input_json (dict): JSON object containing the user's input.
-
-        Returns:
-            dict: JSON response containing the assistant's reply.
+            model_name (str): Name or path of the model to load.
+            kv_cache_bytes (int): Memory budget for cached past_key_values (0 disables reuse).
+            session_store (SessionStore): Storage for user sessions, a bounded LRU store by default.
+            registry (ModelRegistry): Registry to share loaded models through, the process-wide one by default.
+            precision (str): Inference precision of the weights: 'fp32', 'bf16' or 'int8-dynamic'.
+            metrics (Metrics): Where request timings are recorded, the process-wide metrics by default.
+            draft_model_name (str): Smaller model with the same tokenizer for speculative decoding, e.g. 'distilgpt2'.
+            prefix_cache_bytes (int): Memory budget of a key/value cache shared by all users by token prefix.
         """
-        # Extract input text from JSON
-        input_text = input_json.get('input', '')
-        if not input_text:
-            return {'error': 'No input text provided'}
-
-        # Retrieve user's chat history
-        chat_history_ids = self.user_sessions.get(user_id, None)
-
-        # Encode the user's input and append EOS token
-        new_user_input_ids = self.tokenizer.encode(input_text + self.tokenizer.eos_token, return_tensors='pt')
-
-        # Append the new user input to the chat history
-        if chat_history_ids is not None:
-            bot_input_ids = torch.cat([chat_history_ids, new_user_input_ids], dim=-1)
-        else:
-            bot_input_ids = new_user_input_ids
-
-        # Generate the assistant's response
-        chat_history_ids = self.model.generate(
-            bot_input_ids,
-            max_length=bot_input_ids.shape[-1] + 50,
-            pad_token_id=self.tokenizer.eos_token_id,
-            do_sample=True,
-            top_k=100,
-            top_p=0.7,
-            temperature=0.8
+        super().__init__(
+            AutoTokenizer,
+            AutoModelForCausalLM,
+            model_name,
+            kv_cache_bytes=kv_cache_bytes,
+            session_store=session_store,
+            registry=registry,
+            precision=precision,
+            metrics=metrics,
+            draft_model_name=draft_model_name,
+            prefix_cache_bytes=prefix_cache_bytes
         )
 
-        # Decode the generated response
-        assistant_reply = self.tokenizer.decode(
-            chat_history_ids[:, bot_input_ids.shape[-1]:][0],
-            skip_special_tokens=True
-        )
+    def _format_input(self, input_text):
+        # End the user's turn with the EOS token
+        return input_text + self.tokenizer.eos_token
 
-        # Update the user's chat history
-        self.user_sessions[user_id] = chat_history_ids
+    def _build_prompt(self, history_ids, input_ids):
+        # Append the new user input to the chat history
+        prompt_ids = list(history_ids or []) + input_ids
 
-        # Return the assistant's reply as a JSON object
-        response_json = {'response': assistant_reply}
-        return response_json
+        # The assistant's reply is everything generated after the prompt
+        return prompt_ids, len(prompt_ids)
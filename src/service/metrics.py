@@ -0,0 +1,287 @@
+# src/service/metrics.py
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_CONTEXT = nullcontext()
+
+
+class _NullTrace:
+    """
+    Trace used when metrics are disabled and no trace was requested; every call is a no-op.
+    """
+    recorded = False
+
+    def phase(self, name):
+        return _NULL_CONTEXT
+
+    def add(self, name, seconds):
+        pass
+
+    def count(self, name, value):
+        pass
+
+    def generation_streamer(self, inner=None):
+        return inner
+
+
+NULL_TRACE = _NullTrace()
+
+
+class _GenerationTimer:
+    """
+    Streamer for generate() that splits its time into prefill and decode phases.
+
+    The prefill phase ends when the first new token arrives. Calls are forwarded
+    to an inner streamer, if any.
+    """
+
+    def __init__(self, trace, inner=None):
+        self.trace = trace
+        self.inner = inner
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.new_tokens = 0
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+        else:
+            if self.first_token is None:
+                self.first_token = time.perf_counter()
+            self.new_tokens += value.numel()
+        if self.inner is not None:
+            self.inner.put(value)
+
+    def end(self):
+        now = time.perf_counter()
+        first_token = self.first_token or now
+        self.trace.add('prefill', first_token - self.started)
+        self.trace.add('decode', now - first_token)
+        self.trace.count('new_tokens', self.new_tokens)
+        if self.inner is not None:
+            self.inner.end()
+
+
+class RequestTrace:
+    """
+    Phase timings and token counts of a single request.
+    """
+
+    def __init__(self, service, recorded=True, attach=False):
+        """
+        Initialize the trace.
+
+        Args:
+            service (str): Name of the service handling the request.
+            recorded (bool): Whether the trace is aggregated into the metrics.
+            attach (bool): Whether the trace is added to the response.
+        """
+        self.service = service
+        self.recorded = recorded
+        self.attach = attach
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def generation_streamer(self, inner=None):
+        """
+        Return a streamer for generate() that records prefill and decode time.
+
+        Args:
+            inner (BaseStreamer): Streamer to forward tokens to, or None.
+        """
+        return _GenerationTimer(self, inner)
+
+    def to_dict(self):
+        """
+        Return the trace as JSON-serializable data.
+
+        Returns:
+            dict: Total and per-phase milliseconds, and the token counts.
+        """
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'phases_ms': {name: seconds * 1000 for name, seconds in self.phases.items()},
+            'counts': dict(self.counts),
+        }
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, as exported by Prometheus.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        return {
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class Metrics:
+    """
+    Aggregates request traces into per-service, per-phase histograms and counters.
+
+    When disabled, start_request hands out a shared no-op trace, so the hot path
+    pays only for a few empty method calls.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the metrics.
+
+        Args:
+            enabled (bool): Whether requests are timed and aggregated.
+            buckets (tuple): Upper bounds of the latency histogram buckets, in seconds.
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}  # (service, phase) -> Histogram
+        self.counters = {}  # (service, name) -> int
+        self._lock = threading.Lock()
+
+    def start_request(self, service, trace=False):
+        """
+        Start timing a request.
+
+        Args:
+            service (str): Name of the service handling the request.
+            trace (bool): Whether the caller asked for the trace in the response.
+
+        Returns:
+            RequestTrace: The trace, or a no-op trace if metrics are disabled and no trace was asked for.
+        """
+        if not self.enabled and not trace:
+            return NULL_TRACE
+        return RequestTrace(service, recorded=self.enabled, attach=bool(trace))
+
+    def finish_request(self, trace, response):
+        """
+        Record a finished request and attach its trace to the response if asked for.
+
+        Args:
+            trace (RequestTrace): Trace returned by start_request.
+            response (dict): JSON response of the request.
+
+        Returns:
+            dict: The response.
+        """
+        if trace is NULL_TRACE:
+            return response
+        if 'error' in response:
+            trace.count('errors', 1)
+        if trace.recorded:
+            total = time.perf_counter() - trace.started
+            with self._lock:
+                self._observe(trace.service, 'total', total)
+                for phase, seconds in trace.phases.items():
+                    self._observe(trace.service, phase, seconds)
+                for name, value in dict(trace.counts, requests=1).items():
+                    self.counters[(trace.service, name)] = self.counters.get((trace.service, name), 0) + value
+        if trace.attach:
+            response['trace'] = trace.to_dict()
+        return response
+
+    def observe(self, service, phase, seconds):
+        """
+        Record the time of a phase that ends after its request was finished, e.g. a background write.
+
+        Args:
+            service (str): Name of the service that handled the request.
+            phase (str): Name of the phase.
+            seconds (float): Time spent in the phase.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._observe(service, phase, seconds)
+
+    def _observe(self, service, phase, seconds):
+        histogram = self.histograms.get((service, phase))
+        if histogram is None:
+            histogram = self.histograms[(service, phase)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def snapshot(self):
+        """
+        Return all histograms and counters as JSON-serializable data.
+
+        Returns:
+            dict: {service: {'phases': {phase: histogram}, 'counters': {name: value}}}.
+        """
+        with self._lock:
+            snapshot = {}
+            for (service, phase), histogram in self.histograms.items():
+                snapshot.setdefault(service, {'phases': {}, 'counters': {}})['phases'][phase] = histogram.to_dict()
+            for (service, name), value in self.counters.items():
+                snapshot.setdefault(service, {'phases': {}, 'counters': {}})['counters'][name] = value
+            return snapshot
+
+    def prometheus_text(self):
+        """
+        Return all histograms and counters in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        lines = [
+            '# HELP llm_request_phase_seconds Time spent in each phase of a request.',
+            '# TYPE llm_request_phase_seconds histogram',
+        ]
+        with self._lock:
+            for (service, phase), histogram in sorted(self.histograms.items()):
+                labels = f'service="{service}",phase="{phase}"'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'llm_request_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'llm_request_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'llm_request_phase_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'llm_request_phase_seconds_count{{{labels}}} {histogram.count}')
+
+            lines.append('# HELP llm_request_events_total Requests, tokens and other per-request counts.')
+            lines.append('# TYPE llm_request_events_total counter')
+            for (service, name), value in sorted(self.counters.items()):
+                lines.append(f'llm_request_events_total{{service="{service}",name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics shared by all services of the process
+metrics = Metrics()
@@ -0,0 +1,227 @@
+# src/service/model_registry.py
+
+import ctypes
+import ctypes.util
+import gc
+import threading
+import time
+
+
+def _release_freed_memory():
+    """
+    Collect garbage and, on glibc, return freed heap pages to the OS so that RSS goes down.
+    """
+    gc.collect()
+    libc_name = ctypes.util.find_library('c')
+    if libc_name is None:
+        return
+    try:
+        ctypes.CDLL(libc_name).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _resolve_class(loader_class, model_name):
+    """
+    Return the class an auto class (e.g. AutoModelForCausalLM) loads for a checkpoint, or loader_class itself.
+    """
+    model_mapping = getattr(loader_class, '_model_mapping', None)
+    if model_mapping is None:
+        return loader_class
+    try:
+        from transformers import AutoConfig
+
+        return model_mapping[type(AutoConfig.from_pretrained(model_name))]
+    except Exception:
+        return loader_class
+
+
+class _Entry:
+    __slots__ = ('value', 'error', 'refcount', 'last_used', 'idle_timeout', 'ready')
+
+    def __init__(self):
+        self.value = None
+        self.error = None
+        self.refcount = 0
+        self.last_used = time.monotonic()
+        self.idle_timeout = None
+        self.ready = threading.Event()
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads each model or tokenizer once and shares it.
+
+    Entries are keyed by the loaded class, model name, dtype and device, so an
+    auto class and the concrete class it resolves to share one copy. Every
+    acquire must be paired with a release; entries nobody holds are unloaded once
+    they have been idle for idle_timeout seconds. Concurrent first acquires of the
+    same key wait for a single load.
+    """
+    DEFAULT_IDLE_TIMEOUT = 300
+
+    def __init__(self, idle_timeout=None):
+        """
+        Initialize the registry.
+
+        Args:
+            idle_timeout (float): Seconds an unused entry is kept before it is unloaded.
+        """
+        self.idle_timeout = self.DEFAULT_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.loads = 0
+        self.unloads = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(loader_class, model_name, dtype=None, device=None, **kwargs):
+        """
+        Build the registry key for a from_pretrained call.
+
+        Args:
+            loader_class (type): Class whose from_pretrained loads the object; a transformers auto
+                model class is keyed as the class it resolves to for model_name.
+            model_name (str): Name or path of the model.
+            dtype (torch.dtype): Weight dtype, None for the default.
+            device (str): Device the object is moved to, None for the default.
+            **kwargs: Other from_pretrained arguments that change the loaded object.
+
+        Returns:
+            tuple: A hashable key.
+        """
+        loaded_class = _resolve_class(loader_class, model_name)
+        return (
+            f'{loaded_class.__module__}.{loaded_class.__qualname__}',
+            model_name,
+            str(dtype),
+            str(device),
+            tuple(sorted((name, str(value)) for name, value in kwargs.items())),
+        )
+
+    def acquire(self, key, loader):
+        """
+        Return the shared object for a key, loading it on first use.
+
+        Args:
+            key (tuple): Registry key, usually built with key().
+            loader (callable): Called without arguments to load the object.
+
+        Returns:
+            The shared object.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry()
+            entry.refcount += 1
+
+        if owner:
+            try:
+                entry.value = loader()
+                with self._lock:
+                    self.loads += 1
+                # Loading can leave large temporaries behind, e.g. fp32 weights cast to bf16
+                _release_freed_memory()
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    del self._entries[key]
+                raise
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+            if entry.error is not None:
+                raise entry.error
+        return entry.value
+
+    def acquire_pretrained(self, loader_class, model_name, dtype=None, device=None, **kwargs):
+        """
+        Acquire an object loaded with loader_class.from_pretrained.
+
+        Args:
+            loader_class (type): Class providing from_pretrained.
+            model_name (str): Name or path of the model.
+            dtype (torch.dtype): Weight dtype passed as torch_dtype, None for the default.
+            device (str): Device to move the object to, None to leave it where it loads.
+            **kwargs: Other arguments for from_pretrained.
+
+        Returns:
+            tuple: (key, object); pass the key to release() when done.
+        """
+        def load():
+            load_kwargs = dict(kwargs, torch_dtype=dtype) if dtype is not None else kwargs
+            loaded = loader_class.from_pretrained(model_name, **load_kwargs)
+            return loaded.to(device) if device is not None else loaded
+
+        key = self.key(loader_class, model_name, dtype=dtype, device=device, **kwargs)
+        return key, self.acquire(key, load)
+
+    def release(self, key, idle_timeout=None):
+        """
+        Drop one reference to a shared object.
+
+        Args:
+            key (tuple): Key the object was acquired with.
+            idle_timeout (float): Seconds to keep the object once nobody holds it, instead of
+                the registry's idle_timeout; 0 unloads it right away. The last release decides.
+        """
+        with self._lock:
+            entry = self._entries[key]
+            entry.refcount -= 1
+            entry.last_used = time.monotonic()
+            entry.idle_timeout = idle_timeout
+            idle = entry.refcount == 0
+            timeout = self._idle_timeout(entry)
+        # Hold no reference to the object while it may be unloaded below
+        del entry
+
+        if idle:
+            if timeout <= 0:
+                self.unload_idle()
+            else:
+                timer = threading.Timer(timeout, self.unload_idle)
+                timer.daemon = True
+                timer.start()
+
+    def _idle_timeout(self, entry):
+        return self.idle_timeout if entry.idle_timeout is None else entry.idle_timeout
+
+    def unload_idle(self):
+        """
+        Unload entries that nobody holds and that have been idle for their idle timeout.
+
+        Returns:
+            int: Number of entries unloaded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                key for key, entry in self._entries.items()
+                if entry.refcount == 0 and now - entry.last_used >= self._idle_timeout(entry)
+            ]
+            for key in idle:
+                del self._entries[key]
+            self.unloads += len(idle)
+        if idle:
+            _release_freed_memory()
+        return len(idle)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        """
+        Return registry counters.
+
+        Returns:
+            dict: Loaded entries with their reference counts, and load/unload counters.
+        """
+        with self._lock:
+            entries = {' '.join(key[:4]): entry.refcount for key, entry in self._entries.items()}
+        return {'entries': entries, 'loads': self.loads, 'unloads': self.unloads}
+
+
+# Registry shared by all services of the process
+registry = ModelRegistry()
@@ -0,0 +1,95 @@
+# src/service/pipeline_options.py
+
+# torch and diffusers are imported inside the functions, so the command-line
+# tools can list the presets before loading them
+
+# Scheduler presets: (diffusers scheduler class, config overrides, default number of steps).
+# 'default' keeps the scheduler the pipeline was saved with.
+SCHEDULERS = {
+    'default': (None, {}, 50),
+    'dpmpp': ('DPMSolverMultistepScheduler', {'algorithm_type': 'dpmsolver++', 'solver_order': 2}, 20),
+    'dpmpp-karras': (
+        'DPMSolverMultistepScheduler', {'algorithm_type': 'dpmsolver++', 'solver_order': 2, 'use_karras_sigmas': True},
+        20
+    ),
+    'euler': ('EulerDiscreteScheduler', {}, 25),
+    'euler-a': ('EulerAncestralDiscreteScheduler', {}, 25),
+    'unipc': ('UniPCMultistepScheduler', {}, 15),
+}
+DEFAULT_SCHEDULER = 'default'
+
+MEMORY_OPTIONS = ('attention_slicing', 'vae_tiling', 'channels_last')
+
+# Weight precisions of the pipeline; fp16 and bf16 halve the memory of the weights
+PRECISIONS = ('fp32', 'fp16', 'bf16')
+DEFAULT_PRECISION = 'fp32'
+
+
+def make_scheduler(preset, config):
+    """
+    Build the scheduler of a preset from the pipeline's scheduler config.
+
+    Args:
+        preset (str): One of SCHEDULERS.
+        config (FrozenDict): Config of the pipeline's scheduler (beta schedule, training steps).
+
+    Returns:
+        SchedulerMixin: A new scheduler, or None for 'default'.
+    """
+    import diffusers
+
+    if preset not in SCHEDULERS:
+        raise ValueError(f"scheduler must be one of {', '.join(SCHEDULERS)}.")
+    class_name, overrides, _ = SCHEDULERS[preset]
+    if class_name is None:
+        return None
+    return getattr(diffusers, class_name).from_config(config, **overrides)
+
+
+def load_pipeline(pipeline_class, model_name, device, memory_options=(), precision=DEFAULT_PRECISION):
+    """
+    Load a diffusion pipeline with little peak memory and apply CPU memory options.
+
+    Weights are read from the checkpoint's safetensors files, which are
+    memory-mapped instead of unpickled. With low_cpu_mem_usage the modules are
+    created without random initial weights and the stored weights are loaded
+    straight into them in the requested dtype, so loading does not hold two
+    copies of the weights; diffusers needs the accelerate package for this and
+    otherwise falls back to a regular load with a warning. 'fp16' (CUDA only)
+    and 'bf16' load the weights in half precision.
+
+    'attention_slicing' computes attention in slices (only useful without
+    PyTorch 2's scaled_dot_product_attention), 'vae_tiling' decodes large
+    images tile by tile and 'channels_last' stores the UNet weights in NHWC
+    layout, which CPU convolution kernels prefer.
+
+    Args:
+        pipeline_class (type): Pipeline class providing from_pretrained.
+        model_name (str): Name or path of the model.
+        device (str): Device to move the pipeline to.
+        memory_options (tuple): Names from MEMORY_OPTIONS.
+        precision (str): One of PRECISIONS.
+
+    Returns:
+        DiffusionPipeline: The loaded pipeline.
+    """
+    import torch
+
+    unknown = set(memory_options) - set(MEMORY_OPTIONS)
+    if unknown:
+        raise ValueError(f"memory_options must be among {', '.join(MEMORY_OPTIONS)}.")
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}.")
+    if precision == 'fp16' and not str(device).startswith('cuda'):
+        # PyTorch has no CPU kernels for several float16 operations (e.g. LayerNorm)
+        raise ValueError("precision 'fp16' needs a CUDA device; use 'bf16' on CPU.")
+
+    dtype = {'fp32': torch.float32, 'fp16': torch.float16, 'bf16': torch.bfloat16}[precision]
+    pipeline = pipeline_class.from_pretrained(model_name, torch_dtype=dtype, low_cpu_mem_usage=True).to(device)
+    if 'attention_slicing' in memory_options:
+        pipeline.enable_attention_slicing()
+    if 'vae_tiling' in memory_options:
+        pipeline.enable_vae_tiling()
+    if 'channels_last' in memory_options:
+        pipeline.unet.to(memory_format=torch.channels_last)
+    return pipeline
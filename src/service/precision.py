@@ -0,0 +1,49 @@
+# src/service/precision.py
+
+import torch
+from transformers.pytorch_utils import Conv1D
+
+PRECISIONS = ('fp32', 'bf16', 'int8-dynamic')
+DEFAULT_PRECISION = 'fp32'
+
+
+def _conv1d_to_linear(module):
+    # GPT-2 style models use Conv1D (weight stored as in x out) instead of nn.Linear
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def load_causal_lm(model_class, model_name, precision=DEFAULT_PRECISION):
+    """
+    Load a causal language model for CPU inference at the given precision.
+
+    'bf16' loads the weights as bfloat16. 'int8-dynamic' loads fp32 weights and
+    applies dynamic int8 quantization to the Linear layers (Conv1D layers of
+    GPT-2 style models are converted to Linear first so they are covered too).
+
+    Args:
+        model_class (type): Model class providing from_pretrained.
+        model_name (str): Name or path of the model.
+        precision (str): One of PRECISIONS.
+
+    Returns:
+        PreTrainedModel: The model in eval mode.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}.")
+
+    if precision == 'bf16':
+        return model_class.from_pretrained(model_name, torch_dtype=torch.bfloat16).eval()
+
+    model = model_class.from_pretrained(model_name).eval()
+    if precision == 'int8-dynamic':
+        _conv1d_to_linear(model)
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
@@ -0,0 +1,294 @@
+# src/service/prefix_cache.py
+
+import heapq
+import itertools
+import threading
+
+import torch
+
+from .kv_cache import KVCache
+from .metrics import Histogram
+
+# Upper bounds (tokens) of the hit length histogram buckets
+HIT_LENGTH_BUCKETS = (0, 16, 64, 256, 1024, 4096)
+
+
+class _Node:
+    """
+    Radix tree node: an edge of token ids and the key/values computed for those positions.
+    """
+    __slots__ = ('token_ids', 'past_key_values', 'nbytes', 'parent', 'children', 'refs', 'last_used')
+
+    def __init__(self, token_ids=(), past_key_values=None, parent=None):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.nbytes = 0 if past_key_values is None else KVCache._nbytes(past_key_values)
+        self.parent = parent
+        self.children = {}  # first token id of the child's edge -> child
+        self.refs = 0
+        self.last_used = 0
+
+
+def _slice(past_key_values, start, end):
+    # Copy, so that the slice does not keep the whole source tensors alive
+    return tuple(
+        tuple(tensor[..., start:end, :].clone() for tensor in layer)
+        for layer in past_key_values
+    )
+
+
+def _common_length(edge, token_ids, start, limit):
+    """
+    Length of the common prefix of edge and token_ids[start:], at most limit.
+    """
+    limit = min(len(edge), limit)
+    if tuple(token_ids[start:start + limit]) == edge[:limit]:
+        return limit
+    length = 0
+    while edge[length] == token_ids[start + length]:
+        length += 1
+    return length
+
+
+class PrefixCache:
+    """
+    Attention key/values shared by all users, indexed by token-id prefix in a radix tree.
+
+    Each edge of the tree holds the key/values of its tokens. Because a token's
+    key/values depend only on the tokens before it, any request whose prompt
+    starts with a cached path (a shared system prompt, or the user's own
+    earlier turns) reuses the key/values of the longest such prefix and
+    prefills only the rest. Paths in use by a running generation are
+    reference counted and never evicted; other leaves are evicted in
+    least-recently-used order once the cached tensors exceed max_bytes.
+
+    It offers the same generate, store, discard and stats as KVCache, so a
+    service can use either.
+    """
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Memory budget for the cached tensors. 0 disables the cache.
+        """
+        self.max_bytes = self.DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.root = _Node()
+        self.nodes = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+        self.hit_lengths = Histogram(HIT_LENGTH_BUCKETS)
+        self._clock = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def acquire(self, input_ids):
+        """
+        Find the longest cached prefix of a prompt and hold its path until release().
+
+        Args:
+            input_ids (torch.Tensor): Prompt token ids of shape (1, seq_len).
+
+        Returns:
+            tuple: (past_key_values, prefix_length, handle); (None, 0, handle) if nothing can be
+                reused. Pass the handle to release() once the generation is done.
+        """
+        token_ids = input_ids[0].tolist()
+        # At least one prompt token must be left for the model to prefill
+        limit = len(token_ids) - 1
+        with self._lock:
+            now = next(self._clock)
+            node, pieces, length = self.root, [], 0
+            while length < limit:
+                child = node.children.get(token_ids[length])
+                if child is None:
+                    break
+                used = _common_length(child.token_ids, token_ids, length, limit - length)
+                child.last_used = now
+                pieces.append((child, used))
+                node, length = child, length + used
+                if used < len(child.token_ids):
+                    break
+            self._add_refs(node, 1)
+
+            self.hit_lengths.observe(length)
+            if length == 0:
+                self.misses += 1
+                return None, 0, node
+            self.hits += 1
+            self.reused_tokens += length
+            # Concatenate under the lock: a concurrent insert may split the nodes of the path
+            past_key_values = tuple(
+                tuple(
+                    torch.cat([tensor[..., :used, :] for tensor, (_, used) in zip(tensors, pieces)], dim=-2)
+                    for tensors in zip(*layer)
+                )
+                for layer in zip(*(piece.past_key_values for piece, _ in pieces))
+            )
+        return past_key_values, length, node
+
+    def release(self, handle):
+        """
+        Let the path held by acquire() be evicted again.
+
+        Args:
+            handle: The handle returned by acquire().
+        """
+        with self._lock:
+            self._add_refs(handle, -1)
+
+    def _add_refs(self, node, delta):
+        while node is not None:
+            node.refs += delta
+            node = node.parent
+
+    def insert(self, token_ids, past_key_values):
+        """
+        Add the key/values of a sequence, storing only the positions not cached yet.
+
+        Args:
+            token_ids (torch.Tensor): 1-D token ids covered (at least) by past_key_values.
+            past_key_values (tuple | Cache): Per-layer (key, value) tensors returned by generate.
+        """
+        if past_key_values is None or self.max_bytes == 0:
+            return
+        if hasattr(past_key_values, 'to_legacy_cache'):
+            past_key_values = past_key_values.to_legacy_cache()
+        if KVCache._nbytes(past_key_values) > self.max_bytes:
+            return
+        token_ids = token_ids[:KVCache._cache_length(past_key_values)].tolist()
+
+        with self._lock:
+            now = next(self._clock)
+            node, length = self.root, 0
+            while length < len(token_ids):
+                child = node.children.get(token_ids[length])
+                if child is None:
+                    child = _Node(tuple(token_ids[length:]), _slice(past_key_values, length, len(token_ids)), node)
+                    node.children[token_ids[length]] = child
+                    self.nodes += 1
+                    self.total_bytes += child.nbytes
+                    child.last_used = now
+                    break
+                used = _common_length(child.token_ids, token_ids, length, len(token_ids) - length)
+                if used < len(child.token_ids):
+                    child = self._split(child, used)
+                child.last_used = now
+                node, length = child, length + used
+            self._evict()
+
+    def _split(self, node, length):
+        """
+        Split a node's edge after length tokens; the node keeps the rest and its children.
+
+        Returns:
+            _Node: The new node holding the first length tokens.
+        """
+        parent = _Node(node.token_ids[:length], _slice(node.past_key_values, 0, length), node.parent)
+        # The new node lies on every path through the old one, so it inherits its references
+        parent.refs = node.refs
+        parent.last_used = node.last_used
+        parent.children[node.token_ids[length]] = node
+        node.parent.children[node.token_ids[0]] = parent
+
+        self.total_bytes -= node.nbytes
+        node.token_ids = node.token_ids[length:]
+        node.past_key_values = _slice(node.past_key_values, length, length + len(node.token_ids))
+        node.nbytes = KVCache._nbytes(node.past_key_values)
+        node.parent = parent
+        self.total_bytes += node.nbytes + parent.nbytes
+        self.nodes += 1
+        return parent
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        order = itertools.count()
+        leaves, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children.values())
+            if not node.children and node.refs == 0 and node is not self.root:
+                leaves.append((node.last_used, next(order), node))
+        heapq.heapify(leaves)
+
+        while self.total_bytes > self.max_bytes and leaves:
+            _, _, leaf = heapq.heappop(leaves)
+            parent = leaf.parent
+            del parent.children[leaf.token_ids[0]]
+            self.nodes -= 1
+            self.total_bytes -= leaf.nbytes
+            self.evictions += 1
+            if parent is not self.root and not parent.children and parent.refs == 0:
+                heapq.heappush(leaves, (parent.last_used, next(order), parent))
+
+    def store(self, user_id, token_ids, past_key_values):
+        """
+        Add the key/values of a finished turn; same as insert, with the signature of KVCache.store.
+
+        Args:
+            user_id (str): Unique identifier for the user (unused: the cache is shared).
+            token_ids (torch.Tensor): 1-D token ids covered (at least) by past_key_values.
+            past_key_values (tuple | Cache): Per-layer (key, value) tensors returned by generate.
+        """
+        self.insert(token_ids, past_key_values)
+
+    def discard(self, user_id):
+        """
+        Keep the cached key/values of a forgotten user: they are shared and age out in LRU order.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+        """
+
+    def generate(self, model, user_id, input_ids, trace=None, **generate_kwargs):
+        """
+        Run model.generate for a prompt, prefilling only the tokens after the longest cached prefix.
+
+        Args:
+            model (PreTrainedModel): The causal language model.
+            user_id (str): Unique identifier for the user (unused: the cache is shared).
+            input_ids (torch.Tensor): Full prompt token ids of shape (1, seq_len).
+            trace (RequestTrace): Request trace to count the reused tokens in, or None.
+            **generate_kwargs: Arguments forwarded to model.generate.
+
+        Returns:
+            torch.Tensor: Output token ids, as returned by model.generate.
+        """
+        past_key_values, prefix_length, handle = self.acquire(input_ids)
+        try:
+            if trace is not None:
+                trace.count('cached_tokens', prefix_length)
+            if past_key_values is not None:
+                generate_kwargs['past_key_values'] = past_key_values
+            generate_kwargs.setdefault('attention_mask', torch.ones_like(input_ids))
+
+            output = model.generate(input_ids, return_dict_in_generate=True, **generate_kwargs)
+            self.insert(output.sequences[0], output.past_key_values)
+        finally:
+            self.release(handle)
+        return output.sequences
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Node count, bytes in use, hit/miss/eviction counters and the histogram of
+                reused prefix lengths per lookup.
+        """
+        with self._lock:
+            return {
+                'nodes': self.nodes,
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reused_tokens': self.reused_tokens,
+                'hit_lengths': self.hit_lengths.to_dict(),
+            }
@@ -0,0 +1,97 @@
+# src/service/prompt_cache.py
+
+import threading
+from collections import OrderedDict
+
+
+class PromptEmbeddingCache:
+    """
+    LRU cache of text-encoder outputs keyed by the tokenized prompt.
+
+    Keys are tuples of token ids, so prompts that tokenize the same (including
+    prompts truncated to the same length) share an entry. The time spent encoding
+    misses is tracked to estimate how much encoder time the hits saved.
+    """
+    DEFAULT_MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of cached embeddings (0 disables the cache).
+        """
+        self.max_entries = self.DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+        self.entries = OrderedDict()  # token id tuple -> embedding tensor
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encode_seconds = 0.0  # Time spent encoding the misses
+        self._lock = threading.Lock()
+
+    def get(self, token_ids):
+        """
+        Return the cached embedding of a tokenized prompt and mark it as recently used.
+
+        Args:
+            token_ids (tuple): Token ids of the prompt.
+
+        Returns:
+            torch.Tensor: The embedding, or None on a miss.
+        """
+        with self._lock:
+            embedding = self.entries.get(token_ids)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token_ids)
+            self.hits += 1
+            return embedding
+
+    def put(self, token_ids, embedding):
+        """
+        Add the embedding of a tokenized prompt.
+
+        Args:
+            token_ids (tuple): Token ids of the prompt.
+            embedding (torch.Tensor): Text-encoder output for the prompt.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self.entries[token_ids] = embedding
+            self.entries.move_to_end(token_ids)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_encode(self, seconds):
+        """
+        Add the time spent encoding missed prompts.
+
+        Args:
+            seconds (float): Encoder wall time.
+        """
+        with self._lock:
+            self.encode_seconds += seconds
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Entries, hits, misses, evictions, hit rate, mean encode time of a
+                miss and the encoder time the hits saved, in milliseconds.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            mean_encode_ms = self.encode_seconds / self.misses * 1000 if self.misses else 0.0
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'mean_encode_ms': mean_encode_ms,
+                'saved_ms': self.hits * mean_encode_ms,
+            }
@@ -0,0 +1,224 @@
+# src/service/session_store.py
+
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# Token ids are kept as C ints (4 bytes), a quarter of an int64 tensor
+TOKEN_TYPECODE = 'i'
+
+_MISSING = object()
+
+
+def to_token_array(token_ids):
+    """
+    Convert token ids to a compact int32 array.
+
+    Args:
+        token_ids (torch.Tensor | list | array): 1-D sequence of token ids.
+
+    Returns:
+        array: The token ids as array('i').
+    """
+    if isinstance(token_ids, array) and token_ids.typecode == TOKEN_TYPECODE:
+        return token_ids
+    if hasattr(token_ids, 'tolist'):
+        token_ids = token_ids.tolist()
+    return array(TOKEN_TYPECODE, token_ids)
+
+
+class SessionStore:
+    """
+    Interface for per-user session storage used by the services.
+
+    Implementations must be safe to call from several threads. Besides the
+    methods below, the dict-style accessors used by callers (store[user_id],
+    user_id in store, len(store)) are provided on top of them.
+    """
+
+    def get(self, user_id, default=None):
+        raise NotImplementedError
+
+    def put(self, user_id, value):
+        raise NotImplementedError
+
+    def pop(self, user_id, default=None):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Persist buffered writes; stores that keep nothing outside memory have nothing to do.
+        """
+
+    def close(self):
+        """
+        Persist buffered writes and release the store's files and threads.
+        """
+
+    def __getitem__(self, user_id):
+        value = self.get(user_id, _MISSING)
+        if value is _MISSING:
+            raise KeyError(user_id)
+        return value
+
+    def __setitem__(self, user_id, value):
+        self.put(user_id, value)
+
+    def __delitem__(self, user_id):
+        if self.pop(user_id, _MISSING) is _MISSING:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id):
+        return self.get(user_id, _MISSING) is not _MISSING
+
+
+class LRUSessionStore(SessionStore):
+    """
+    In-memory session store with a token window, a global memory cap and LRU/TTL eviction.
+
+    Token sequences (tensors, lists or arrays) are stored as int32 arrays and
+    truncated from the left to the last max_tokens tokens, so a session always
+    fits the model context. Other values (e.g. request metadata dicts) are
+    stored as they are and only count towards the memory cap.
+    """
+    # Approximate bookkeeping cost of one entry (OrderedDict node and tuple)
+    ENTRY_OVERHEAD = 120
+
+    def __init__(self, max_tokens=None, max_bytes=None, max_sessions=None, ttl=None):
+        """
+        Initialize the store.
+
+        Args:
+            max_tokens (int): Per-session token window, None for no truncation.
+            max_bytes (int): Approximate cap on memory used by all sessions.
+            max_sessions (int): Cap on the number of sessions.
+            ttl (float): Seconds of inactivity after which a session expires.
+        """
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.entries = OrderedDict()  # user_id -> (value, nbytes, last_access)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def _compact(self, value):
+        if hasattr(value, 'tolist') or isinstance(value, list):
+            value = to_token_array(value)
+        if isinstance(value, array) and self.max_tokens is not None and len(value) > self.max_tokens:
+            value = value[-self.max_tokens:]
+        return value
+
+    def _sizeof(self, user_id, value):
+        size = self.ENTRY_OVERHEAD + sys.getsizeof(user_id) + sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(item) for item in value.values())
+        return size
+
+    def _remove(self, user_id):
+        value, nbytes, _ = self.entries.pop(user_id)
+        self.total_bytes -= nbytes
+        return value
+
+    def _expire(self, now):
+        # Entries are kept in access order, so expired ones are at the front
+        while self.entries:
+            user_id, (_, _, last_access) = next(iter(self.entries.items()))
+            if now - last_access <= self.ttl:
+                break
+            self._remove(user_id)
+            self.expirations += 1
+
+    def _over_capacity(self):
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            return True
+        return self.max_sessions is not None and len(self.entries) > self.max_sessions
+
+    def get(self, user_id, default=None):
+        """
+        Return a user's session and mark it as recently used.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            default: Value returned when there is no live session.
+
+        Returns:
+            The stored session value, or default.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and self.ttl is not None and now - entry[2] > self.ttl:
+                self._remove(user_id)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            value, nbytes, _ = entry
+            self.entries[user_id] = (value, nbytes, now)
+            self.entries.move_to_end(user_id)
+            return value
+
+    def put(self, user_id, value):
+        """
+        Store a user's session, evicting expired and least recently used sessions as needed.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            value: Token ids of the conversation, or any other session value.
+        """
+        value = self._compact(value)
+        nbytes = self._sizeof(user_id, value)
+        now = time.monotonic()
+        with self._lock:
+            if user_id in self.entries:
+                self._remove(user_id)
+            self.entries[user_id] = (value, nbytes, now)
+            self.total_bytes += nbytes
+
+            if self.ttl is not None:
+                self._expire(now)
+            while self._over_capacity() and len(self.entries) > 1:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def pop(self, user_id, default=None):
+        with self._lock:
+            if user_id not in self.entries:
+                return default
+            return self._remove(user_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """
+        Return store counters.
+
+        Returns:
+            dict: Session count, bytes in use and hit/miss/eviction counters.
+        """
+        return {
+            'sessions': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
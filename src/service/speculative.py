@@ -0,0 +1,124 @@
+# src/service/speculative.py
+
+import threading
+
+
+def vocabularies_match(target_tokenizer, target_config, draft_tokenizer, draft_config):
+    """
+    Check whether a draft model can propose tokens for a target model.
+
+    Assisted generation compares token ids and logits directly, so both models
+    must use the same vocabulary. Only tokenizers and configs are compared, so
+    a mismatched draft is rejected before its weights are loaded.
+
+    Args:
+        target_tokenizer (PreTrainedTokenizer): Tokenizer of the target model.
+        target_config (PretrainedConfig): Config of the target model.
+        draft_tokenizer (PreTrainedTokenizer): Tokenizer of the draft model.
+        draft_config (PretrainedConfig): Config of the draft model.
+
+    Returns:
+        bool: True if the vocabularies are identical.
+    """
+    return (
+        target_config.vocab_size == draft_config.vocab_size
+        and target_tokenizer.eos_token_id == draft_tokenizer.eos_token_id
+        and target_tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+    )
+
+
+class SpeculativeDecoder:
+    """
+    Assisted generation with a small draft model, and its acceptance statistics.
+
+    The draft model proposes a few tokens per step and the target model checks
+    them in one forward pass; generate() keeps the longest prefix the target
+    agrees with plus one token of its own, so greedy output is unchanged.
+    Forward passes of both models are counted per thread with forward hooks:
+    every target pass is one verification step and every draft pass proposes one
+    token, which gives the accepted tokens of a call as new tokens minus steps.
+    """
+
+    def __init__(self, target_model, draft_model):
+        """
+        Initialize the decoder.
+
+        Args:
+            target_model (PreTrainedModel): The model whose output is returned.
+            draft_model (PreTrainedModel): Smaller model with the same vocabulary.
+        """
+        self.draft_model = draft_model
+        self.max_length = draft_model.config.max_position_embeddings
+        self.steps = 0
+        self.draft_tokens = 0
+        self.accepted_tokens = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hooks = [
+            target_model.register_forward_hook(lambda module, args, output: self._count('steps')),
+            draft_model.register_forward_hook(lambda module, args, output: self._count('draft_tokens')),
+        ]
+
+    def _count(self, name):
+        counts = getattr(self._local, 'counts', None)
+        if counts is not None:
+            counts[name] += 1
+
+    def supports(self, total_length):
+        """
+        Return whether a generation of total_length tokens fits the draft model's context.
+        """
+        return total_length <= self.max_length
+
+    def generate(self, generate, input_ids, trace, **generate_kwargs):
+        """
+        Run a generate call with the draft model as assistant and count its draft and accepted tokens.
+
+        Args:
+            generate (callable): Called as generate(input_ids, trace=trace, **generate_kwargs), e.g.
+                a bound KVCache.generate; it returns the output sequences.
+            input_ids (torch.Tensor): Prompt token ids of shape (1, seq_len).
+            trace (RequestTrace): Trace to add 'draft_tokens' and 'accepted_tokens' to.
+            **generate_kwargs: Other arguments for model.generate.
+
+        Returns:
+            torch.Tensor: Output token ids.
+        """
+        self._local.counts = counts = {'steps': 0, 'draft_tokens': 0}
+        try:
+            output_ids = generate(input_ids, trace=trace, assistant_model=self.draft_model, **generate_kwargs)
+        finally:
+            self._local.counts = None
+
+        # Each verification step keeps the accepted draft tokens plus one token of the target
+        new_tokens = output_ids.shape[-1] - input_ids.shape[-1]
+        accepted = min(max(new_tokens - counts['steps'], 0), counts['draft_tokens'])
+        trace.count('draft_tokens', counts['draft_tokens'])
+        trace.count('accepted_tokens', accepted)
+        with self._lock:
+            self.steps += counts['steps']
+            self.draft_tokens += counts['draft_tokens']
+            self.accepted_tokens += accepted
+        return output_ids
+
+    def close(self):
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+
+    def stats(self):
+        """
+        Return acceptance counters.
+
+        Returns:
+            dict: Verification steps, proposed and accepted draft tokens, the
+                acceptance rate and the mean number of tokens per target forward pass.
+        """
+        with self._lock:
+            return {
+                'steps': self.steps,
+                'draft_tokens': self.draft_tokens,
+                'accepted_tokens': self.accepted_tokens,
+                'acceptance_rate': self.accepted_tokens / self.draft_tokens if self.draft_tokens else 0.0,
+                'tokens_per_step': (self.accepted_tokens + self.steps) / self.steps if self.steps else 0.0,
+            }
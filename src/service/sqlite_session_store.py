@@ -0,0 +1,242 @@
+# src/service/sqlite_session_store.py
+
+import json
+import logging
+import sqlite3
+import sys
+import threading
+from array import array
+
+from .session_store import TOKEN_TYPECODE, SessionStore, to_token_array
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_DELETED = object()
+
+# Value kinds stored with each row
+_TOKENS = 0
+_JSON = 1
+
+
+def _encode(value):
+    if isinstance(value, array):
+        if sys.byteorder == 'big':
+            value = array(TOKEN_TYPECODE, value)
+            value.byteswap()
+        # Little-endian int32, so the file can be moved between machines
+        return _TOKENS, value.tobytes()
+    return _JSON, json.dumps(value).encode('utf-8')
+
+
+def _decode(kind, blob):
+    if kind == _TOKENS:
+        value = array(TOKEN_TYPECODE)
+        value.frombytes(blob)
+        if sys.byteorder == 'big':
+            value.byteswap()
+        return value
+    return json.loads(blob)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store that persists sessions in a local SQLite file, so they survive restarts.
+
+    Token sequences are stored as little-endian int32 blobs, one row per user;
+    other JSON-serializable values (e.g. request metadata dicts) as JSON.
+    Opening the store reads nothing: a session is loaded when it is first asked
+    for, with a primary-key lookup that reads the file through a memory map.
+
+    put() only updates an in-memory write buffer; a background thread commits
+    the buffered sessions in one transaction every flush_interval seconds (or
+    once max_pending sessions are waiting). The database runs in WAL mode with
+    synchronous=NORMAL, so commits append to the log without an fsync each.
+    A process crash loses at most the last flush_interval of writes; call
+    flush() to commit right away. A failed commit is logged and retried on the
+    next interval. Several processes can share the file, e.g. to move a user to
+    another worker, and see each other's committed sessions.
+    """
+    DEFAULT_FLUSH_INTERVAL = 0.5
+    DEFAULT_MAX_PENDING = 1024
+    DEFAULT_MMAP_BYTES = 256 * 1024 * 1024
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, path, max_tokens=None, flush_interval=None, max_pending=None, mmap_bytes=None):
+        """
+        Open or create the store.
+
+        Args:
+            path (str): SQLite database file.
+            max_tokens (int): Per-session token window, None for no truncation.
+            flush_interval (float): Seconds between background commits of buffered writes.
+            max_pending (int): Buffered sessions that trigger a commit before flush_interval.
+            mmap_bytes (int): Size of the memory map SQLite reads the file through.
+        """
+        self.path = path
+        self.max_tokens = max_tokens
+        self.flush_interval = flush_interval or self.DEFAULT_FLUSH_INTERVAL
+        self.max_pending = max_pending or self.DEFAULT_MAX_PENDING
+        self.mmap_bytes = self.DEFAULT_MMAP_BYTES if mmap_bytes is None else mmap_bytes
+        self.pending = {}  # user_id -> value or _DELETED, not committed yet
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.commits = 0
+        self._pending_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self._writer = self._connect()
+        self._writer.execute('PRAGMA journal_mode=WAL')
+        self._writer.execute('PRAGMA synchronous=NORMAL')
+        self._writer.execute(
+            'CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, kind INTEGER NOT NULL, value BLOB NOT NULL)'
+        )
+        self._writer.commit()
+        self._reader = self._connect()
+        self._reader.execute(f'PRAGMA mmap_size={int(self.mmap_bytes)}')
+
+        self._closed = False
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name='session-store', daemon=True)
+        self._flusher.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        connection.execute(f'PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}')
+        return connection
+
+    def __reduce__(self):
+        # A store handed to another process (e.g. in WorkerPool service_kwargs) opens the same file there
+        return type(self), (self.path, self.max_tokens, self.flush_interval, self.max_pending, self.mmap_bytes)
+
+    def _compact(self, value):
+        if hasattr(value, 'tolist') or isinstance(value, list):
+            value = to_token_array(value)
+        if isinstance(value, array) and self.max_tokens is not None and len(value) > self.max_tokens:
+            value = value[-self.max_tokens:]
+        return value
+
+    def get(self, user_id, default=None):
+        """
+        Return a user's session, loading it from the file if it is not buffered.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            default: Value returned when there is no session.
+
+        Returns:
+            The stored session value, or default.
+        """
+        with self._pending_lock:
+            value = self.pending.get(user_id, _MISSING)
+        if value is _MISSING:
+            with self._read_lock:
+                row = self._reader.execute(
+                    'SELECT kind, value FROM sessions WHERE user_id = ?', (user_id,)
+                ).fetchone()
+            value = _MISSING if row is None else _decode(*row)
+        if value is _MISSING or value is _DELETED:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, user_id, value):
+        """
+        Buffer a user's session for the next batched commit.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            value: Token ids of the conversation, or another JSON-serializable session value.
+        """
+        self._set(user_id, self._compact(value))
+
+    def pop(self, user_id, default=None):
+        value = self.get(user_id, _MISSING)
+        if value is _MISSING:
+            return default
+        self._set(user_id, _DELETED)
+        return value
+
+    def _set(self, user_id, value):
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError('SQLiteSessionStore is closed')
+            self.pending[user_id] = value
+            full = len(self.pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Commit the buffered sessions in one transaction.
+
+        Returns:
+            int: Number of sessions written or deleted.
+        """
+        with self._write_lock:
+            with self._pending_lock:
+                batch = dict(self.pending)
+            if not batch:
+                return 0
+            deleted = [(user_id,) for user_id, value in batch.items() if value is _DELETED]
+            rows = [(user_id, *_encode(value)) for user_id, value in batch.items() if value is not _DELETED]
+            with self._writer:
+                self._writer.executemany('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', rows)
+                self._writer.executemany('DELETE FROM sessions WHERE user_id = ?', deleted)
+            self.writes += len(batch)
+            self.commits += 1
+            # Keep sessions that were changed again while this batch was committed
+            with self._pending_lock:
+                for user_id, value in batch.items():
+                    if self.pending.get(user_id) is value:
+                        del self.pending[user_id]
+        return len(batch)
+
+    def _flush_periodically(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # e.g. the file is locked for longer than BUSY_TIMEOUT_MS; the batch stays buffered
+                logger.exception('Committing %d sessions to %s failed, retrying', len(self.pending), self.path)
+
+    def close(self):
+        """
+        Commit the buffered sessions, stop the background thread and close the file.
+        """
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+            self._reader.close()
+
+    def __len__(self):
+        self.flush()
+        with self._read_lock:
+            return self._reader.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def stats(self):
+        """
+        Return store counters.
+
+        Returns:
+            dict: Buffered sessions, hit/miss counters, and sessions written and commits made.
+        """
+        return {
+            'pending': len(self.pending),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'commits': self.commits,
+        }
@@ -0,0 +1,115 @@
+# src/service/streaming.py
+
+import queue
+
+import torch
+from transformers import StoppingCriteria
+from transformers.generation.streamers import BaseStreamer
+
+_END = object()
+
+
+class TokenStreamer(BaseStreamer):
+    """
+    Streamer that hands the token ids produced by generate to another thread.
+
+    generate() calls put() with the prompt first and then with every new token;
+    the prompt is skipped. Iterating over the streamer yields lists of new token
+    ids until generation ends, and re-raises an error reported with fail().
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        self._queue.put(value.reshape(-1).tolist())
+
+    def end(self):
+        self._queue.put(_END)
+
+    def fail(self, error):
+        self._queue.put(error)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class CancelledCriteria(StoppingCriteria):
+    """
+    Stopping criterion that ends generation once a threading.Event is set.
+    """
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class IncrementalDetokenizer:
+    """
+    Turns a growing list of token ids into text deltas without re-decoding the whole sequence.
+
+    Only the tokens since the last emitted chunk (plus a few tokens of context,
+    so that merges and spacing come out right) are decoded on each step. Text
+    ending in an incomplete UTF-8 sequence is held back until it is complete.
+    """
+    CONTEXT_TOKENS = 5
+
+    def __init__(self, tokenizer, token_ids=None, skip_special_tokens=True):
+        """
+        Initialize the detokenizer.
+
+        Args:
+            tokenizer (PreTrainedTokenizer): Tokenizer used to decode.
+            token_ids (list): Tokens already shown to the reader, used as decoding context.
+            skip_special_tokens (bool): Whether to drop special tokens from the text.
+        """
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.token_ids = list(token_ids or [])
+        self.read_offset = len(self.token_ids)
+        self.prefix_offset = max(self.read_offset - self.CONTEXT_TOKENS, 0)
+
+    def _decode(self, token_ids):
+        return self.tokenizer.decode(token_ids, skip_special_tokens=self.skip_special_tokens)
+
+    def push(self, token_ids, final=False):
+        """
+        Add new tokens and return the text that became available.
+
+        Args:
+            token_ids (list): Newly generated token ids.
+            final (bool): Emit held-back text even if it ends in an incomplete character.
+
+        Returns:
+            str: The new text, possibly empty.
+        """
+        self.token_ids.extend(token_ids)
+        prefix_text = self._decode(self.token_ids[self.prefix_offset:self.read_offset])
+        new_text = self._decode(self.token_ids[self.prefix_offset:])
+        if len(new_text) <= len(prefix_text) or (new_text.endswith('\ufffd') and not final):
+            return ''
+
+        self.prefix_offset = self.read_offset
+        self.read_offset = len(self.token_ids)
+        return new_text[len(prefix_text):]
+
+    def flush(self):
+        """
+        Return any text still held back at the end of the stream.
+
+        Returns:
+            str: The remaining text, possibly empty.
+        """
+        return self.push([], final=True)
@@ -0,0 +1,404 @@
+# src/service/text_generation_service.py
+
+import functools
+import threading
+import time
+import warnings
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, StoppingCriteriaList
+
+from . import metrics as metrics_module
+from . import model_registry
+from .kv_cache import KVCache
+from .prefix_cache import PrefixCache
+from .precision import DEFAULT_PRECISION, load_causal_lm
+from .session_store import LRUSessionStore
+from .speculative import SpeculativeDecoder, vocabularies_match
+from .streaming import CancelledCriteria, IncrementalDetokenizer, TokenStreamer
+
+
+class TextGenerationService:
+    """
+    Shared request handling for the causal language model services.
+
+    Subclasses pass their tokenizer and model classes, set GENERATION_KWARGS and
+    implement _build_prompt, which turns a user's history and encoded new input
+    into prompt ids. The tokenizer and weights are shared through the model
+    registry. Sessions are kept as token ids: each turn encodes only the new
+    input and decodes only the new tokens, so its cost does not grow with the
+    conversation.
+
+    With a draft model, single requests use assisted (speculative) generation:
+    the draft proposes tokens that the model verifies in one forward pass.
+    """
+    MAX_NEW_TOKENS = 50
+    DEFAULT_SESSION_BYTES = 64 * 1024 * 1024
+    GENERATION_KWARGS = {}
+
+    def __init__(self, tokenizer_class, model_class, model_name, kv_cache_bytes=None, session_store=None,
+                 registry=None, precision=DEFAULT_PRECISION, metrics=None, draft_model_name=None,
+                 prefix_cache_bytes=None):
+        """
+        Initialize the shared service state.
+
+        Args:
+            tokenizer_class (type): Tokenizer class to load with from_pretrained.
+            model_class (type): Causal language model class to load with from_pretrained.
+            model_name (str): Name or path of the model to load.
+            kv_cache_bytes (int): Memory budget for cached past_key_values (0 disables reuse).
+            session_store (SessionStore): Storage for user sessions, a bounded LRU store by default.
+            registry (ModelRegistry): Registry to share loaded models through, the process-wide one by default.
+            precision (str): Inference precision of the weights: 'fp32', 'bf16' or 'int8-dynamic'.
+            metrics (Metrics): Where request timings are recorded, the process-wide metrics by default.
+            draft_model_name (str): Smaller model with the same tokenizer for speculative decoding, e.g. 'distilgpt2'.
+            prefix_cache_bytes (int): Memory budget of a key/value cache shared by all users and indexed
+                by token prefix; replaces the per-user cache. None or 0 keeps the per-user cache.
+        """
+        self.model_name = model_name
+        self.precision = precision
+        self.metrics = metrics_module.metrics if metrics is None else metrics
+        self.registry = model_registry.registry if registry is None else registry
+        self._tokenizer_key, self.tokenizer = self.registry.acquire_pretrained(tokenizer_class, model_name)
+        self._model_key = self.registry.key(model_class, model_name, dtype=precision)
+        self.model = self.registry.acquire(self._model_key, lambda: load_causal_lm(model_class, model_name, precision))
+        # Leave room for the generated tokens inside the model context
+        self.max_prompt_tokens = self.model.config.max_position_embeddings - self.MAX_NEW_TOKENS
+        if session_store is None:
+            session_store = LRUSessionStore(max_tokens=self.max_prompt_tokens, max_bytes=self.DEFAULT_SESSION_BYTES)
+        self.user_sessions = session_store  # Token ids of each user's conversation
+        if prefix_cache_bytes:
+            self.kv_cache = PrefixCache(max_bytes=prefix_cache_bytes)  # past_key_values shared by token prefix
+        else:
+            self.kv_cache = KVCache(max_bytes=kv_cache_bytes)  # Per-user past_key_values
+        self.speculative = None
+        if draft_model_name:
+            self._load_draft_model(draft_model_name)
+
+    def _load_draft_model(self, draft_model_name):
+        """
+        Load a draft model for speculative decoding, or warn and decode without one if its vocabulary differs.
+
+        Args:
+            draft_model_name (str): Name or path of the draft model.
+        """
+        draft_tokenizer_key, draft_tokenizer = self.registry.acquire_pretrained(AutoTokenizer, draft_model_name)
+        try:
+            # Compare before loading the draft weights: a mismatched draft then costs only its tokenizer and config
+            matches = vocabularies_match(
+                self.tokenizer, self.model.config, draft_tokenizer, AutoConfig.from_pretrained(draft_model_name)
+            )
+        finally:
+            self.registry.release(draft_tokenizer_key)
+        if not matches:
+            warnings.warn(
+                f'Draft model {draft_model_name} does not share the tokenizer of {self.model_name}; '
+                'decoding without it.'
+            )
+            return
+        self._draft_model_key = self.registry.key(AutoModelForCausalLM, draft_model_name, dtype=self.precision)
+        draft_model = self.registry.acquire(
+            self._draft_model_key, lambda: load_causal_lm(AutoModelForCausalLM, draft_model_name, self.precision)
+        )
+        self.speculative = SpeculativeDecoder(self.model, draft_model)
+
+    def close(self):
+        """
+        Close the session store and release the shared tokenizer and model so the registry can unload them.
+        """
+        self.user_sessions.close()
+        if self.speculative is not None:
+            self.speculative.close()
+            self.registry.release(self._draft_model_key)
+            self.speculative = None
+        if self.model is not None:
+            self.registry.release(self._model_key)
+            self.registry.release(self._tokenizer_key)
+            self.tokenizer = self.model = None
+
+    def shared_weights(self):
+        """
+        Return the loaded models keyed by their registry key.
+
+        Another process that acquires these keys in its registry before creating
+        the same service uses these models instead of loading its own.
+
+        Returns:
+            dict: {registry key: model}.
+        """
+        models = {self._model_key: self.model}
+        if self.speculative is not None:
+            models[self._draft_model_key] = self.speculative.draft_model
+        return models
+
+    def forget(self, user_id):
+        """
+        Drop a user's session and cached key/values.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+        """
+        self.user_sessions.pop(user_id)
+        self.kv_cache.discard(user_id)
+
+    def _format_input(self, input_text):
+        """
+        Return the text to encode for a user's new input.
+
+        Args:
+            input_text (str): The user's new input.
+
+        Returns:
+            str: The text passed to the tokenizer.
+        """
+        return input_text
+
+    def _build_prompt(self, history_ids, input_ids):
+        """
+        Build the prompt for a new turn.
+
+        Args:
+            history_ids (array): Token ids of the user's conversation so far, or None.
+            input_ids (list): Token ids of the user's new input, as encoded from _format_input.
+
+        Returns:
+            tuple: (prompt token ids as a list, index in the output where the response starts).
+        """
+        raise NotImplementedError
+
+    def _prepare_batch(self, requests):
+        """
+        Build the prompts of several requests, encoding all new inputs with one tokenizer call.
+
+        Args:
+            requests (list): (user_id, input_json) pairs.
+
+        Returns:
+            list: (prompt token ids, response start) for each request, (None, None) for a request without input.
+        """
+        input_texts = [input_json.get('input', '') for _, input_json in requests]
+        texts = [self._format_input(input_text) for input_text in input_texts if input_text]
+        encoded = iter(self.tokenizer(texts)['input_ids'] if texts else [])
+
+        prepared = []
+        for (user_id, _), input_text in zip(requests, input_texts):
+            if not input_text:
+                prepared.append((None, None))
+                continue
+            # Drop the oldest tokens if the prompt no longer fits the context window
+            prompt_ids, response_start = self._build_prompt(self.user_sessions.get(user_id), next(encoded))
+            truncated = max(len(prompt_ids) - self.max_prompt_tokens, 0)
+            prepared.append((prompt_ids[truncated:], max(response_start - truncated, 0)))
+        return prepared
+
+    def _prepare(self, user_id, input_json):
+        return self._prepare_batch([(user_id, input_json)])[0]
+
+    def _generate(self, user_id, input_ids, trace, **generate_kwargs):
+        """
+        Generate a user's response, prefilling only tokens not covered by the KV cache.
+
+        The draft model assists when it is loaded and the generation fits its context.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_ids (torch.Tensor): Prompt token ids of shape (1, seq_len).
+            trace (RequestTrace): Trace of the request.
+            **generate_kwargs: Arguments for model.generate besides GENERATION_KWARGS.
+
+        Returns:
+            torch.Tensor: Output token ids.
+        """
+        generate = functools.partial(self.kv_cache.generate, self.model, user_id)
+        max_length = input_ids.shape[-1] + self.MAX_NEW_TOKENS
+        generate_kwargs = dict(
+            self.GENERATION_KWARGS, max_length=max_length, pad_token_id=self.tokenizer.eos_token_id, **generate_kwargs
+        )
+        if self.speculative is not None and self.speculative.supports(max_length):
+            return self.speculative.generate(generate, input_ids, trace, **generate_kwargs)
+        return generate(input_ids, trace=trace, **generate_kwargs)
+
+    def _start_trace(self, input_json):
+        return self.metrics.start_request(type(self).__name__, input_json.get('trace', False))
+
+    def _finish(self, user_id, output_ids, response_start, trace=metrics_module.NULL_TRACE):
+        # Decode the response and update the user's session history
+        with trace.phase('detokenize'):
+            response = self.tokenizer.decode(output_ids[response_start:], skip_special_tokens=True)
+        self.user_sessions[user_id] = output_ids
+        return {'response': response}
+
+    def process_request(self, user_id, input_json, cancelled=None):
+        """
+        Process a user's request and generate a response.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_json (dict): JSON object containing the user's input; 'trace': True adds
+                the request's phase timings to the response.
+            cancelled (threading.Event): Set to stop generating, e.g. when the request's deadline
+                passes; the response and the session keep the tokens generated so far.
+
+        Returns:
+            dict: JSON response containing the generated text.
+        """
+        trace = self._start_trace(input_json)
+        with trace.phase('tokenize'):
+            prompt_ids, response_start = self._prepare(user_id, input_json)
+        if prompt_ids is None:
+            return self.metrics.finish_request(trace, {'error': 'No input text provided'})
+        trace.count('prompt_tokens', len(prompt_ids))
+        input_ids = torch.tensor([prompt_ids], dtype=torch.long)
+
+        # Generate the model's output, prefilling only tokens not covered by the KV cache
+        generate_kwargs = {}
+        streamer = trace.generation_streamer()
+        if streamer is not None:
+            generate_kwargs['streamer'] = streamer
+        if cancelled is not None:
+            generate_kwargs['stopping_criteria'] = StoppingCriteriaList([CancelledCriteria(cancelled)])
+        output_ids = self._generate(user_id, input_ids, trace, **generate_kwargs)
+        return self.metrics.finish_request(trace, self._finish(user_id, output_ids[0], response_start, trace))
+
+    def process_request_stream(self, user_id, input_json):
+        """
+        Process a user's request and yield the response text while it is generated.
+
+        Generation runs in a background thread that also updates the session. If
+        the caller stops reading and closes the generator, generation is cancelled
+        and the session keeps the tokens produced up to that point.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+            input_json (dict): JSON object containing the user's input.
+
+        Yields:
+            str: Chunks of decoded text; together they equal the process_request response.
+
+        Raises:
+            ValueError: If no input text is provided.
+        """
+        trace = self._start_trace(input_json)
+        with trace.phase('tokenize'):
+            prompt_ids, response_start = self._prepare(user_id, input_json)
+        if prompt_ids is None:
+            raise ValueError('No input text provided')
+        trace.count('prompt_tokens', len(prompt_ids))
+        input_ids = torch.tensor([prompt_ids], dtype=torch.long)
+
+        streamer = TokenStreamer()
+        cancelled = threading.Event()
+        response = {}
+
+        def generate():
+            try:
+                output_ids = self._generate(
+                    user_id,
+                    input_ids,
+                    trace,
+                    streamer=trace.generation_streamer(streamer),
+                    stopping_criteria=StoppingCriteriaList([CancelledCriteria(cancelled)])
+                )
+                self._finish(user_id, output_ids[0], response_start)
+            except Exception as e:
+                response['error'] = str(e)
+                streamer.fail(e)
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            # Part of the prompt may belong to the response (e.g. GPT-2 echoes the input)
+            echoed_ids = prompt_ids[response_start:]
+            if echoed_ids:
+                yield self.tokenizer.decode(echoed_ids, skip_special_tokens=True)
+
+            detokenizer = IncrementalDetokenizer(self.tokenizer, echoed_ids)
+            for token_ids in streamer:
+                with trace.phase('detokenize'):
+                    chunk = detokenizer.push(token_ids)
+                if chunk:
+                    yield chunk
+            chunk = detokenizer.flush()
+            if chunk:
+                yield chunk
+        finally:
+            cancelled.set()
+            thread.join()
+            self.metrics.finish_request(trace, response)
+
+    def process_batch(self, requests):
+        """
+        Process requests from several users with one left-padded batched generate call.
+
+        The batch is prefilled in full: the rows would reuse cached prefixes of
+        different lengths, which one generate call cannot take. Each row's
+        key/values are stored in the KV cache afterwards, so the user's next
+        single request reuses them. The draft model is not used here: assisted
+        generation handles one sequence at a time.
+
+        Args:
+            requests (list): (user_id, input_json) pairs; each user_id may appear only once.
+
+        Returns:
+            list: JSON responses in the order of the requests.
+        """
+        responses = [None] * len(requests)
+        traces = [self._start_trace(input_json) for _, input_json in requests]
+        start = time.perf_counter()
+        prepared = self._prepare_batch(requests)
+        tokenize_seconds = time.perf_counter() - start
+        prompts = []
+        for index, (user_id, _) in enumerate(requests):
+            prompt_ids, response_start = prepared[index]
+            traces[index].add('tokenize', tokenize_seconds)
+            if prompt_ids is None:
+                responses[index] = self.metrics.finish_request(traces[index], {'error': 'No input text provided'})
+            else:
+                traces[index].count('prompt_tokens', len(prompt_ids))
+                prompts.append((index, user_id, prompt_ids, response_start))
+        if not prompts:
+            return responses
+
+        # Left-pad the prompts so that all of them end at the same position
+        pad_token_id = self.tokenizer.eos_token_id
+        max_length = max(len(prompt_ids) for _, _, prompt_ids, _ in prompts)
+        input_ids = torch.full((len(prompts), max_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(prompts), max_length), dtype=torch.long)
+        for row, (_, _, prompt_ids, _) in enumerate(prompts):
+            input_ids[row, max_length - len(prompt_ids):] = torch.tensor(prompt_ids, dtype=torch.long)
+            attention_mask[row, max_length - len(prompt_ids):] = 1
+
+        start = time.perf_counter()
+        output = self.model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            max_length=max_length + self.MAX_NEW_TOKENS,
+            pad_token_id=pad_token_id,
+            return_dict_in_generate=True,
+            **self.GENERATION_KWARGS
+        )
+        generate_seconds = time.perf_counter() - start
+        output_ids, past_key_values = output.sequences, output.past_key_values
+        if hasattr(past_key_values, 'to_legacy_cache'):
+            past_key_values = past_key_values.to_legacy_cache()
+
+        # Split the batch back into per-user sequences without the padding
+        for row, (index, user_id, prompt_ids, response_start) in enumerate(prompts):
+            padding = max_length - len(prompt_ids)
+            sequence = output_ids[row, padding:]
+            finished = (sequence[len(prompt_ids):] == self.tokenizer.eos_token_id).nonzero()
+            if len(finished):
+                sequence = sequence[:len(prompt_ids) + finished[0].item() + 1]
+            # The position ids follow the attention mask, so the unpadded part of a row matches a single request
+            cached_length = min(len(sequence), KVCache._cache_length(past_key_values) - padding)
+            self.kv_cache.store(
+                user_id, sequence, KVCache._select_row(past_key_values, row, padding, padding + cached_length)
+            )
+            # The batch shares one generate call, so each request is charged its full time
+            trace = traces[index]
+            trace.add('generate', generate_seconds)
+            trace.count('batch_size', len(prompts))
+            trace.count('new_tokens', len(sequence) - len(prompt_ids))
+            response = self._finish(user_id, sequence, response_start, trace)
+            responses[index] = self.metrics.finish_request(trace, response)
+        return responses
@@ -0,0 +1,349 @@
+# src/service/worker_pool.py
+
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+
+from . import model_registry
+
+logger = logging.getLogger(__name__)
+
+_STOP = None
+
+DEADLINE_EXCEEDED = 'Deadline exceeded'
+
+
+def process_with_deadline(service, user_id, input_json, deadline=None):
+    """
+    Call service.process_request and cancel generation once a deadline passes.
+
+    A cancelled text generation stores its partial output in the user's session;
+    since the caller only gets the error, the session is rolled back to its
+    state before the request.
+
+    Args:
+        service: Service whose process_request accepts a cancelled event.
+        user_id (str): Unique identifier for the user.
+        input_json (dict): JSON object containing the request.
+        deadline (float): time.time() by which the response is needed, or None.
+
+    Returns:
+        dict: The service's response, or {'error': DEADLINE_EXCEEDED} if the deadline
+            passed before or during generation.
+    """
+    if deadline is None:
+        return service.process_request(user_id, input_json)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return {'error': DEADLINE_EXCEEDED}
+    sessions = getattr(service, 'user_sessions', None)
+    previous = None if sessions is None else sessions.get(user_id)
+    cancelled = threading.Event()
+    timer = threading.Timer(remaining, cancelled.set)
+    timer.daemon = True
+    timer.start()
+    try:
+        response = service.process_request(user_id, input_json, cancelled=cancelled)
+    finally:
+        timer.cancel()
+    if not cancelled.is_set():
+        return response
+    if sessions is not None:
+        if previous is None:
+            sessions.pop(user_id)
+        else:
+            sessions[user_id] = previous
+    return {'error': DEADLINE_EXCEEDED}
+
+
+def _pin_threads(index, threads):
+    """
+    Limit a worker to its share of the cores: torch threads and, where supported, CPU affinity.
+    """
+    import torch
+
+    torch.set_num_threads(threads)
+    if hasattr(os, 'sched_setaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+        if len(cores) >= threads * (index + 1):
+            os.sched_setaffinity(0, cores[index * threads:(index + 1) * threads])
+
+
+def _worker_main(index, threads, service_class, service_kwargs, shared_weights, requests, responses):
+    """
+    Entry point of a worker process: build the service and answer requests until told to stop.
+
+    Args:
+        index (int): Worker number.
+        threads (int): Number of torch threads.
+        service_class (type): Service to build.
+        service_kwargs (dict): Constructor arguments of the service.
+        shared_weights (dict): Models in shared memory, keyed by their registry key.
+        requests (Queue): (request id, user_id, input_json, deadline) tuples, None to stop.
+        responses (Connection): Write end of this worker's pipe for (worker index, request id,
+            response, error) tuples.
+    """
+    try:
+        _pin_threads(index, threads)
+        # The service finds the shared models in the registry instead of loading its own copy
+        for key, model in shared_weights.items():
+            model_registry.registry.acquire(key, lambda model=model: model)
+        service = service_class(**service_kwargs)
+    except Exception as e:
+        responses.send((index, None, None, f'{type(e).__name__}: {e}'))
+        return
+    responses.send((index, None, {'pid': os.getpid()}, None))
+
+    while True:
+        request = requests.get()
+        if request is _STOP:
+            break
+        request_id, user_id, input_json, deadline = request
+        try:
+            if user_id is None:
+                # Stateless call: answer under a throwaway id and keep no session
+                user_id = f'stateless-{uuid.uuid4()}'
+                response = process_with_deadline(service, user_id, input_json, deadline)
+                service.forget(user_id)
+            else:
+                response = process_with_deadline(service, user_id, input_json, deadline)
+            responses.send((index, request_id, response, None))
+        except Exception as e:
+            responses.send((index, request_id, None, f'{type(e).__name__}: {e}'))
+    service.close()
+
+
+class WorkerPool:
+    """
+    Serves requests from several worker processes, each with its own service instance.
+
+    Requests of a user always go to the same worker (crc32 of the user id), so
+    its session and KV cache stay in one process. Requests without a user id
+    are stateless and go to the worker with the fewest requests in flight. Each
+    worker runs torch with an equal share of the cores. For services that
+    provide shared_weights(), the weights are loaded once in this process and
+    handed to the workers in shared memory instead of being loaded N times.
+
+    If a worker process dies (e.g. killed for running out of memory), its
+    requests in flight fail with a RuntimeError, and so do later requests of
+    the users routed to it.
+    """
+    DEFAULT_NUM_WORKERS = 2
+
+    def __init__(self, service_class, service_kwargs=None, num_workers=None, threads_per_worker=None,
+                 share_weights=True):
+        """
+        Start the workers and wait until each has built its service.
+
+        Args:
+            service_class (type): Service class with process_request, forget and close, e.g. GPT2Service.
+            service_kwargs (dict): Arguments for the service constructor; must be picklable.
+            num_workers (int): Number of worker processes.
+            threads_per_worker (int): torch threads of each worker (default: the cores divided by num_workers).
+            share_weights (bool): Load the weights once and share them with the workers.
+
+        Raises:
+            RuntimeError: If a worker fails to build its service.
+        """
+        self.num_workers = num_workers or self.DEFAULT_NUM_WORKERS
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.num_workers)
+        service_kwargs = dict(service_kwargs or {})
+
+        shared_weights = {}
+        if share_weights and hasattr(service_class, 'shared_weights'):
+            service = service_class(**service_kwargs)
+            shared_weights = service.shared_weights()
+            service.close()
+            for model in shared_weights.values():
+                model.share_memory()
+
+        # spawn, not fork: forking a process that already runs torch threads can deadlock
+        context = multiprocessing.get_context('spawn')
+        self._requests = [context.Queue() for _ in range(self.num_workers)]
+        # One pipe per worker, written only by that worker: a worker that dies cannot block the others'
+        # responses, and its pipe reports EOF once everything it sent has been read
+        pipes = [context.Pipe(duplex=False) for _ in range(self.num_workers)]
+        self._responses = [reader for reader, _ in pipes]
+        self._processes = [
+            context.Process(
+                target=_worker_main,
+                args=(index, self.threads_per_worker, service_class, service_kwargs, shared_weights,
+                      self._requests[index], writer),
+                daemon=True
+            )
+            for index, (_, writer) in enumerate(pipes)
+        ]
+        for process, (_, writer) in zip(self._processes, pipes):
+            process.start()
+            writer.close()
+
+        self.pids = [None] * self.num_workers
+        errors = []
+        for index, connection in enumerate(self._responses):
+            try:
+                _, _, ready, error = connection.recv()
+            except EOFError:
+                self._processes[index].join()
+                error = f'exited with code {self._processes[index].exitcode}'
+            if error is not None:
+                errors.append(f'worker {index}: {error}')
+            else:
+                self.pids[index] = ready['pid']
+        if errors:
+            self._stop()
+            for connection in self._responses:
+                connection.close()
+            raise RuntimeError('Worker start failed: ' + '; '.join(errors))
+
+        self.requests = [0] * self.num_workers
+        self._in_flight = [0] * self.num_workers
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._exited = {}  # worker index -> exit code of a worker that died
+        self._reader = threading.Thread(target=self._read_responses, name='worker-pool', daemon=True)
+        self._reader.start()
+
+    def worker_for(self, user_id):
+        """
+        Return the index of the worker that serves a user.
+
+        Args:
+            user_id (str): Unique identifier for the user.
+
+        Returns:
+            int: Worker index; the same in every process and run.
+        """
+        return zlib.crc32(str(user_id).encode('utf-8')) % self.num_workers
+
+    def submit(self, user_id, input_json, deadline=None):
+        """
+        Send a request to its worker.
+
+        Args:
+            user_id (str): Unique identifier for the user, or None for a stateless request.
+            input_json (dict): JSON object containing the request.
+            deadline (float): time.time() after which the worker skips or cancels the request.
+
+        Returns:
+            Future: Resolves to the JSON response.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('WorkerPool is closed')
+            if user_id is None:
+                running = [index for index in range(self.num_workers) if index not in self._exited]
+                index = min(running or range(self.num_workers), key=self._in_flight.__getitem__)
+            else:
+                index = self.worker_for(user_id)
+            if index in self._exited:
+                future.set_exception(RuntimeError(f'worker {index} exited with code {self._exited[index]}'))
+                return future
+            request_id = next(self._ids)
+            self._futures[request_id] = (index, future)
+            self._in_flight[index] += 1
+            self.requests[index] += 1
+        self._requests[index].put((request_id, user_id, input_json, deadline))
+        return future
+
+    def process_request(self, user_id, input_json):
+        """
+        Process a request in the pool, blocking until it is answered.
+
+        Args:
+            user_id (str): Unique identifier for the user, or None for a stateless request.
+            input_json (dict): JSON object containing the request.
+
+        Returns:
+            dict: JSON response of the service.
+        """
+        return self.submit(user_id, input_json).result()
+
+    def _fail_worker(self, index):
+        """
+        Fail the requests in flight on a worker whose process has exited.
+        """
+        self._processes[index].join()
+        exitcode = self._processes[index].exitcode
+        with self._lock:
+            if self._closed:
+                return
+            self._exited[index] = exitcode
+            failed = [request_id for request_id, (worker, _) in self._futures.items() if worker == index]
+            futures = [self._futures.pop(request_id)[1] for request_id in failed]
+            self._in_flight[index] = 0
+        for future in futures:
+            # A future cancelled by its caller (e.g. a client that disconnected) takes no result
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(f'worker {index} exited with code {exitcode}'))
+
+    def _read_responses(self):
+        connections = dict(zip(self._responses, range(self.num_workers)))
+        while connections:
+            for connection in multiprocessing.connection.wait(list(connections)):
+                try:
+                    index, request_id, response, error = connection.recv()
+                except EOFError:
+                    # The worker exited (stopped by close() or died) and all its responses were read
+                    self._fail_worker(connections.pop(connection))
+                    continue
+                try:
+                    self._answer(index, request_id, response, error)
+                except Exception:
+                    # The reader serves every worker, so one bad response must not stop it
+                    logger.exception('Answering request %s of worker %d failed', request_id, index)
+
+    def _answer(self, index, request_id, response, error):
+        with self._lock:
+            _, future = self._futures.pop(request_id)
+            self._in_flight[index] -= 1
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(response)
+
+    def _stop(self):
+        for requests in self._requests:
+            requests.put(_STOP)
+        for process in self._processes:
+            process.join()
+
+    def close(self):
+        """
+        Finish the queued requests and stop the workers.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stop()
+        self._reader.join()
+
+    def stats(self):
+        """
+        Return pool counters.
+
+        Returns:
+            dict: Number of workers, torch threads per worker, requests sent to each worker and
+                the exit codes of workers that died.
+        """
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'exited': dict(self._exited),
+                'threads_per_worker': self.threads_per_worker,
+                'requests': list(self.requests),
+                'in_flight': list(self._in_flight),
+            }
@@ -0,0 +1,117 @@
+# tests/unit/test_batching.py
+
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.service.batching import BatchScheduler
+from src.service.langmodel_service import LangModelService
+from tiny_models import build_tiny_causal_lm
+
+
+class GreedyLangModelService(LangModelService):
+    GENERATION_KWARGS = {'do_sample': False}
+
+
+class TestBatchScheduler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_batched_matches_single_requests(self):
+        """
+        Test that left-padded batches give the same greedy replies and sessions as single requests.
+        """
+        inputs = ['Hi.', 'What a long and winding road this is.', 'Hello there, friend.']
+        requests = [(f'user_{index}', {'input': text}) for index, text in enumerate(inputs)]
+        single = GreedyLangModelService(model_name=self.model_name)
+        batched = GreedyLangModelService(model_name=self.model_name)
+
+        expected = [single.process_request(user_id, input_json) for user_id, input_json in requests]
+        self.assertEqual(batched.process_batch(requests + [('user_x', {'input': ''})]), expected + [
+            {'error': 'No input text provided'}
+        ])
+        for user_id, _ in requests:
+            self.assertEqual(batched.user_sessions[user_id], single.user_sessions[user_id])
+
+    def test_next_turn_reuses_batched_key_values(self):
+        """
+        Test that a batch stores each row's key/values and the next single turn reuses them.
+        """
+        requests = [('user_0', {'input': 'Hi.'}), ('user_1', {'input': 'What a long and winding road this is.'})]
+        uncached = GreedyLangModelService(model_name=self.model_name, kv_cache_bytes=0)
+        batched = GreedyLangModelService(model_name=self.model_name)
+        uncached.process_batch(requests)
+        batched.process_batch(requests)
+        self.assertEqual(batched.kv_cache.stats()['entries'], 2)
+
+        for user_id in ('user_0', 'user_1'):
+            expected = uncached.process_request(user_id, {'input': 'And then?'})
+            response = batched.process_request(user_id, {'input': 'And then?', 'trace': True})
+            self.assertEqual(response['response'], expected['response'])
+            self.assertGreater(response['trace']['counts']['cached_tokens'], 0)
+
+    def test_concurrent_requests_are_merged(self):
+        """
+        Test that concurrent requests from different users share batches and all get answers.
+        """
+        service = LangModelService(model_name=self.model_name)
+        scheduler = BatchScheduler(service, max_batch_size=4, max_wait_ms=50)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = [
+                    executor.submit(scheduler.process_request, f'user_{index}', {'input': 'Hello!'})
+                    for index in range(8)
+                ]
+                responses = [future.result() for future in futures]
+        finally:
+            scheduler.close()
+
+        self.assertTrue(all('response' in response for response in responses))
+        self.assertEqual(len(service.user_sessions), 8)
+        self.assertGreater(scheduler.stats()['mean_batch_size'], 1)
+
+    def test_cancelled_request_is_skipped(self):
+        """
+        Test that a request cancelled while queued is not generated and later requests are answered.
+        """
+        service = LangModelService(model_name=self.model_name)
+        scheduler = BatchScheduler(service, max_batch_size=4, max_wait_ms=200)
+        try:
+            cancelled = scheduler.submit('user_cancelled', {'input': 'Hello!'})
+            self.assertTrue(cancelled.cancel())
+            response = scheduler.submit('user', {'input': 'Hello!'}).result(timeout=30)
+            self.assertIn('response', response)
+            self.assertIn('response', scheduler.process_request('user', {'input': 'Again.'}))
+        finally:
+            scheduler.close()
+
+        self.assertNotIn('user_cancelled', service.user_sessions)
+        self.assertEqual(scheduler.stats()['requests'], 2)
+
+    def test_same_user_requests_are_serialized(self):
+        """
+        Test that two queued requests from one user run in order, in separate batches.
+        """
+        service = LangModelService(model_name=self.model_name)
+        scheduler = BatchScheduler(service, max_batch_size=4, max_wait_ms=50)
+        try:
+            first = scheduler.submit('user', {'input': 'First.'})
+            second = scheduler.submit('user', {'input': 'Second.'})
+            first.result()
+            second.result()
+        finally:
+            scheduler.close()
+
+        history = service.tokenizer.decode(service.user_sessions['user'])
+        self.assertEqual(scheduler.stats()['batches'], 2)
+        self.assertLess(history.index('First.'), history.index('Second.'))
+
+
+if __name__ == '__main__':
+    unittest.main()
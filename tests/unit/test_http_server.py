@@ -0,0 +1,155 @@
+# tests/unit/test_http_server.py
+
+import asyncio
+import http.client
+import json
+import threading
+import unittest
+
+from src.service.http_server import InferenceServer, ServiceExecutor
+from src.service.metrics import Metrics
+
+
+class FakeService:
+    """
+    Echoes the input; 'wait': True blocks until released or cancelled, like a long generation.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.forgotten = []
+
+    def process_request(self, user_id, input_json, cancelled=None):
+        if input_json.get('wait'):
+            self.started.set()
+            while not self.release.is_set():
+                if cancelled is not None and cancelled.wait(0.01):
+                    return {'response': 'partial'}
+        return {'response': input_json['input'], 'user_id': user_id}
+
+    def forget(self, user_id):
+        self.forgotten.append(user_id)
+
+    def close(self):
+        pass
+
+
+class TestInferenceServer(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeService()
+        self.server = InferenceServer(
+            ServiceExecutor(self.service, max_workers=1), concurrency=1, max_queue=1, metrics=Metrics()
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.port = asyncio.run_coroutine_threadsafe(self.server.start('127.0.0.1', 0), self.loop).result()
+
+    def tearDown(self):
+        self.service.release.set()
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.server.backend.close()
+
+    def request(self, method, path, body=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            connection.request(method, path, body=None if body is None else json.dumps(body))
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def post_in_background(self, body):
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(response=self.request('POST', '/v1/process', body)))
+        thread.start()
+        return thread, result
+
+    def test_process_returns_service_response(self):
+        """
+        Test that a request is answered with the service's JSON, statefully with a user id and statelessly without.
+        """
+        status, _, body = self.request('POST', '/v1/process', {'user_id': 'user_1', 'input': 'Hello'})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {'response': 'Hello', 'user_id': 'user_1'})
+
+        status, _, body = self.request('POST', '/v1/process', {'input': 'Hi'})
+        self.assertEqual(status, 200)
+        self.assertEqual(self.service.forgotten, [json.loads(body)['user_id']])
+
+    def test_invalid_requests(self):
+        """
+        Test the 400, 404 and 405 responses.
+        """
+        self.assertEqual(self.request('POST', '/v1/process', ['not', 'an', 'object'])[0], 400)
+        self.assertEqual(self.request('POST', '/v1/process', {'input': 'Hi', 'timeout_ms': 'soon'})[0], 400)
+        self.assertEqual(self.request('GET', '/v1/process')[0], 405)
+        self.assertEqual(self.request('GET', '/nowhere')[0], 404)
+
+    def test_full_queue_is_rejected(self):
+        """
+        Test that with the backend busy and the queue full, a further request gets 429 right away.
+        """
+        running, running_result = self.post_in_background({'input': 'A', 'wait': True})
+        self.assertTrue(self.service.started.wait(5))
+        queued, queued_result = self.post_in_background({'input': 'B'})
+        while self.server.stats()['queued'] < 1:
+            threading.Event().wait(0.01)
+
+        status, headers, _ = self.request('POST', '/v1/process', {'input': 'C'})
+        self.assertEqual(status, 429)
+        self.assertEqual(headers['Retry-After'], '1')
+
+        self.service.release.set()
+        running.join()
+        queued.join()
+        self.assertEqual(running_result['response'][0], 200)
+        self.assertEqual(queued_result['response'][0], 200)
+        self.assertEqual(self.server.stats()['rejected'], 1)
+
+    def test_no_queue_accepts_while_a_slot_is_free(self):
+        """
+        Test that with max_queue=0 a request is served when a slot is free and rejected when none is.
+        """
+        self.server.max_queue = 0
+        self.assertEqual(self.request('POST', '/v1/process', {'input': 'A'})[0], 200)
+
+        running, running_result = self.post_in_background({'input': 'B', 'wait': True})
+        self.assertTrue(self.service.started.wait(5))
+        self.assertEqual(self.request('POST', '/v1/process', {'input': 'C'})[0], 429)
+        self.service.release.set()
+        running.join()
+        self.assertEqual(running_result['response'][0], 200)
+        self.assertEqual((self.server.stats()['accepted'], self.server.stats()['rejected']), (2, 1))
+
+    def test_deadline_cancels_generation(self):
+        """
+        Test that a request running past its deadline is cancelled and answered with 504.
+        """
+        status, _, body = self.request('POST', '/v1/process', {'input': 'A', 'wait': True, 'timeout_ms': 50})
+        self.assertEqual(status, 504)
+        self.assertEqual(json.loads(body), {'error': 'Deadline exceeded'})
+        self.assertEqual(self.server.stats()['deadline_exceeded'], 1)
+
+    def test_health_and_metrics(self):
+        """
+        Test that /healthz reports the queue and /metrics the server counters.
+        """
+        self.request('POST', '/v1/process', {'input': 'Hello'})
+        status, _, body = self.request('GET', '/healthz')
+        self.assertEqual(status, 200)
+        health = json.loads(body)
+        self.assertEqual((health['status'], health['accepted'], health['queued'], health['in_flight']), ('ok', 1, 0, 0))
+
+        status, headers, body = self.request('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('llm_server_responses_total{outcome="accepted"} 1', body.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# tests/unit/test_image_cache.py
+
+import filecmp
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.service.image_cache import ImageCache
+from src.service.imagegen_service import ImageGenService
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestImageCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def _write(self, directory, name, size):
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+
+    def test_lru_eviction_and_restart(self):
+        """
+        Test that the least recently used files are deleted and the cache is reloaded from disk.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            cache = ImageCache(cache_dir, max_bytes=250)
+            for name in ('a', 'b'):
+                cache.put(name, 'png', self._write(tmpdir, name, 100))
+            self.assertIsNotNone(cache.get('a', 'png'))
+            cache.put('c', 'png', self._write(tmpdir, 'c', 100))
+
+            self.assertIsNone(cache.get('b', 'png'))
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, 'b.png')))
+            self.assertEqual(cache.stats()['evictions'], 1)
+            # The caller's file is not affected by the cache
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'b')))
+
+            reloaded = ImageCache(cache_dir, max_bytes=250)
+            self.assertEqual(reloaded.stats()['total_bytes'], 200)
+            self.assertIsNotNone(reloaded.get('a', 'png'))
+            self.assertIsNotNone(reloaded.get('c', 'png'))
+
+    def test_failed_copy_leaves_no_entry(self):
+        """
+        Test that a copy that fails half-way leaves nothing in the cache directory, now or after a restart.
+        """
+        def partial_copy(source, destination):
+            with open(destination, 'wb') as f:
+                f.write(b'x' * 10)
+            raise OSError('disk full')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            cache = ImageCache(cache_dir)
+            with mock.patch('src.service.image_cache.link_or_copy', partial_copy):
+                with self.assertRaises(OSError):
+                    cache.put('a', 'png', self._write(tmpdir, 'a', 100))
+            self.assertEqual(os.listdir(cache_dir), [])
+            self.assertEqual(ImageCache(cache_dir).stats()['entries'], 0)
+
+    def test_repeated_request_hits_cache(self):
+        """
+        Test that a repeated request returns a copy of the cached image and a new seed does not.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            service = ImageGenService(
+                model_name=self.model_name, output_dir=output_dir, device='cpu',
+                picture_size={'width': 64, 'height': 64}
+            )
+            service.pipeline.set_progress_bar_config(disable=True)
+            request = {'prompt': 'a red square', 'num_inference_steps': 2}
+
+            first = service.process_request('user', request, wait=True)['image_file_path']
+            second = service.process_request('user', request, wait=True)['image_file_path']
+            third = service.process_request('user', dict(request, seed=1), wait=True)['image_file_path']
+
+            self.assertNotEqual(first, second)
+            self.assertTrue(filecmp.cmp(first, second, shallow=False))
+            self.assertFalse(filecmp.cmp(first, third, shallow=False))
+            self.assertEqual(service.image_cache.stats()['hits'], 1)
+            # Moving a returned file away leaves the cache intact
+            os.remove(first)
+            self.assertIsNotNone(service.process_request('user', request).get('image_file_path'))
+            self.assertEqual(service.image_cache.stats()['hits'], 2)
+            service.close()
+
+    def test_precision_is_part_of_the_key(self):
+        """
+        Test that services of another precision sharing the output directory do not hit each other's images.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            request = {'prompt': 'a red square', 'num_inference_steps': 2}
+            for precision in ('fp32', 'bf16'):
+                service = ImageGenService(
+                    model_name=self.model_name, output_dir=output_dir, device='cpu',
+                    picture_size={'width': 64, 'height': 64}, precision=precision
+                )
+                service.pipeline.set_progress_bar_config(disable=True)
+                service.process_request('user', request, wait=True)
+                self.assertEqual(service.image_cache.stats()['hits'], 0)
+                service.close()
+
+    def test_file_evicted_after_lookup_is_rendered(self):
+        """
+        Test that a cached file deleted between get() and linking it is rendered again instead of failing.
+        """
+        class RacyImageCache(ImageCache):
+            def get(self, key, imgformat):
+                # Another thread evicts the file right after the lookup
+                file_path = super().get(key, imgformat)
+                if file_path is not None:
+                    os.remove(file_path)
+                return file_path
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            service = ImageGenService(
+                model_name=self.model_name, output_dir=output_dir, device='cpu',
+                picture_size={'width': 64, 'height': 64},
+                image_cache=RacyImageCache(os.path.join(output_dir, 'cache'))
+            )
+            service.pipeline.set_progress_bar_config(disable=True)
+            request = {'prompt': 'a red square', 'num_inference_steps': 2}
+
+            service.process_request('user', request, wait=True)
+            response = service.process_request('user', dict(request, trace=True), wait=True)
+            service.close()
+
+            self.assertNotIn('error', response)
+            self.assertTrue(os.path.exists(response['image_file_path']))
+            self.assertEqual(response['trace']['counts'].get('cache_hits', 0), 0)
+            self.assertEqual(service.image_cache.stats()['hits'], 0)
+
+    def test_seeded_generation_is_reproducible(self):
+        """
+        Test that the same seed gives the same image without the cache.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            service = ImageGenService(
+                model_name=self.model_name, output_dir=output_dir, device='cpu',
+                picture_size={'width': 64, 'height': 64}, image_cache=ImageCache(output_dir, max_bytes=0)
+            )
+            service.pipeline.set_progress_bar_config(disable=True)
+            request = {'prompt': 'a red square', 'num_inference_steps': 2, 'seed': 7}
+
+            first = service.process_request('user', request, wait=True)['image_file_path']
+            second = service.process_request('user', request, wait=True)['image_file_path']
+
+            self.assertTrue(filecmp.cmp(first, second, shallow=False))
+            service.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+# tests/unit/test_image_writer.py
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.service.image_writer import ImageWriter, create_unique_file
+from src.service.imagegen_service import ImageGenService
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestImageWriter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_naming_is_constant_time(self):
+        """
+        Test that a taken name costs the same few file operations with 100k existing files.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for index in range(100000):
+                open(os.path.join(directory, f'user_generated_image_{index}.png'), 'wb').close()
+            open(os.path.join(directory, 'user_generated_image.png'), 'wb').close()
+
+            with mock.patch('os.open', wraps=os.open) as os_open, \
+                    mock.patch('os.path.exists', wraps=os.path.exists) as exists:
+                file_path = create_unique_file(directory, 'user_generated_image.png')
+            self.assertEqual(os_open.call_count, 2)
+            self.assertEqual(exists.call_count, 0)
+            self.assertTrue(os.path.isfile(file_path))
+            self.assertEqual(len(os.listdir(directory)), 100002)
+
+    def test_concurrent_names_are_unique(self):
+        """
+        Test that threads asking for the same name all get different files.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = []
+            threads = [
+                threading.Thread(target=lambda: file_paths.append(create_unique_file(directory, 'image.png')))
+                for _ in range(16)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(file_paths)), 16)
+            self.assertIn(os.path.join(directory, 'image.png'), file_paths)
+            # Taken names get _<run id>_<counter>
+            for file_path in set(file_paths) - {os.path.join(directory, 'image.png')}:
+                self.assertRegex(os.path.basename(file_path), r'^image_[0-9a-f]{8}_[0-9]+\.png$')
+
+    def test_failed_write_removes_file(self):
+        """
+        Test that a failed write is reported by flush() and leaves no partial file.
+        """
+        def fail(image, file_path):
+            raise OSError('disk full')
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ImageWriter()
+            file_path = create_unique_file(directory, 'image.png')
+            future = writer.submit(fail, Image.new('RGB', (8, 8)), file_path)
+            errors = writer.flush()
+            writer.close()
+
+            self.assertIsInstance(future.exception(), OSError)
+            self.assertEqual(len(errors), 1)
+            self.assertFalse(os.path.exists(file_path))
+
+    def test_failed_post_processing_keeps_file(self):
+        """
+        Test that an error in on_saved, e.g. from caching the image, is logged and keeps the complete file.
+        """
+        def fail(file_path):
+            raise OSError('cache disk full')
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ImageWriter()
+            file_path = create_unique_file(directory, 'image.png')
+            with self.assertLogs('src.service.image_writer', level='ERROR'):
+                future = writer.submit(lambda image, path: image.save(path), Image.new('RGB', (8, 8)), file_path,
+                                       on_saved=fail)
+                self.assertEqual(future.result(), file_path)
+            writer.close()
+            self.assertEqual(Image.open(file_path).size, (8, 8))
+
+    def test_service_writes_in_background(self):
+        """
+        Test that by default the images are written in the background, complete after flush(), and
+        that close() stops the service's writer.
+        """
+        with tempfile.TemporaryDirectory() as output_dir:
+            service = ImageGenService(
+                model_name=self.model_name, output_dir=output_dir, device='cpu',
+                picture_size={'width': 64, 'height': 64}
+            )
+            service.pipeline.set_progress_bar_config(disable=True)
+            request = {'prompt': 'a red barn', 'num_inference_steps': 2, 'filename': 'barn.png'}
+            first, second = service.process_batch([('user', request), ('user', dict(request, seed=1))])
+            self.assertEqual(service.flush(), [])
+
+            self.assertEqual(first['image_file_path'], os.path.join(output_dir, 'barn.png'))
+            self.assertNotEqual(second['image_file_path'], first['image_file_path'])
+            for response in (first, second):
+                self.assertEqual(Image.open(response['image_file_path']).size, (64, 64))
+            self.assertEqual(service.image_cache.stats()['entries'], 2)
+
+            invalid = service.process_request('user', dict(request, filename='../barn.png'))
+            self.assertIn('error', invalid)
+            service.close()
+            with self.assertRaises(RuntimeError):
+                service.writer.submit(lambda image, file_path: None, None, 'unused.png')
+
+
+if __name__ == '__main__':
+    unittest.main()
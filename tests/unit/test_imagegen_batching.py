@@ -0,0 +1,142 @@
+# tests/unit/test_imagegen_batching.py
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from src.service.image_cache import ImageCache
+from src.service.imagegen_service import ImageGenService
+from src.service.metrics import Metrics
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestImageGenBatching(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.metrics = Metrics()
+        self.service = ImageGenService(
+            model_name=self.model_name, output_dir=self.output_dir.name, device='cpu',
+            picture_size={'width': 64, 'height': 64}, metrics=self.metrics,
+            image_cache=ImageCache(self.output_dir.name, max_bytes=0)
+        )
+        self.service.pipeline.set_progress_bar_config(disable=True)
+
+    def tearDown(self):
+        self.service.close()
+        self.output_dir.cleanup()
+
+    def assertSameImage(self, first_path, second_path):
+        first = np.asarray(Image.open(first_path), dtype=np.int16)
+        second = np.asarray(Image.open(second_path), dtype=np.int16)
+        # Batched convolutions may round differently from single ones
+        self.assertLessEqual(np.abs(first - second).max(), 2)
+
+    def test_batch_matches_single_requests(self):
+        """
+        Test that batched images equal the images of the same requests processed one by one.
+        """
+        requests = [
+            ('alice', {'prompt': 'a red square', 'num_inference_steps': 2, 'seed': 1}),
+            ('bob', {'prompt': 'a blue circle', 'num_inference_steps': 2, 'seed': 2, 'num_images_per_prompt': 2}),
+            ('carol', {'prompt': ''}),
+        ]
+        batched = self.service.process_batch(requests, wait=True)
+        single = [self.service.process_request(user_id, input_json, wait=True) for user_id, input_json in requests[:2]]
+        second_image = self.service.process_request(
+            'bob', dict(requests[1][1], seed=3, num_images_per_prompt=1), wait=True
+        )
+
+        self.assertEqual(batched[2], {'error': 'No prompt provided'})
+        self.assertSameImage(batched[0]['image_file_path'], single[0]['image_file_path'])
+        self.assertEqual(len(batched[1]['image_file_paths']), 2)
+        self.assertSameImage(batched[1]['image_file_paths'][0], single[1]['image_file_path'])
+        self.assertSameImage(batched[1]['image_file_paths'][1], second_image['image_file_path'])
+
+    def test_compatible_requests_share_pipeline_calls(self):
+        """
+        Test that requests are grouped by step count and split at max_batch_size.
+        """
+        self.service.max_batch_size = 2
+        requests = [
+            ('user_1', {'prompt': 'one', 'num_inference_steps': 2, 'trace': True}),
+            ('user_2', {'prompt': 'two', 'num_inference_steps': 3, 'trace': True}),
+            ('user_3', {'prompt': 'three', 'num_inference_steps': 2, 'trace': True}),
+            ('user_4', {'prompt': 'four', 'num_inference_steps': 2, 'trace': True}),
+        ]
+        responses = self.service.process_batch(requests)
+
+        batch_sizes = [response['trace']['counts']['batch_size'] for response in responses]
+        self.assertEqual(batch_sizes, [2, 1, 2, 1])
+        self.assertEqual(self.metrics.snapshot()['ImageGenService']['counters']['requests'], 4)
+
+    def test_write_time_is_recorded(self):
+        """
+        Test that the background encode and write is recorded in the metrics, and in the trace of a waiting request.
+        """
+        request = {'prompt': 'a red square', 'num_inference_steps': 2, 'num_images_per_prompt': 2}
+        self.service.process_request('alice', request)
+        self.assertEqual(self.service.flush(), [])
+        self.assertEqual(self.metrics.snapshot()['ImageGenService']['phases']['write']['count'], 2)
+
+        response = self.service.process_request('bob', dict(request, trace=True), wait=True)
+        self.assertGreater(response['trace']['phases_ms']['write'], 0)
+        self.assertEqual(self.metrics.snapshot()['ImageGenService']['phases']['write']['count'], 3)
+
+    def test_invalid_requests_get_errors(self):
+        """
+        Test that an image count or size that is not a positive integer or over the limits fails only its own request.
+        """
+        requests = [
+            ('alice', {'prompt': 'a red square', 'num_images_per_prompt': 0}),
+            ('bob', {'prompt': 'a red square', 'width': 0, 'preview': True}),
+            ('dave', {'prompt': 'a red square', 'num_images_per_prompt': 10 ** 6}),
+            ('erin', {'prompt': 'a red square', 'width': 100000, 'height': 100000}),
+            ('frank', {'prompt': 'a red square', 'height': 64.5}),
+            ('carol', {'prompt': 'a red square', 'num_inference_steps': 2}),
+        ]
+        responses = self.service.process_batch(requests, wait=True)
+
+        self.assertIn('num_images_per_prompt', responses[0]['error'])
+        self.assertIn('width', responses[1]['error'])
+        self.assertIn('at most 16', responses[2]['error'])
+        self.assertIn('pixels', responses[3]['error'])
+        self.assertIn('height must be a positive integer', responses[4]['error'])
+        self.assertTrue(os.path.exists(responses[5]['image_file_path']))
+
+    def test_failed_request_leaves_no_files(self):
+        """
+        Test that the images already written for a request are deleted when a later one fails.
+        """
+        self.service.max_batch_size = 1
+        generate_images = self.service._generate_images
+        calls = []
+
+        def fail_second_call(*args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('out of memory')
+            return generate_images(*args)
+
+        self.service._generate_images = fail_second_call
+        response = self.service.process_request(
+            'alice', {'prompt': 'a red square', 'num_inference_steps': 2, 'num_images_per_prompt': 2}
+        )
+
+        self.assertIn('out of memory', response['error'])
+        self.assertEqual(os.listdir(self.output_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
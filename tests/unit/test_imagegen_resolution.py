@@ -0,0 +1,71 @@
+# tests/unit/test_imagegen_resolution.py
+
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from src.service.image_cache import ImageCache
+from src.service.imagegen_service import ImageGenService
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestImageGenResolution(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.service = ImageGenService(
+            model_name=build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd')),
+            output_dir=os.path.join(cls.tmpdir.name, 'images'), device='cpu',
+            image_cache=ImageCache(cls.tmpdir.name, max_bytes=0)
+        )
+        cls.service.pipeline.set_progress_bar_config(disable=True)
+        cls.latent_sizes = []
+        cls.service.pipeline.unet.register_forward_pre_hook(
+            lambda module, args: cls.latent_sizes.append(tuple(args[0].shape[-2:]))
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+        cls.tmpdir.cleanup()
+
+    def generate(self, **input_json):
+        self.latent_sizes.clear()
+        response = self.service.process_request('user', dict(input_json, prompt='a tree', trace=True), wait=True)
+        return Image.open(response['image_file_path']), response['trace']
+
+    def test_renders_at_requested_size(self):
+        """
+        Test that a valid size is rendered directly, without PIL resizing.
+        """
+        image, trace = self.generate(width=48, height=32, num_inference_steps=2)
+
+        self.assertEqual(image.size, (48, 32))
+        self.assertNotIn('resize', trace['phases_ms'])
+        # The tiny VAE downsamples by 2
+        self.assertEqual(self.latent_sizes[0], (16, 24))
+
+    def test_resizes_only_as_fallback(self):
+        """
+        Test that a size that is not a multiple of 8 is rendered at the nearest one and resized.
+        """
+        image, trace = self.generate(width=60, height=30, num_inference_steps=2)
+
+        self.assertEqual(image.size, (60, 30))
+        self.assertIn('resize', trace['phases_ms'])
+        self.assertEqual(self.latent_sizes[0], (16, 32))
+
+    def test_preview(self):
+        """
+        Test that a preview is rendered at low resolution with few steps.
+        """
+        image, trace = self.generate(width=1024, height=512, num_inference_steps=50, preview=True)
+
+        self.assertEqual(image.size, (256, 128))
+        self.assertEqual(trace['counts']['steps'], ImageGenService.PREVIEW_NUM_INFERENCE_STEPS)
+
+
+if __name__ == '__main__':
+    unittest.main()
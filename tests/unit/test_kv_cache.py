@@ -0,0 +1,63 @@
+# tests/unit/test_kv_cache.py
+
+import tempfile
+import unittest
+
+import torch
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from tiny_models import build_tiny_causal_lm
+
+
+class TestKVCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def _run_turns(self, service, turns):
+        responses = []
+        for seed, text in enumerate(turns):
+            torch.manual_seed(seed)
+            responses.append(service.process_request('user_kv', {'input': text})['response'])
+        return responses
+
+    def test_outputs_match_uncached_path(self):
+        """
+        Test that reusing past_key_values gives the same replies as full prefill.
+        """
+        turns = ['Hello there.', ' How are you?', ' Tell me more.']
+        for service_class in (GPT2Service, LangModelService):
+            uncached = service_class(model_name=self.model_name, kv_cache_bytes=0)
+            cached = service_class(model_name=self.model_name)
+
+            self.assertEqual(self._run_turns(uncached, turns), self._run_turns(cached, turns))
+            self.assertEqual(uncached.kv_cache.stats()['hits'], 0)
+            self.assertEqual(cached.kv_cache.stats()['hits'], len(turns) - 1)
+            self.assertGreater(cached.kv_cache.stats()['reused_tokens'], 0)
+
+    def test_eviction_respects_budget(self):
+        """
+        Test that the least recently used entries are evicted once over budget.
+        """
+        service = LangModelService(model_name=self.model_name)
+        service.process_request('user_a', {'input': 'First user.'})
+        entry_bytes = service.kv_cache.total_bytes
+        service.kv_cache.max_bytes = int(entry_bytes * 1.5)
+
+        service.process_request('user_b', {'input': 'Second user.'})
+
+        stats = service.kv_cache.stats()
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+        self.assertEqual(stats['evictions'], 1)
+        self.assertNotIn('user_a', service.kv_cache.entries)
+        self.assertIn('user_b', service.kv_cache.entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# tests/unit/test_metrics.py
+
+import tempfile
+import unittest
+
+from src.service.gpt2_service import GPT2Service
+from src.service.metrics import NULL_TRACE, Metrics
+from tiny_models import build_tiny_causal_lm
+
+
+class TestMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_request_phases_are_recorded(self):
+        """
+        Test that a request records its phases, token counts and the Prometheus export.
+        """
+        metrics = Metrics()
+        service = GPT2Service(model_name=self.model_name, metrics=metrics)
+        response = service.process_request('user', {'input': 'Hello there.'})
+        service.process_request('user', {'input': ' And then?'})
+
+        self.assertNotIn('trace', response)
+        snapshot = metrics.snapshot()['GPT2Service']
+        for phase in ('total', 'tokenize', 'prefill', 'decode', 'detokenize'):
+            self.assertEqual(snapshot['phases'][phase]['count'], 2)
+        self.assertEqual(snapshot['counters']['requests'], 2)
+        self.assertGreater(snapshot['counters']['new_tokens'], 0)
+        # The second turn reuses the cached key/values of the first
+        self.assertGreater(snapshot['counters']['cached_tokens'], 0)
+
+        text = metrics.prometheus_text()
+        self.assertIn('llm_request_phase_seconds_count{service="GPT2Service",phase="prefill"} 2', text)
+        self.assertIn('llm_request_events_total{service="GPT2Service",name="requests"} 2', text)
+
+    def test_trace_is_attached_when_asked_for(self):
+        """
+        Test that {'trace': True} adds the request's trace to the response, also for streams and batches.
+        """
+        metrics = Metrics()
+        service = GPT2Service(model_name=self.model_name, metrics=metrics)
+        response = service.process_request('user', {'input': 'Hello there.', 'trace': True})
+        self.assertIn('decode', response['trace']['phases_ms'])
+        self.assertEqual(response['trace']['counts']['prompt_tokens'], len('Hello there.'))
+
+        list(service.process_request_stream('user', {'input': ' More.'}))
+        responses = service.process_batch([('a', {'input': 'Hi.', 'trace': True}), ('b', {'input': ''})])
+        self.assertEqual(responses[0]['trace']['counts']['batch_size'], 1)
+        self.assertNotIn('trace', responses[1])
+
+        counters = metrics.snapshot()['GPT2Service']['counters']
+        self.assertEqual(counters['requests'], 4)
+        self.assertEqual(counters['errors'], 1)
+
+    def test_disabled_metrics_record_nothing(self):
+        """
+        Test that disabled metrics hand out the no-op trace but still honour a requested trace.
+        """
+        metrics = Metrics(enabled=False)
+        self.assertIs(metrics.start_request('GPT2Service'), NULL_TRACE)
+
+        service = GPT2Service(model_name=self.model_name, metrics=metrics)
+        service.process_request('user', {'input': 'Hello there.'})
+        response = service.process_request('user', {'input': ' And then?', 'trace': True})
+
+        self.assertIn('prefill', response['trace']['phases_ms'])
+        self.assertEqual(metrics.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# tests/unit/test_model_registry.py
+
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from src.service.model_registry import ModelRegistry
+from tiny_models import build_tiny_causal_lm
+
+
+class TestModelRegistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_concurrent_first_acquire_loads_once(self):
+        """
+        Test that concurrent first requests for a key trigger exactly one load.
+        """
+        registry = ModelRegistry()
+        calls = []
+        lock = threading.Lock()
+
+        def loader():
+            with lock:
+                calls.append(1)
+            time.sleep(0.1)
+            return object()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            loaded = list(executor.map(lambda _: registry.acquire(('model',), loader), range(8)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(value is loaded[0] for value in loaded))
+        self.assertEqual(registry.stats()['entries'], {'model': 8})
+
+    def test_services_share_weights_and_unload_when_idle(self):
+        """
+        Test that services share one model copy and that it is unloaded after the last release.
+
+        LangModelService loads through AutoModelForCausalLM, which resolves to the
+        GPT2LMHeadModel of GPT2Service, so all three share the model; only the
+        tokenizer classes differ.
+        """
+        registry = ModelRegistry(idle_timeout=0)
+        first = GPT2Service(model_name=self.model_name, registry=registry)
+        second = GPT2Service(model_name=self.model_name, registry=registry)
+        other = LangModelService(model_name=self.model_name, registry=registry)
+
+        self.assertIs(first.model, second.model)
+        self.assertIs(first.model, other.model)
+        self.assertEqual(other._model_key, first._model_key)
+        self.assertEqual(registry.stats()['loads'], 3)
+
+        first.close()
+        second.close()
+        self.assertIn(second._model_key, registry)
+        other.close()
+        self.assertNotIn(second._model_key, registry)
+        self.assertEqual(registry.stats()['entries'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
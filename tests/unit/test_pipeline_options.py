@@ -0,0 +1,159 @@
+# tests/unit/test_pipeline_options.py
+
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from diffusers import DPMSolverMultistepScheduler, EulerDiscreteScheduler
+
+from src.service.image_cache import ImageCache
+from src.service.imagegen_service import ImageGenService
+from src.service.model_registry import ModelRegistry
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestPipelineOptions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def make_service(self, registry, **kwargs):
+        service = ImageGenService(
+            model_name=self.model_name, output_dir=os.path.join(self.tmpdir.name, 'images'), device='cpu',
+            picture_size={'width': 64, 'height': 64}, registry=registry,
+            image_cache=ImageCache(os.path.join(self.tmpdir.name, 'cache')), **kwargs
+        )
+        service.pipeline.set_progress_bar_config(disable=True)
+        return service
+
+    def test_scheduler_presets_share_weights(self):
+        """
+        Test that services with different schedulers share the weights but not the scheduler.
+        """
+        registry = ModelRegistry(idle_timeout=0)
+        dpmpp = self.make_service(registry, scheduler='dpmpp')
+        euler = self.make_service(registry, scheduler='euler')
+
+        self.assertIsInstance(dpmpp.pipeline.scheduler, DPMSolverMultistepScheduler)
+        self.assertIsInstance(euler.pipeline.scheduler, EulerDiscreteScheduler)
+        self.assertEqual(dpmpp.num_inference_steps, 20)
+        self.assertIs(dpmpp.pipeline.unet, euler.pipeline.unet)
+        self.assertEqual(registry.loads, 1)
+
+        # The same request renders separately for each scheduler
+        first = dpmpp.process_request('user', {'prompt': 'a boat', 'num_inference_steps': 3})
+        second = euler.process_request('user', {'prompt': 'a boat', 'num_inference_steps': 3})
+        self.assertIn('image_file_path', first)
+        self.assertEqual(euler.image_cache.stats()['hits'], 0)
+        self.assertIn('image_file_path', second)
+
+        dpmpp.close()
+        euler.close()
+        self.assertEqual(registry.stats()['entries'], {})
+
+    def test_concurrent_calls_do_not_share_scheduler_state(self):
+        """
+        Test that renders with different step counts running at once on one service give their own images.
+        """
+        service = self.make_service(ModelRegistry(idle_timeout=0), scheduler='dpmpp')
+
+        def render(steps):
+            return service._generate_images(['a lighthouse'], [0], steps, 7.5, 64, 64)[0].tobytes()
+
+        step_counts = [2, 5, 3, 7]
+        expected = [render(steps) for steps in step_counts]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            images = list(executor.map(render, step_counts))
+        service.close()
+        self.assertEqual(images, expected)
+
+    def test_unknown_options(self):
+        """
+        Test that unknown presets and memory options are rejected.
+        """
+        registry = ModelRegistry(idle_timeout=0)
+        with self.assertRaises(ValueError):
+            self.make_service(registry, scheduler='fastest')
+        with self.assertRaises(ValueError):
+            self.make_service(registry, memory_options=['fp8'])
+        with self.assertRaises(ValueError):
+            self.make_service(registry, precision='fp8')
+        with self.assertRaises(ValueError):
+            self.make_service(registry, precision='fp16')
+
+    def test_memory_options(self):
+        """
+        Test that the memory options are applied and images still render.
+        """
+        registry = ModelRegistry(idle_timeout=0)
+        service = self.make_service(
+            registry, scheduler='dpmpp', memory_options=['attention_slicing', 'vae_tiling', 'channels_last']
+        )
+        weight = service.pipeline.unet.conv_in.weight
+        self.assertTrue(weight.is_contiguous(memory_format=torch.channels_last))
+        self.assertTrue(service.pipeline.vae.use_tiling)
+
+        response = service.process_request('user', {'prompt': 'a boat', 'num_inference_steps': 3})
+        self.assertIn('image_file_path', response)
+        service.close()
+
+    def test_bf16_weights(self):
+        """
+        Test that the bf16 precision loads bfloat16 weights that render images.
+        """
+        registry = ModelRegistry(idle_timeout=0)
+        service = self.make_service(registry, precision='bf16')
+        self.assertEqual(service.pipeline.unet.dtype, torch.bfloat16)
+        self.assertEqual(service.pipeline.text_encoder.dtype, torch.bfloat16)
+
+        response = service.process_request('user', {'prompt': 'a boat', 'num_inference_steps': 2})
+        self.assertIn('image_file_path', response)
+        service.close()
+
+    def test_idle_pipeline_is_released_and_reloaded(self):
+        """
+        Test that the pipeline is unloaded after idle_timeout and loaded again by the next request.
+        """
+        registry = ModelRegistry()
+        # Long enough that the timer armed at start-up does not fire before the first request
+        service = self.make_service(registry, idle_timeout=1.0)
+        self.assertFalse(service.release_if_idle())
+        response = service.process_request('user', {'prompt': 'a boat', 'num_inference_steps': 2})
+        self.assertIn('image_file_path', response)
+
+        deadline = time.monotonic() + 10
+        while service.pipeline is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(service.pipeline)
+        # Released with no other holder, so unloaded despite the registry's long idle timeout
+        self.assertNotIn(service._pipeline_key, registry)
+
+        response = service.process_request('user', {'prompt': 'a ship', 'num_inference_steps': 2})
+        self.assertIn('image_file_path', response)
+        self.assertEqual(registry.stats()['loads'], 2)
+        service.close()
+
+    def test_unused_pipeline_is_released(self):
+        """
+        Test that a service that gets no request releases the pipeline it loaded at start-up.
+        """
+        registry = ModelRegistry()
+        service = self.make_service(registry, idle_timeout=0.2)
+        deadline = time.monotonic() + 10
+        while service.pipeline is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(service.pipeline)
+        self.assertNotIn(service._pipeline_key, registry)
+        service.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
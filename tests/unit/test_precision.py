@@ -0,0 +1,51 @@
+# tests/unit/test_precision.py
+
+import tempfile
+import unittest
+
+import torch
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from tiny_models import build_tiny_causal_lm
+
+
+class TestPrecision(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_precision_modes_generate(self):
+        """
+        Test that every precision mode loads its own weights and answers requests.
+        """
+        for service_class in (GPT2Service, LangModelService):
+            services = {
+                precision: service_class(model_name=self.model_name, precision=precision)
+                for precision in ('fp32', 'bf16', 'int8-dynamic')
+            }
+            for service in services.values():
+                self.assertIn('response', service.process_request('user', {'input': 'Hello there.'}))
+                self.assertIn('response', service.process_request('user', {'input': ' Again.'}))
+
+            self.assertEqual(services['fp32'].model.dtype, torch.float32)
+            self.assertEqual(services['bf16'].model.dtype, torch.bfloat16)
+            modules = list(services['int8-dynamic'].model.modules())
+            self.assertTrue(any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in modules))
+            self.assertFalse(any(type(module).__name__ == 'Conv1D' for module in modules))
+
+    def test_unknown_precision(self):
+        """
+        Test that an unknown precision is rejected.
+        """
+        with self.assertRaises(ValueError):
+            GPT2Service(model_name=self.model_name, precision='fp8')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# tests/unit/test_prefix_cache.py
+
+import tempfile
+import unittest
+
+import torch
+
+from src.service.langmodel_service import LangModelService
+from src.service.prefix_cache import PrefixCache
+from tiny_models import build_tiny_causal_lm
+
+
+class GreedyLangModelService(LangModelService):
+    GENERATION_KWARGS = {'do_sample': False}
+
+
+def fake_past(token_ids, layers=2):
+    """
+    Key/values of shape (1, 1, len, 2) whose entries at each position equal that position's token id.
+    """
+    tensor = torch.tensor(token_ids, dtype=torch.float32).view(1, 1, -1, 1).expand(1, 1, -1, 2).contiguous()
+    return tuple((tensor.clone(), -tensor.clone()) for _ in range(layers))
+
+
+class TestPrefixCache(unittest.TestCase):
+    def test_longest_prefix_is_reused_across_branches(self):
+        """
+        Test that sequences sharing a prefix split an edge and a lookup reuses the longest match.
+        """
+        cache = PrefixCache()
+        cache.insert(torch.tensor([1, 2, 3, 4]), fake_past([1, 2, 3, 4]))
+        cache.insert(torch.tensor([1, 2, 5, 6]), fake_past([1, 2, 5, 6]))
+        self.assertEqual(cache.stats()['nodes'], 3)
+        # [1, 2] is stored once, [3, 4] and [5, 6] below it
+        self.assertEqual(cache.stats()['bytes'], 3 * cache.root.children[1].nbytes)
+
+        past_key_values, length, handle = cache.acquire(torch.tensor([[1, 2, 5, 9, 9]]))
+        cache.release(handle)
+        self.assertEqual(length, 3)
+        self.assertTrue(torch.equal(past_key_values[1][0][0, 0, :, 0], torch.tensor([1., 2., 5.])))
+        self.assertTrue(torch.equal(past_key_values[1][1][0, 0, :, 0], torch.tensor([-1., -2., -5.])))
+
+        # One prompt token is always left to prefill
+        _, length, handle = cache.acquire(torch.tensor([[1, 2, 3]]))
+        cache.release(handle)
+        self.assertEqual(length, 2)
+        _, length, handle = cache.acquire(torch.tensor([[7, 1, 2]]))
+        cache.release(handle)
+        self.assertEqual(length, 0)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (2, 1))
+        self.assertEqual(cache.stats()['hit_lengths']['buckets']['0'], 1)
+
+    def test_paths_in_use_are_not_evicted(self):
+        """
+        Test that eviction removes least recently used leaves but skips paths held by a generation.
+        """
+        cache = PrefixCache()
+        cache.insert(torch.tensor([1, 2, 3]), fake_past([1, 2, 3]))
+        cache.insert(torch.tensor([4, 5, 6]), fake_past([4, 5, 6]))
+        _, _, handle = cache.acquire(torch.tensor([[1, 2, 3, 0]]))
+        cache.max_bytes = cache.total_bytes
+
+        cache.insert(torch.tensor([7, 8, 9]), fake_past([7, 8, 9]))
+        self.assertIn(1, cache.root.children)
+        self.assertNotIn(4, cache.root.children)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache.release(handle)
+        cache.insert(torch.tensor([4, 5, 6]), fake_past([4, 5, 6]))
+        self.assertEqual(sorted(cache.root.children), [4, 7])
+        self.assertLessEqual(cache.stats()['bytes'], cache.stats()['max_bytes'])
+
+    def test_shared_prefix_matches_full_prefill(self):
+        """
+        Test that users sharing a prompt prefix get the same greedy replies as without the cache.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            model_name = build_tiny_causal_lm(tmpdir)
+            uncached = GreedyLangModelService(model_name=model_name, kv_cache_bytes=0)
+            shared = GreedyLangModelService(model_name=model_name, prefix_cache_bytes=64 * 1024 * 1024)
+            system = 'You are a helpful lighthouse keeper. '
+            requests = [('user_1', system + 'Hi.'), ('user_2', system + 'Hello?'), ('user_1', 'And the storm?')]
+
+            for user_id, text in requests:
+                expected = uncached.process_request(user_id, {'input': text})
+                response = shared.process_request(user_id, {'input': text, 'trace': True})
+                self.assertEqual(response['response'], expected['response'])
+            # The second user reuses the system prompt, the follow-up turn the whole conversation
+            self.assertGreaterEqual(shared.kv_cache.stats()['hits'], 2)
+            self.assertGreater(response['trace']['counts']['cached_tokens'], len(system))
+
+
+if __name__ == '__main__':
+    unittest.main()
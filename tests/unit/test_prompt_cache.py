@@ -0,0 +1,87 @@
+# tests/unit/test_prompt_cache.py
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.service.image_cache import ImageCache
+from src.service.imagegen_service import ImageGenService
+from src.service.prompt_cache import PromptEmbeddingCache
+from tiny_models import build_tiny_stable_diffusion
+
+
+class TestPromptEmbeddingCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_stable_diffusion(os.path.join(cls.tmpdir.name, 'sd'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def make_service(self, prompt_cache=None):
+        service = ImageGenService(
+            model_name=self.model_name, output_dir=os.path.join(self.tmpdir.name, 'images'), device='cpu',
+            picture_size={'width': 64, 'height': 64}, prompt_cache=prompt_cache,
+            image_cache=ImageCache(self.tmpdir.name, max_bytes=0)
+        )
+        service.pipeline.set_progress_bar_config(disable=True)
+        return service
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used embedding is evicted.
+        """
+        cache = PromptEmbeddingCache(max_entries=2)
+        for key in ((1,), (2,)):
+            cache.put(key, torch.zeros(1))
+        self.assertIsNotNone(cache.get((1,)))
+        cache.put((3,), torch.zeros(1))
+
+        self.assertIsNone(cache.get((2,)))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
+
+    def test_matches_pipeline_encoding(self):
+        """
+        Test that images rendered from cached embeddings equal the pipeline's own prompt encoding.
+        """
+        service = self.make_service()
+        response = service.process_request(
+            'user', {'prompt': 'a green hill', 'num_inference_steps': 2, 'seed': 3}, wait=True
+        )
+        expected = service.pipeline(
+            'a green hill', num_inference_steps=2, generator=torch.Generator().manual_seed(3)
+        ).images[0]
+
+        image = np.asarray(Image.open(response['image_file_path']), dtype=np.int16)
+        self.assertLessEqual(np.abs(image - np.asarray(expected, dtype=np.int16)).max(), 1)
+        service.close()
+
+    def test_hit_skips_text_encoder(self):
+        """
+        Test that a repeated prompt does not run the text encoder, not even for the negative prompt.
+        """
+        service = self.make_service()
+        calls = []
+        service.pipeline.text_encoder.register_forward_hook(lambda module, args, output: calls.append(args))
+
+        # A new seed misses the image cache but hits the prompt cache
+        service.process_request('user', {'prompt': 'a green hill', 'num_inference_steps': 2, 'seed': 1})
+        self.assertEqual(len(calls), 1)
+        service.process_request('user', {'prompt': 'a green hill', 'num_inference_steps': 2, 'seed': 2})
+        self.assertEqual(len(calls), 1)
+
+        stats = service.prompt_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertGreater(stats['saved_ms'], 0)
+        service.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
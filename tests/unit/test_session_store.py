@@ -0,0 +1,110 @@
+# tests/unit/test_session_store.py
+
+import tempfile
+import time
+import tracemalloc
+import unittest
+from array import array
+
+import torch
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from src.service.session_store import LRUSessionStore
+from tiny_models import build_tiny_causal_lm
+
+
+class TestLRUSessionStore(unittest.TestCase):
+    def test_token_window_and_compact_storage(self):
+        """
+        Test that token sessions are stored as int32 arrays truncated to the window.
+        """
+        store = LRUSessionStore(max_tokens=4)
+        store['user'] = torch.arange(10)
+
+        self.assertIsInstance(store['user'], array)
+        self.assertEqual(store['user'].itemsize, 4)
+        self.assertEqual(store['user'].tolist(), [6, 7, 8, 9])
+
+    def test_lru_eviction_and_counters(self):
+        """
+        Test that the least recently used session is evicted and counted.
+        """
+        store = LRUSessionStore(max_sessions=2)
+        store['a'] = [1]
+        store['b'] = [2]
+        store.get('a')
+        store['c'] = [3]
+
+        self.assertIn('a', store)
+        self.assertNotIn('b', store)
+        self.assertIsNone(store.get('b'))
+        stats = store.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_ttl_expiry(self):
+        """
+        Test that idle sessions expire after the TTL.
+        """
+        store = LRUSessionStore(ttl=0.05)
+        store['user'] = {'prompt': 'a cat'}
+        time.sleep(0.1)
+
+        self.assertIsNone(store.get('user'))
+        self.assertEqual(store.stats()['expirations'], 1)
+        self.assertEqual(store.total_bytes, 0)
+
+    def test_memory_flat_under_100k_users(self):
+        """
+        Test that memory stays flat under the cap with 100k synthetic users.
+        """
+        max_bytes = 4 * 1024 * 1024
+        store = LRUSessionStore(max_tokens=256, max_bytes=max_bytes)
+        history = list(range(300))
+
+        tracemalloc.start()
+        try:
+            for index in range(10000):
+                store[f'user_{index}'] = history
+            after_10k, _ = tracemalloc.get_traced_memory()
+            for index in range(10000, 100000):
+                store[f'user_{index}'] = history
+            after_100k, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        print('Traced memory after 10k / 100k users:', after_10k, after_100k)
+        self.assertLessEqual(store.total_bytes, max_bytes)
+        self.assertLess(after_100k, after_10k * 1.1)
+        self.assertGreater(store.stats()['evictions'], 90000)
+
+
+class TestServiceSessions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name, n_positions=128)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_sessions_fit_model_context(self):
+        """
+        Test that long conversations are truncated to fit the model context.
+        """
+        for service_class in (GPT2Service, LangModelService):
+            service = service_class(model_name=self.model_name)
+            for _ in range(4):
+                response = service.process_request('user', {'input': 'Keep talking to me.'})
+                self.assertIn('response', response)
+
+            history = service.user_sessions['user']
+            self.assertIsInstance(history, array)
+            self.assertLessEqual(len(history), 128 - service.MAX_NEW_TOKENS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# tests/unit/test_speculative.py
+
+import os
+import tempfile
+import unittest
+
+from transformers import GPT2Tokenizer
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from src.service.model_registry import ModelRegistry
+from tiny_models import build_tiny_causal_lm
+
+
+class TestSpeculativeDecoding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(os.path.join(cls.tmpdir.name, 'target'))
+        # A copy of the target accepts (almost) every draft; other weights accept few
+        cls.same_draft = build_tiny_causal_lm(os.path.join(cls.tmpdir.name, 'same'))
+        cls.other_draft = build_tiny_causal_lm(os.path.join(cls.tmpdir.name, 'other'), seed=1)
+        cls.mismatched_draft = build_tiny_causal_lm(os.path.join(cls.tmpdir.name, 'mismatched'))
+        tokenizer = GPT2Tokenizer.from_pretrained(cls.mismatched_draft)
+        tokenizer.add_tokens(['<extra>'])
+        tokenizer.save_pretrained(cls.mismatched_draft)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def _greedy(self, service, turns):
+        service.GENERATION_KWARGS = {'do_sample': False}
+        return [service.process_request('user', {'input': text})['response'] for text in turns]
+
+    def test_greedy_output_unchanged(self):
+        """
+        Test that greedy replies are identical with and without a draft model, across KV-cached turns.
+        """
+        turns = ['Hello there.', ' How are you?']
+        for service_class in (GPT2Service, LangModelService):
+            expected = self._greedy(service_class(model_name=self.model_name), turns)
+            for draft_model_name in (self.same_draft, self.other_draft):
+                service = service_class(model_name=self.model_name, draft_model_name=draft_model_name)
+                self.assertIsNotNone(service.speculative)
+                self.assertEqual(self._greedy(service, turns), expected)
+                service.close()
+
+    def test_acceptance_metrics(self):
+        """
+        Test that draft and accepted tokens are counted in the trace and the decoder stats.
+        """
+        service = GPT2Service(model_name=self.model_name, draft_model_name=self.same_draft)
+        service.GENERATION_KWARGS = {'do_sample': False}
+        counts = service.process_request('user', {'input': 'Hello there.', 'trace': True})['trace']['counts']
+
+        self.assertGreater(counts['draft_tokens'], 0)
+        self.assertGreater(counts['accepted_tokens'], 0)
+        stats = service.speculative.stats()
+        self.assertGreater(stats['acceptance_rate'], 0.5)
+        self.assertGreater(stats['tokens_per_step'], 1.0)
+        service.close()
+
+    def test_tokenizer_mismatch_falls_back(self):
+        """
+        Test that a draft model with another vocabulary is dropped with a warning.
+        """
+        registry = ModelRegistry()
+        with self.assertWarns(UserWarning):
+            service = LangModelService(
+                model_name=self.model_name, draft_model_name=self.mismatched_draft, registry=registry
+            )
+        self.assertIsNone(service.speculative)
+        # The draft weights were never loaded: only the model and the two tokenizers
+        self.assertEqual(registry.stats()['loads'], 3)
+        self.assertIn('response', service.process_request('user', {'input': 'Hello there.'}))
+        service.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
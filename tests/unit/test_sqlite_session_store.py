@@ -0,0 +1,130 @@
+# tests/unit/test_sqlite_session_store.py
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+import unittest
+from array import array
+
+import torch
+
+from src.service.langmodel_service import LangModelService
+from src.service.sqlite_session_store import SQLiteSessionStore
+from tiny_models import build_tiny_causal_lm
+
+
+class TestSQLiteSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'sessions.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sessions_survive_reopen(self):
+        """
+        Test that token arrays and dict values written before close are read back after reopening.
+        """
+        store = SQLiteSessionStore(self.path, max_tokens=4)
+        store['user_1'] = torch.tensor([1, 2, 3, 4, 5, 6])
+        store['user_2'] = {'prompt': 'A lighthouse', 'image_file_path': 'a.png'}
+        store['user_3'] = [7, 8]
+        del store['user_3']
+        store.close()
+
+        store = SQLiteSessionStore(self.path)
+        self.assertEqual(store['user_1'], array('i', [3, 4, 5, 6]))
+        self.assertEqual(store['user_2']['prompt'], 'A lighthouse')
+        self.assertNotIn('user_3', store)
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_writes_are_batched(self):
+        """
+        Test that puts are visible at once but committed together by the background thread.
+        """
+        store = SQLiteSessionStore(self.path, flush_interval=0.05)
+        for index in range(100):
+            store[f'user_{index}'] = [index] * 8
+        self.assertEqual(store['user_42'], array('i', [42] * 8))
+
+        deadline = time.monotonic() + 5
+        while store.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(store.stats()['pending'], 0)
+        self.assertEqual(store.stats()['writes'], 100)
+        self.assertLessEqual(store.stats()['commits'], 2)
+        # Another process opening the file (here: an unpickled copy) sees the committed sessions
+        other = pickle.loads(pickle.dumps(store))
+        self.assertEqual(other['user_99'], array('i', [99] * 8))
+        other.close()
+        store.close()
+
+    def test_failed_commit_is_retried(self):
+        """
+        Test that the background thread keeps running after a commit fails and commits on a later tick.
+        """
+        store = SQLiteSessionStore(self.path, flush_interval=0.05)
+        flush = store.flush
+        failures = []
+
+        def failing_flush():
+            if not failures:
+                failures.append(1)
+                raise sqlite3.OperationalError('database is locked')
+            return flush()
+
+        with self.assertLogs('src.service.sqlite_session_store', level='ERROR'):
+            store.flush = failing_flush
+            store['user_1'] = [1, 2]
+            deadline = time.monotonic() + 5
+            while store.stats()['commits'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(failures, [1])
+        self.assertEqual(store.stats()['commits'], 1)
+        self.assertTrue(store._flusher.is_alive())
+        store.close()
+
+    def test_million_sessions_open_in_under_a_second(self):
+        """
+        Test that reopening a store with 1M sessions and loading one of them takes under a second.
+        """
+        store = SQLiteSessionStore(self.path, flush_interval=3600, max_pending=2_000_000)
+        tokens = array('i', range(8))
+        for index in range(1_000_000):
+            store.put(f'user_{index:07d}', tokens)
+        store.close()
+
+        start = time.perf_counter()
+        store = SQLiteSessionStore(self.path)
+        session = store['user_0777777']
+        elapsed = time.perf_counter() - start
+        store.close()
+        self.assertEqual(session, tokens)
+        self.assertLess(elapsed, 1.0)
+
+    def test_conversation_continues_after_restart(self):
+        """
+        Test that a new service instance on the same file continues the user's conversation.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            model_name = build_tiny_causal_lm(tmpdir)
+            service = LangModelService(model_name=model_name, session_store=SQLiteSessionStore(self.path))
+            service.process_request('user_1', {'input': 'Hello there.'})
+            history = service.user_sessions['user_1']
+            service.close()
+
+            service = LangModelService(model_name=model_name, session_store=SQLiteSessionStore(self.path))
+            self.assertEqual(service.user_sessions['user_1'], history)
+            response = service.process_request('user_1', {'input': 'And then?', 'trace': True})
+            self.assertGreater(response['trace']['counts']['prompt_tokens'], len(history))
+            service.close()
+            # Closing the service closes its store
+            with self.assertRaises(RuntimeError):
+                service.user_sessions['user_2'] = [1]
+
+
+if __name__ == '__main__':
+    unittest.main()
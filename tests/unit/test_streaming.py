@@ -0,0 +1,82 @@
+# tests/unit/test_streaming.py
+
+import tempfile
+import unittest
+
+import torch
+from transformers import GPT2Tokenizer
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from src.service.streaming import IncrementalDetokenizer
+from tiny_models import build_tiny_causal_lm
+
+
+class TestStreaming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_incremental_detokenizer(self):
+        """
+        Test that token-by-token deltas add up to the full text, without split characters.
+        """
+        tokenizer = GPT2Tokenizer.from_pretrained(self.model_name)
+        text = 'Grüße, 世界! 😀 done.'
+        detokenizer = IncrementalDetokenizer(tokenizer)
+
+        chunks = [detokenizer.push([token_id]) for token_id in tokenizer.encode(text)]
+        chunks.append(detokenizer.flush())
+
+        self.assertEqual(''.join(chunks), text)
+        self.assertFalse(any('�' in chunk for chunk in chunks))
+
+    def test_stream_matches_process_request(self):
+        """
+        Test that the streamed chunks add up to the process_request response.
+        """
+        for service_class in (GPT2Service, LangModelService):
+            streaming = service_class(model_name=self.model_name)
+            blocking = service_class(model_name=self.model_name)
+            for seed, text in enumerate(['Hello there.', ' And then?']):
+                torch.manual_seed(seed)
+                chunks = list(streaming.process_request_stream('user', {'input': text}))
+                torch.manual_seed(seed)
+                response = blocking.process_request('user', {'input': text})
+
+                self.assertEqual(''.join(chunks), response['response'])
+            self.assertEqual(streaming.user_sessions['user'], blocking.user_sessions['user'])
+
+    def test_session_updated_when_reader_stops(self):
+        """
+        Test that the session holds the prompt and the tokens generated when the stream is closed early.
+        """
+        service = LangModelService(model_name=self.model_name)
+        prompt_ids = service.tokenizer.encode('Hello there.' + service.tokenizer.eos_token)
+
+        stream = service.process_request_stream('user', {'input': 'Hello there.'})
+        next(stream)
+        stream.close()
+
+        history = service.user_sessions['user']
+        self.assertEqual(history[:len(prompt_ids)].tolist(), prompt_ids)
+        self.assertGreater(len(history), len(prompt_ids))
+        self.assertLessEqual(len(history), len(prompt_ids) + service.MAX_NEW_TOKENS)
+        self.assertIn('response', service.process_request('user', {'input': 'Still there?'}))
+
+    def test_empty_input_raises(self):
+        """
+        Test that a stream without input text raises ValueError.
+        """
+        service = LangModelService(model_name=self.model_name)
+        with self.assertRaises(ValueError):
+            next(service.process_request_stream('user', {'input': ''}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# tests/unit/test_tokenization.py
+
+import tempfile
+import unittest
+
+from src.service.gpt2_service import GPT2Service
+from src.service.langmodel_service import LangModelService
+from tiny_models import build_tiny_causal_lm
+
+
+class TestTokenization(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_services_use_fast_tokenizers(self):
+        """
+        Test that both text services load the Rust-backed tokenizer.
+        """
+        for service_class in (GPT2Service, LangModelService):
+            service = service_class(model_name=self.model_name)
+            self.assertTrue(service.tokenizer.is_fast, service_class.__name__)
+            service.close()
+
+    def test_sessions_keep_token_ids(self):
+        """
+        Test that a turn extends the stored token ids instead of re-encoding the conversation text.
+        """
+        service = LangModelService(model_name=self.model_name)
+        service.process_request('user_1', {'input': 'Hello there.'})
+        first = list(service.user_sessions['user_1'])
+        response = service.process_request('user_1', {'input': 'And again.'})
+        second = list(service.user_sessions['user_1'])
+
+        input_ids = service.tokenizer.encode('And again.' + service.tokenizer.eos_token)
+        self.assertEqual(second[:len(first) + len(input_ids)], first + input_ids)
+        self.assertEqual(
+            response['response'],
+            service.tokenizer.decode(second[len(first) + len(input_ids):], skip_special_tokens=True)
+        )
+
+    def test_batch_encoding_matches_single(self):
+        """
+        Test that encoding several inputs in one call builds the same prompts as one at a time.
+        """
+        service = GPT2Service(model_name=self.model_name)
+        service.user_sessions['user_1'] = service.tokenizer.encode('Earlier conversation.')
+        requests = [('user_1', {'input': 'Hi.'}), ('user_2', {'input': ''}), ('user_3', {'input': 'Héllo, wörld!'})]
+
+        self.assertEqual(
+            service._prepare_batch(requests),
+            [service._prepare(user_id, input_json) for user_id, input_json in requests]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
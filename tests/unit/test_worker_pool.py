@@ -0,0 +1,120 @@
+# tests/unit/test_worker_pool.py
+
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+from src.service.langmodel_service import LangModelService
+from src.service.session_store import LRUSessionStore
+from src.service.worker_pool import DEADLINE_EXCEEDED, WorkerPool, process_with_deadline
+from tiny_models import build_tiny_causal_lm
+
+
+class TestWorkerPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.model_name = build_tiny_causal_lm(cls.tmpdir.name)
+        cls.pool = WorkerPool(LangModelService, {'model_name': cls.model_name}, num_workers=2, threads_per_worker=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        cls.tmpdir.cleanup()
+
+    def test_user_sticks_to_one_worker(self):
+        """
+        Test that a user's turns go to one worker, which keeps the session and KV cache between them.
+        """
+        worker = self.pool.worker_for('user_sticky')
+        before = self.pool.stats()['requests'][worker]
+        first = self.pool.process_request('user_sticky', {'input': 'Hello there.', 'trace': True})
+        second = self.pool.process_request('user_sticky', {'input': 'And again.', 'trace': True})
+
+        self.assertEqual(self.pool.stats()['requests'][worker], before + 2)
+        self.assertGreater(second['trace']['counts']['prompt_tokens'], first['trace']['counts']['prompt_tokens'])
+        self.assertGreater(second['trace']['counts']['cached_tokens'], 0)
+
+    def test_stateless_requests_are_balanced(self):
+        """
+        Test that requests without a user id are spread over the workers and keep no session.
+        """
+        before = self.pool.stats()['requests']
+        futures = [self.pool.submit(None, {'input': 'Hello there.', 'trace': True}) for _ in range(4)]
+        responses = [future.result() for future in futures]
+
+        after = self.pool.stats()['requests']
+        self.assertEqual([after[index] - before[index] for index in range(2)], [2, 2])
+        for response in responses:
+            self.assertIn('response', response)
+            self.assertEqual(response['trace']['counts']['cached_tokens'], 0)
+
+    def test_worker_errors_fail_the_request(self):
+        """
+        Test that an exception in a worker fails only that request's future.
+        """
+        with self.assertRaises(RuntimeError):
+            self.pool.process_request('user_error', {'input': 12345})
+        self.assertIn('response', self.pool.process_request('user_error', {'input': 'Hi.'}))
+
+    def test_cancelled_request_does_not_stop_the_pool(self):
+        """
+        Test that a request cancelled by its caller before the answer leaves later requests working.
+        """
+        future = self.pool.submit('user_cancel', {'input': 'Hello there.'})
+        self.assertTrue(future.cancel())
+        response = self.pool.submit('user_cancel', {'input': 'Hi.'}).result(timeout=30)
+        self.assertIn('response', response)
+        self.assertEqual(self.pool.stats()['in_flight'], [0, 0])
+
+    def test_dead_worker_fails_its_requests(self):
+        """
+        Test that the requests in flight on a worker that dies fail instead of hanging.
+        """
+        pool = WorkerPool(LangModelService, {'model_name': self.model_name}, num_workers=1, threads_per_worker=1)
+        try:
+            # Stopped, the worker cannot answer; the request stays in flight until the kill
+            os.kill(pool.pids[0], signal.SIGSTOP)
+            future = pool.submit('user_dead', {'input': 'Hello there.'})
+            os.kill(pool.pids[0], signal.SIGKILL)
+            with self.assertRaisesRegex(RuntimeError, 'exited'):
+                future.result(timeout=30)
+            with self.assertRaisesRegex(RuntimeError, 'exited'):
+                pool.process_request('user_dead', {'input': 'Hi.'})
+            self.assertEqual(pool.stats()['exited'], {0: -signal.SIGKILL})
+        finally:
+            pool.close()
+
+
+class SlowService:
+    """
+    Adds the input tokens to the session, as a cancelled generation keeps its partial output, and waits.
+    """
+    def __init__(self):
+        self.user_sessions = LRUSessionStore()
+
+    def process_request(self, user_id, input_json, cancelled=None):
+        self.user_sessions[user_id] = list(self.user_sessions.get(user_id, [])) + input_json['input']
+        cancelled.wait()
+        return {'response': 'partial'}
+
+
+class TestProcessWithDeadline(unittest.TestCase):
+    def test_session_is_rolled_back(self):
+        """
+        Test that a request past its deadline leaves the session as it was before the request.
+        """
+        service = SlowService()
+        response = process_with_deadline(service, 'new_user', {'input': [1, 2]}, time.time() + 0.05)
+        self.assertEqual(response, {'error': DEADLINE_EXCEEDED})
+        self.assertNotIn('new_user', service.user_sessions)
+
+        service.user_sessions['user'] = [7]
+        process_with_deadline(service, 'user', {'input': [8, 9]}, time.time() + 0.05)
+        self.assertEqual(list(service.user_sessions['user']), [7])
+
+
+if __name__ == '__main__':
+    unittest.main()
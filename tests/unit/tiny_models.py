@@ -0,0 +1,40 @@
+# tests/unit/tiny_models.py
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from benchmarks.tiny_models import build_causal_lm, build_stable_diffusion
+
+
+def build_tiny_causal_lm(directory, n_positions=1024, seed=0):
+    """
+    Save a tiny, randomly initialized GPT-2 checkpoint so tests need no network.
+
+    Args:
+        directory (str): Directory to save the model and tokenizer into.
+        n_positions (int): Context length of the model.
+        seed (int): Seed for the random weights.
+
+    Returns:
+        str: The directory, usable as model_name for the services.
+    """
+    return build_causal_lm(directory, n_embd=32, n_layer=2, n_head=2, n_positions=n_positions, seed=seed)
+
+
+def build_tiny_stable_diffusion(directory, seed=0):
+    """
+    Save a tiny, randomly initialized Stable Diffusion pipeline so tests need no network.
+
+    The pipeline renders 64x64 images by default (latents of 32x32 with a VAE
+    scale factor of 2).
+
+    Args:
+        directory (str): Directory to save the pipeline into.
+        seed (int): Seed for the random weights.
+
+    Returns:
+        str: The directory, usable as model_name for ImageGenService.
+    """
+    return build_stable_diffusion(directory, block_out_channels=(8, 16), sample_size=32, norm_num_groups=8, seed=seed)